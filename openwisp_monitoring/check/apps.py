@@ -5,6 +5,10 @@ from swapper import load_model
 
 from openwisp_monitoring.check import checks  # noqa
 
+from ..device.signals import device_metrics_received, health_status_changed
+from ..monitoring.signals import threshold_crossed
+from . import settings as app_settings
+
 
 class CheckConfig(AppConfig):
     name = "openwisp_monitoring.check"
@@ -22,3 +26,24 @@ class CheckConfig(AppConfig):
             sender=load_model("config", "Device"),
             dispatch_uid="auto_create_check",
         )
+        if app_settings.ADAPTIVE_CHECKS["enabled"]:
+            self._connect_adaptive_checks_signals()
+
+    def _connect_adaptive_checks_signals(self):
+        Check = load_model("check", "Check")
+
+        health_status_changed.connect(
+            Check.health_status_changed_receiver,
+            sender=load_model("device_monitoring", "DeviceMonitoring"),
+            dispatch_uid="adaptive_checks_health_status_changed",
+        )
+        threshold_crossed.connect(
+            Check.threshold_crossed_receiver,
+            sender=load_model("monitoring", "Metric"),
+            dispatch_uid="adaptive_checks_threshold_crossed",
+        )
+        device_metrics_received.connect(
+            Check.device_metrics_received_receiver,
+            sender=load_model("device_monitoring", "DeviceData"),
+            dispatch_uid="adaptive_checks_device_metrics_received",
+        )
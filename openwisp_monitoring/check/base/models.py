@@ -1,15 +1,26 @@
+from datetime import timedelta
+
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
+from swapper import load_model
 
 from openwisp_utils.base import TimeStampedEditableModel
 
 from ...utils import transaction_on_commit
 from .. import settings as app_settings
+from ..scheduler import (
+    CheckScheduler,
+    get_reporting_devices,
+    get_stale_devices,
+    record_device_report,
+)
 from ..tasks import auto_create_check
 
 
@@ -42,6 +53,19 @@ class AbstractCheck(TimeStampedEditableModel):
         help_text=_("parameters needed to perform the check"),
         encoder=DjangoJSONEncoder,
     )
+    interval = models.PositiveIntegerField(
+        _("interval"),
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1)],
+        help_text=_(
+            "seconds between the executions of the check, leave blank to "
+            "use the default interval of the check type"
+        ),
+    )
+    # number of times the interval of the check has been doubled
+    # because its device is healthy (see ADAPTIVE_CHECKS)
+    backoff = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         abstract = True
@@ -89,15 +113,22 @@ class AbstractCheck(TimeStampedEditableModel):
         check_class = self.check_class
         return check_class(check=self, params=self.params)
 
+    def is_performable(self):
+        """Whether the related object (if any) is active."""
+        return not (
+            (
+                hasattr(self.content_object, "is_deactivated")
+                and self.content_object.is_deactivated()
+            )
+            or (
+                hasattr(self.content_object, "organization_id")
+                and self.content_object.organization.is_active is False
+            )
+        )
+
     def perform_check(self, store=True):
         """Initializes check instance and calls the check method."""
-        if (
-            hasattr(self.content_object, "is_deactivated")
-            and self.content_object.is_deactivated()
-        ) or (
-            hasattr(self.content_object, "organization_id")
-            and self.content_object.organization.is_active is False
-        ):
+        if not self.is_performable():
             return
         return self.check_instance.timed_check(store=True)
 
@@ -106,6 +137,85 @@ class AbstractCheck(TimeStampedEditableModel):
 
         perform_check.apply_async(args=[self.id], countdown=duration)
 
+    @classmethod
+    def update_backoff(cls, checks):
+        """Adapts the interval of the checks which have just been performed.
+
+        The interval of the checks of devices which have been healthy for
+        at least ``ADAPTIVE_CHECKS["min_healthy_period"]`` seconds is
+        doubled after each execution, up to
+        ``ADAPTIVE_CHECKS["max_interval"]``, while the base interval is
+        restored as soon as the device is not healthy or stops sending
+        its monitoring data.
+
+        The interval of ping checks is adapted only while the device is
+        sending its monitoring data, otherwise ping would be the only way
+        to notice that the device went offline.
+        """
+        from ..classes import Ping
+
+        scheduler = CheckScheduler()
+        checks = [
+            check
+            for check in checks
+            if check.object_id and scheduler.is_adaptive(check.check_type)
+        ]
+        if not app_settings.CHECK_SCHEDULER_TICK or not checks:
+            return
+        DeviceMonitoring = load_model("device_monitoring", "DeviceMonitoring")
+        # the monitoring data of devices is saved mostly when the health
+        # status changes, its modification time is a conservative
+        # estimate of the time since which the device is healthy
+        healthy_since = timezone.now() - timedelta(
+            seconds=app_settings.ADAPTIVE_CHECKS["min_healthy_period"]
+        )
+        healthy = {
+            str(pk)
+            for pk in DeviceMonitoring.objects.filter(
+                device_id__in={check.object_id for check in checks},
+                status="ok",
+                modified__lte=healthy_since,
+            ).values_list("device_id", flat=True)
+        }
+        healthy -= get_stale_devices(healthy)
+        reporting = get_reporting_devices(healthy)
+        updates = {}
+        for check in checks:
+            backoff = 0
+            if check.object_id in healthy and (
+                check.object_id in reporting or not issubclass(check.check_class, Ping)
+            ):
+                backoff = min(
+                    check.backoff + 1,
+                    scheduler.get_max_backoff(check.check_type, check.interval),
+                )
+            if backoff != check.backoff:
+                updates.setdefault((check.backoff, backoff), []).append(check.pk)
+        for (previous, backoff), pks in updates.items():
+            # the backoff may have been reset in the meantime
+            cls.objects.filter(pk__in=pks, backoff=previous).update(backoff=backoff)
+
+    @classmethod
+    def reset_backoff(cls, obj):
+        """Restores the base interval of the checks of ``obj``."""
+        ct = ContentType.objects.get_for_model(obj)
+        cls.objects.filter(
+            content_type=ct, object_id=str(obj.pk), backoff__gt=0
+        ).update(backoff=0)
+
+    @classmethod
+    def health_status_changed_receiver(cls, instance, **kwargs):
+        cls.reset_backoff(instance.device)
+
+    @classmethod
+    def threshold_crossed_receiver(cls, target, **kwargs):
+        if target is not None:
+            cls.reset_backoff(target)
+
+    @classmethod
+    def device_metrics_received_receiver(cls, instance, **kwargs):
+        record_device_report(instance.pk)
+
     @classmethod
     def auto_create_check_receiver(cls, created, **kwargs):
         if not created:
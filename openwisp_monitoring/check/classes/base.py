@@ -60,6 +60,25 @@ class BaseCheck(object):
     def check(self, store=True):
         raise NotImplementedError
 
+    @classmethod
+    def check_many(cls, checks, store=True):
+        """Performs many checks of this class.
+
+        Returns a dict which maps each check instance to its result.
+        Subclasses can override this method to perform the checks more
+        efficiently than one by one, an error in a check shall not
+        prevent the other checks from being performed.
+        """
+        results = {}
+        for check in checks:
+            try:
+                results[check] = check.timed_check(store=store)
+            except Exception as e:
+                logger.exception(
+                    f'Error while performing "{check.check_instance}": {e}'
+                )
+        return results
+
     def store(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -111,8 +130,7 @@ class BaseCheck(object):
         self.store(*args, **kwargs)
         self._store_result_elapsed_time = time.time() - start_time
 
-    def _get_or_create_metric(self, configuration=None):
-        """Gets or creates metric."""
+    def _get_metric_options(self, configuration=None):
         check = self.check_instance
         if check.object_id and check.content_type_id:
             obj_id = check.object_id
@@ -120,10 +138,14 @@ class BaseCheck(object):
         else:
             obj_id = str(check.id)
             ct = ContentType.objects.get_for_model(Check)
-        options = dict(
+        return dict(
             object_id=obj_id,
             content_type_id=ct.id,
             configuration=configuration or self.__class__.__name__.lower(),
         )
+
+    def _get_or_create_metric(self, configuration=None):
+        """Gets or creates metric."""
+        options = self._get_metric_options(configuration)
         metric, created = Metric._get_or_create(**options)
         return metric, created
@@ -1,4 +1,7 @@
+import logging
+import re
 import subprocess
+import time
 
 from django.core.exceptions import ValidationError
 from jsonschema import draft7_format_checker, validate
@@ -10,8 +13,11 @@ from openwisp_utils.utils import deep_merge_dicts
 from ... import settings as monitoring_settings
 from .. import settings as app_settings
 from ..exceptions import OperationalError
+from ..icmp import ICMPEngine
 from .base import BaseCheck
 
+logger = logging.getLogger(__name__)
+
 Chart = load_model("monitoring", "Chart")
 Metric = load_model("monitoring", "Metric")
 AlertSettings = load_model("monitoring", "AlertSettings")
@@ -42,6 +48,15 @@ DEFAULT_PING_CHECK_CONFIG = {
 }
 
 
+# statistics of a target printed by fping, eg:
+# 10.40.0.1 : xmt/rcv/%loss = 5/5/0%, min/avg/max = 0.04/0.08/0.15
+_FPING_STATS = re.compile(
+    r"^(?P<target>\S+)\s+:\s+xmt/rcv/%loss = \d+/\d+/(?P<loss>[\d.]+)%"
+    r"(?:, min/avg/max = (?P<min>[\d.]+)/(?P<avg>[\d.]+)/(?P<max>[\d.]+))?",
+    re.MULTILINE,
+)
+
+
 def get_ping_schema():
     schema = {
         "$schema": "http://json-schema.org/draft-07/schema#",
@@ -69,35 +84,27 @@ class Ping(BaseCheck):
             raise ValidationError({"params": message}) from e
 
     def check(self, store=True):
-        count = self._get_param("count")
-        interval = self._get_param("interval")
-        bytes_ = self._get_param("bytes")
-        timeout = self._get_param("timeout")
         ip = self._get_ip()
         #  if the device has no available IP
         if not ip:
-            monitoring = self.related_object.monitoring
-            # device not known yet, ignore
-            if monitoring.status == "unknown":
-                return
-            # device is known, simulate down
-            result = {"reachable": 0, "loss": 100.0}
-            if store:
+            result = self._get_no_ip_result()
+            if result and store:
                 self.timed_store(result)
             return result
-        command = [
-            "fping",
-            "-e",  # show elapsed (round-trip) time of packets
-            "-c %s" % count,  # count of pings to send to each target,
-            "-p %s" % interval,  # interval between sending pings(in ms)
-            "-b %s" % bytes_,  # amount of ping data to send
-            "-t %s" % timeout,  # individual target initial timeout (in ms)
-            "-q",
-            ip,
-        ]
-        stdout, stderr = self._command(command)
-        # fpings shows statistics on stderr
-        output = stderr.decode("utf8")
+        if app_settings.PING_BACKEND == "icmp":
+            result = self._ping_many(self._get_params(), [ip])[ip]
+        else:
+            command = self._get_command(self._get_params(), [ip])
+            stdout, stderr = self._command(command)
+            # fpings shows statistics on stderr
+            result = self._parse(stderr.decode("utf8"))
+        if store:
+            self.timed_store(result)
+        return result
+
+    @staticmethod
+    def _parse(output):
+        """Parses the statistics of a single target printed by fping."""
         try:
             parts = output.split("=")
             if len(parts) > 2:
@@ -115,10 +122,84 @@ class Ping(BaseCheck):
             result.update(
                 {"rtt_min": float(min), "rtt_avg": float(avg), "rtt_max": float(max)}
             )
-        if store:
-            self.timed_store(result)
         return result
 
+    @classmethod
+    def check_many(cls, checks, store=True):
+        """Performs many ping checks with as few fping processes as possible.
+
+        The targets of the checks which have the same parameters are
+        pinged by the same fping process and all the results are stored
+        with a single write to the timeseries database.
+        """
+        start_time = time.time()
+        results = {}
+        groups = {}
+        for check in checks:
+            # an error in a check (eg: its device has been deleted)
+            # shall not prevent the other checks from being performed
+            try:
+                ip = check._get_ip()
+                if not ip:
+                    result = check._get_no_ip_result()
+                    if result:
+                        results[check] = result
+                    continue
+                params = check._get_params()
+            except Exception as e:
+                logger.exception(
+                    f"Error while preparing the check {check.check_instance.pk}: {e}"
+                )
+                continue
+            targets = groups.setdefault(params, {})
+            targets.setdefault(ip, []).append(check)
+        for params, targets in groups.items():
+            # "_ping_many" is called on an instance to keep "_command" easy to mock
+            first_check = next(iter(targets.values()))[0]
+            try:
+                stats = first_check._ping_many(params, list(targets.keys()))
+            except Exception as e:
+                logger.exception(f"Error while pinging {len(targets)} targets: {e}")
+                continue
+            for ip, ip_checks in targets.items():
+                if ip not in stats:
+                    logger.error(f"Unrecognized fping output for {ip}")
+                    continue
+                try:
+                    for check in ip_checks:
+                        results[check] = stats[ip].copy()
+                except Exception as e:
+                    logger.exception(f"Error while reading the result of {ip}: {e}")
+        if store:
+            try:
+                cls.store_many(results)
+            except Exception as e:
+                logger.exception(f"Error while storing the results of ping checks: {e}")
+        elapsed_time = time.time() - start_time
+        logger.info("%d ping checks executed in %.2fs" % (len(results), elapsed_time))
+        return results
+
+    @classmethod
+    def store_many(cls, results):
+        """Stores the results of many checks with a single write."""
+        if not results:
+            return
+        metrics = Metric._get_or_create_many(
+            [check._get_metric_options() for check in results.keys()]
+        )
+        write_data = []
+        for (check, result), (metric, created) in zip(results.items(), metrics):
+            if created:
+                check._create_alert_settings(metric)
+                check._create_charts(metric)
+            copied = result.copy()
+            reachable = copied.pop("reachable")
+            write_data.append((metric, {"value": reachable, "extra_values": copied}))
+        try:
+            Metric.batch_write(write_data)
+        except ValueError as error:
+            logger.error(f"Failed to write the results of ping checks: {error}")
+
     def store(self, result):
         """Stores result in the DB."""
         metric = self._get_metric()
@@ -130,6 +211,64 @@ class Ping(BaseCheck):
         """Gets specified param or its default value according to the schema."""
         return self.params.get(param, self.schema["properties"][param]["default"])
 
+    def _get_params(self):
+        params = ("count", "interval", "bytes", "timeout")
+        return tuple(self._get_param(param) for param in params)
+
+    def _ping_many(self, params, targets):
+        """Pings ``targets`` with the configured backend.
+
+        Returns a dict which maps each target to its result.
+        """
+        if app_settings.PING_BACKEND == "icmp":
+            return ICMPEngine().ping_many(targets, *params)
+        stdout, stderr = self._command(self._get_command(params, targets))
+        return self._parse_many(stderr.decode("utf8"))
+
+    @staticmethod
+    def _get_command(params, targets):
+        count, interval, bytes_, timeout = params
+        return [
+            "fping",
+            "-e",  # show elapsed (round-trip) time of packets
+            "-c %s" % count,  # count of pings to send to each target,
+            "-p %s" % interval,  # interval between sending pings(in ms)
+            "-b %s" % bytes_,  # amount of ping data to send
+            "-t %s" % timeout,  # individual target initial timeout (in ms)
+            "-q",
+            *targets,
+        ]
+
+    @staticmethod
+    def _parse_many(output):
+        """Parses the statistics of many targets printed by fping.
+
+        Returns a dict which maps each target to its result,
+        unrecognized lines are ignored.
+        """
+        results = {}
+        for match in _FPING_STATS.finditer(output):
+            loss = float(match.group("loss"))
+            result = {"reachable": int(loss < 100), "loss": loss}
+            if result["reachable"] and match.group("avg"):
+                result.update(
+                    {
+                        "rtt_min": float(match.group("min")),
+                        "rtt_avg": float(match.group("avg")),
+                        "rtt_max": float(match.group("max")),
+                    }
+                )
+            results[match.group("target")] = result
+        return results
+
+    def _get_no_ip_result(self):
+        monitoring = self.related_object.monitoring
+        # device not known yet, ignore
+        if monitoring.status == "unknown":
+            return None
+        # device is known, simulate down
+        return {"reachable": 0, "loss": 100.0}
+
     def _get_ip(self):
         """Figures out ip to use or fails raising OperationalError."""
         device = self.related_object
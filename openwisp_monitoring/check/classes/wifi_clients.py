@@ -83,38 +83,47 @@ class WifiClients(BaseCheck):
         return True
 
     def _get_wifi_clients_count(self, time_interval):
-        values = timeseries_db.read(
-            key="wifi_clients",
-            fields=["clients"],
-            distinct_fields=["clients"],
-            count_fields=["clients"],
-            tags={
-                "content_type": self.related_object._meta.label_lower,
-                "object_id": str(self.related_object.pk),
-            },
-            since=(timezone.localtime() - timezone.timedelta(minutes=time_interval)),
-        )
-        if not values:
-            result = 0
-        else:
-            result = values[0]["count"]
-        return result
-
-    def _check_wifi_clients(self, check_type, interval, store=True):
-        result = self._get_wifi_clients_count(interval)
+        return self._get_wifi_clients_counts(time_interval)[0]
+
+    def _get_wifi_clients_counts(self, *time_intervals):
+        """Counts the clients of each time interval with a single request."""
+        reads = [
+            dict(
+                key="wifi_clients",
+                fields=["clients"],
+                distinct_fields=["clients"],
+                count_fields=["clients"],
+                tags={
+                    "content_type": self.related_object._meta.label_lower,
+                    "object_id": str(self.related_object.pk),
+                },
+                since=(
+                    timezone.localtime() - timezone.timedelta(minutes=time_interval)
+                ),
+            )
+            for time_interval in time_intervals
+        ]
+        return [
+            values[0]["count"] if values else 0
+            for values in timeseries_db.read_many(reads)
+        ]
+
+    def _check_wifi_clients(self, check_type, interval, store=True, result=None):
+        if result is None:
+            result = self._get_wifi_clients_count(interval)
         if store:
             metric = self._get_metric(f"wifi_clients_{check_type}")
             metric.write(result)
         return result
 
-    def _check_wifi_clients_min(self, store=True):
+    def _check_wifi_clients_min(self, store=True, result=None):
         return self._check_wifi_clients(
-            "min", app_settings.WIFI_CLIENTS_MIN_CHECK_INTERVAL, store
+            "min", app_settings.WIFI_CLIENTS_MIN_CHECK_INTERVAL, store, result
         )
 
-    def _check_wifi_clients_max(self, store=True):
+    def _check_wifi_clients_max(self, store=True, result=None):
         return self._check_wifi_clients(
-            "max", app_settings.WIFI_CLIENTS_MAX_CHECK_INTERVAL, store
+            "max", app_settings.WIFI_CLIENTS_MAX_CHECK_INTERVAL, store, result
         )
 
     def check(self, store=True):
@@ -125,8 +134,13 @@ class WifiClients(BaseCheck):
             "critical",
         ]:
             return
-        min = self._check_wifi_clients_min(store)
-        max = self._check_wifi_clients_max(store)
+        # the clients of both intervals are counted with a single request
+        min_count, max_count = self._get_wifi_clients_counts(
+            app_settings.WIFI_CLIENTS_MIN_CHECK_INTERVAL,
+            app_settings.WIFI_CLIENTS_MAX_CHECK_INTERVAL,
+        )
+        min = self._check_wifi_clients_min(store, min_count)
+        max = self._check_wifi_clients_max(store, max_count)
         return {"wifi_clients_min": min, "wifi_clients_max": max}
 
     def _get_metric(self, configuration):
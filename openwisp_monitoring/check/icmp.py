@@ -0,0 +1,182 @@
+import asyncio
+import ipaddress
+import random
+import socket
+import struct
+import time
+
+from .exceptions import OperationalError
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+_HEADER = struct.Struct("!BBHHH")
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def create_socket(family):
+    """Creates a non blocking ICMP socket.
+
+    Unprivileged datagram ICMP sockets are used where the kernel allows
+    them (on Linux, see ``net.ipv4.ping_group_range``), otherwise raw
+    sockets are used, which require the ``CAP_NET_RAW`` capability.
+    """
+    if family == socket.AF_INET:
+        proto = socket.IPPROTO_ICMP
+    else:
+        proto = socket.IPPROTO_ICMPV6
+    try:
+        sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+    except OSError:
+        sock = socket.socket(family, socket.SOCK_RAW, proto)
+    sock.setblocking(False)
+    return sock
+
+
+def get_result(sent, rtts):
+    """Returns the result of a ping check as computed by fping."""
+    loss = float((sent - len(rtts)) * 100 // sent)
+    result = {"reachable": int(loss < 100), "loss": loss}
+    if rtts:
+        result.update(
+            {
+                "rtt_min": round(min(rtts), 3),
+                "rtt_avg": round(sum(rtts) / len(rtts), 3),
+                "rtt_max": round(max(rtts), 3),
+            }
+        )
+    return result
+
+
+class ICMPEngine(object):
+    """Pings many targets concurrently from a single process.
+
+    All the echo requests are sent from one socket per address family
+    and the replies are dispatched to the probes waiting for them by an
+    asyncio event loop, which allows keeping thousands of probes in
+    flight without spawning any process.
+
+    The parameters have the same meaning of the fping options used by
+    the ``Ping`` check: ``count`` probes are sent to each target every
+    ``interval`` milliseconds, each probe carries ``size`` bytes of data
+    and is considered lost if the reply is not received within
+    ``timeout`` milliseconds.
+    """
+
+    def __init__(self, socket_factory=create_socket):
+        self.socket_factory = socket_factory
+
+    def ping_many(self, targets, count, interval, size, timeout):
+        """Returns a dict which maps each target to its result."""
+        return asyncio.run(self._ping_many(targets, count, interval, size, timeout))
+
+    async def _ping_many(self, targets, count, interval, size, timeout):
+        loop = asyncio.get_running_loop()
+        # echo replies to raw sockets are matched by identifier
+        self._identifier = random.randint(0, 0xFFFF)
+        self._sockets = {}
+        self._pending = {}
+        try:
+            interval, timeout = interval / 1000, timeout / 1000
+            results = await asyncio.gather(
+                *[
+                    self._ping(loop, target, count, interval, size, timeout)
+                    for target in targets
+                ]
+            )
+        finally:
+            for sock in self._sockets.values():
+                loop.remove_reader(sock.fileno())
+                sock.close()
+        return dict(zip(targets, results))
+
+    def _get_socket(self, loop, family):
+        if family not in self._sockets:
+            try:
+                sock = self.socket_factory(family)
+            except OSError as e:
+                raise OperationalError(f"Cannot create ICMP socket: {e}") from e
+            loop.add_reader(sock.fileno(), self._receive, sock, family)
+            self._sockets[family] = sock
+        return self._sockets[family]
+
+    async def _ping(self, loop, target, count, interval, size, timeout):
+        address = ipaddress.ip_address(target)
+        family = socket.AF_INET if address.version == 4 else socket.AF_INET6
+        sock = self._get_socket(loop, family)
+        probes = []
+        for sequence in range(count):
+            if sequence:
+                await asyncio.sleep(interval)
+            probes.append(
+                asyncio.ensure_future(
+                    self._probe(
+                        loop, sock, family, address.compressed, sequence, size, timeout
+                    )
+                )
+            )
+        rtts = [rtt for rtt in await asyncio.gather(*probes) if rtt is not None]
+        return get_result(count, rtts)
+
+    async def _probe(self, loop, sock, family, address, sequence, size, timeout):
+        """Sends an echo request, returns the round trip time in ms or ``None``."""
+        if family == socket.AF_INET:
+            packet_type = ICMP_ECHO_REQUEST
+        else:
+            packet_type = ICMPV6_ECHO_REQUEST
+        payload = bytes(size)
+        header = _HEADER.pack(packet_type, 0, 0, self._identifier, sequence)
+        if family == socket.AF_INET:
+            checksum = _checksum(header + payload)
+            header = _HEADER.pack(packet_type, 0, checksum, self._identifier, sequence)
+        # the checksum of ICMPv6 packets is computed by the kernel
+        key = (address, sequence)
+        future = loop.create_future()
+        self._pending[key] = future
+        sent = time.perf_counter()
+        try:
+            sock.sendto(header + payload, (address, 0))
+            received = await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self._pending.pop(key, None)
+        return (received - sent) * 1000
+
+    def _receive(self, sock, family):
+        """Reads the available replies and resolves the related probes."""
+        raw = sock.type == socket.SOCK_RAW
+        if family == socket.AF_INET:
+            reply_type = ICMP_ECHO_REPLY
+        else:
+            reply_type = ICMPV6_ECHO_REPLY
+        while True:
+            try:
+                data, address = sock.recvfrom(65535)
+            except OSError:
+                # no more data to read (or an error reported by the socket)
+                return
+            received = time.perf_counter()
+            # raw IPv4 sockets receive the IP header too
+            if raw and family == socket.AF_INET:
+                header_length = (data[0] & 0x0F) * 4
+                data = data[header_length:]
+            if len(data) < _HEADER.size:
+                continue
+            packet_type, _, _, identifier, sequence = _HEADER.unpack_from(data)
+            # the identifier of datagram sockets is managed by the kernel
+            if packet_type != reply_type or (raw and identifier != self._identifier):
+                continue
+            address = ipaddress.ip_address(address[0].split("%")[0]).compressed
+            future = self._pending.get((address, sequence))
+            if future and not future.done():
+                future.set_result(received)
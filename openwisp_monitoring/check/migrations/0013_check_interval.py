@@ -0,0 +1,27 @@
+# Generated by Django 4.2.17 on 2026-10-18 12:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("check", "0012_replace_jsonfield_with_django_builtin"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="check",
+            name="interval",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text=(
+                    "seconds between the executions of the check, leave blank "
+                    "to use the default interval of the check type"
+                ),
+                null=True,
+                validators=[django.core.validators.MinValueValidator(1)],
+                verbose_name="interval",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("check", "0013_check_interval"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="check",
+            name="backoff",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,169 @@
+import hashlib
+import math
+import time
+
+from django.core.cache import cache
+
+from . import settings as app_settings
+
+# the time of the last report of devices which stopped sending
+# data long ago is forgotten, their health status takes over
+_REPORT_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_phase(check_id, interval):
+    """Returns the offset of the executions of a check inside its interval.
+
+    The offset is derived from the hash of the id of the check, hence it
+    doesn't change between runs and the executions of many checks are
+    spread evenly over the interval.
+    """
+    digest = hashlib.sha1(str(check_id).encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 * interval
+
+
+def get_due_times(phase, interval, start, end):
+    """Yields the execution times of a check in the ``[start, end)`` window."""
+    due = start + (phase - start) % interval
+    while due < end:
+        yield due
+        due += interval
+
+
+def _get_report_cache_key(device_id):
+    return f"check-device-report-{device_id}"
+
+
+def record_device_report(device_id, timestamp=None):
+    """Records the time in which a device has sent its monitoring data."""
+    cache.set(
+        _get_report_cache_key(device_id),
+        timestamp or time.time(),
+        timeout=_REPORT_CACHE_TIMEOUT,
+    )
+
+
+def get_stale_devices(device_ids, now=None):
+    """Returns the devices which have stopped sending their monitoring data.
+
+    Only the devices which have sent data in the past are considered,
+    the data is considered missing if it hasn't been received for
+    ``max_report_delay`` seconds (see ``ADAPTIVE_CHECKS``).
+    """
+    device_ids = [str(device_id) for device_id in device_ids]
+    if not device_ids:
+        return set()
+    limit = (now or time.time()) - app_settings.ADAPTIVE_CHECKS["max_report_delay"]
+    reports = cache.get_many([_get_report_cache_key(pk) for pk in device_ids])
+    return {
+        pk for pk in device_ids if reports.get(_get_report_cache_key(pk), limit) < limit
+    }
+
+
+def get_reporting_devices(device_ids, now=None):
+    """Returns the devices which are sending their monitoring data.
+
+    A device is considered to be sending its data if its latest report
+    has been received in the last ``max_report_delay`` seconds.
+    """
+    device_ids = [str(device_id) for device_id in device_ids]
+    if not device_ids:
+        return set()
+    limit = (now or time.time()) - app_settings.ADAPTIVE_CHECKS["max_report_delay"]
+    reports = cache.get_many([_get_report_cache_key(pk) for pk in device_ids])
+    return {
+        pk for pk in device_ids if reports.get(_get_report_cache_key(pk), 0) >= limit
+    }
+
+
+class TimeWheel(object):
+    """Groups the executions of a window of time in slots.
+
+    Each slot spans ``resolution`` seconds, the items of a slot are meant
+    to be dispatched at the beginning of the slot.
+    """
+
+    def __init__(self, start, end, resolution):
+        self.start = start
+        self.resolution = resolution
+        size = max(math.ceil((end - start) / resolution), 1)
+        self.slots = [[] for _ in range(size)]
+
+    def add(self, item, due):
+        self.slots[int((due - self.start) // self.resolution)].append(item)
+
+    def __iter__(self):
+        """Yields the start time and the items of the slots which aren't empty."""
+        for index, items in enumerate(self.slots):
+            if items:
+                yield self.start + index * self.resolution, items
+
+
+class CheckScheduler(object):
+    """Computes which checks are due in each run of ``run_checks``.
+
+    Each run schedules the executions which fall in the window of time
+    going from the end of the window of the previous run to ``tick``
+    seconds in the future. The interval of a check is taken from its
+    ``interval`` field, from ``OPENWISP_MONITORING_CHECK_INTERVALS`` or
+    defaults to ``tick``.
+
+    The interval of the check types listed in ``adaptive["check_types"]``
+    is doubled for each step of ``backoff`` (see ``Check.backoff``), as
+    long as it doesn't exceed ``adaptive["max_interval"]`` seconds.
+    """
+
+    def __init__(self, tick=None, resolution=None, intervals=None, adaptive=None):
+        self.tick = tick or app_settings.CHECK_SCHEDULER_TICK
+        self.resolution = resolution or app_settings.CHECK_SCHEDULER_RESOLUTION
+        if intervals is None:
+            intervals = app_settings.CHECK_INTERVALS
+        self.intervals = intervals
+        if adaptive is None:
+            adaptive = app_settings.ADAPTIVE_CHECKS
+        self.adaptive = adaptive
+
+    def is_adaptive(self, check_type):
+        return self.adaptive["enabled"] and check_type in self.adaptive["check_types"]
+
+    def get_interval(self, check_type, interval=None, backoff=0):
+        interval = interval or self.intervals.get(check_type) or self.tick
+        if backoff:
+            backoff = min(backoff, self.get_max_backoff(check_type, interval))
+        return interval * 2**backoff
+
+    def get_max_backoff(self, check_type, interval=None):
+        """Returns how many times the interval of a check can be doubled."""
+        if not self.is_adaptive(check_type):
+            return 0
+        interval = interval or self.intervals.get(check_type) or self.tick
+        return max(int(math.log2(self.adaptive["max_interval"] / interval)), 0)
+
+    def get_window(self, now, previous_end=None):
+        """Returns the ``(start, end)`` window of the run happening at ``now``.
+
+        The window starts where the window of the previous run ended, so
+        that no execution is skipped or repeated when the runs are late
+        or early, but the executions missed more than ``tick`` seconds
+        ago are not recovered.
+        """
+        start = now if previous_end is None else max(previous_end, now - self.tick)
+        return start, max(start, now + self.tick)
+
+    def get_wheel(self, checks, start, end):
+        """Returns a ``TimeWheel`` with the executions of ``checks``.
+
+        ``checks`` is an iterable of dicts with the ``id``, ``check_type``,
+        ``interval`` and (optionally) ``backoff`` keys.
+        """
+        wheel = TimeWheel(start, end, self.resolution)
+        for check in checks:
+            check_type, interval = check["check_type"], check["interval"]
+            # the phase depends only on the base interval, hence the
+            # executions of checks backing off are a subset of the
+            # executions of the base interval
+            phase = get_phase(check["id"], self.get_interval(check_type, interval))
+            interval = self.get_interval(check_type, interval, check.get("backoff", 0))
+            for due in get_due_times(phase, interval, start, end):
+                wheel.add(check["id"], due)
+        return wheel
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext_lazy as _
 
 from ..settings import get_settings_value
@@ -41,6 +42,31 @@ MANAGEMENT_IP_ONLY = get_settings_value(
     getattr(settings, "OPENWISP_CONTROLLER_MANAGEMENT_IP_ONLY", True),
 )
 PING_CHECK_CONFIG = get_settings_value("PING_CHECK_CONFIG", {})
+PING_BACKEND = get_settings_value("PING_BACKEND", "fping")
+if PING_BACKEND not in ("fping", "icmp"):  # pragma: no cover
+    raise ImproperlyConfigured(
+        'OPENWISP_MONITORING_PING_BACKEND must be either "fping" or "icmp"'
+    )
+# number of checks performed by each task enqueued by
+# "run_checks", 0 means one task per check
+CHECK_BATCH_SIZE = int(get_settings_value("CHECK_BATCH_SIZE", 0))
+# seconds between the runs of "run_checks", 0 disables the scheduler
+CHECK_SCHEDULER_TICK = int(get_settings_value("CHECK_SCHEDULER_TICK", 0))
+CHECK_SCHEDULER_RESOLUTION = int(get_settings_value("CHECK_SCHEDULER_RESOLUTION", 10))
+CHECK_INTERVALS = get_settings_value("CHECK_INTERVALS", {})
+ADAPTIVE_CHECKS = dict(
+    enabled=False,
+    check_types=[
+        "openwisp_monitoring.check.classes.Ping",
+        "openwisp_monitoring.check.classes.ConfigApplied",
+        "openwisp_monitoring.check.classes.DataCollected",
+        "openwisp_monitoring.check.classes.WifiClients",
+    ],
+    max_interval=3600,
+    max_report_delay=900,
+    min_healthy_period=900,
+)
+ADAPTIVE_CHECKS.update(get_settings_value("ADAPTIVE_CHECKS", {}))
 AUTO_WIFI_CLIENTS_CHECK = get_settings_value("AUTO_WIFI_CLIENTS_CHECK", False)
 WIFI_CLIENTS_CHECK_SNOOZE_SCHEDULE = get_settings_value(
     "WIFI_CLIENTS_CHECK_SNOOZE_SCHEDULE", []
@@ -1,9 +1,12 @@
+import hashlib
 import json
 import logging
+import time
 
 from celery import shared_task
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.utils.module_loading import import_string
 from swapper import load_model
@@ -11,6 +14,7 @@ from swapper import load_model
 from openwisp_utils.tasks import OpenwispCeleryTask
 
 from . import settings as app_settings
+from .scheduler import CheckScheduler, get_stale_devices
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +32,15 @@ def run_checks(checks=None):
 
     This allows to enqueue all the checks that need to be performed and
     execute them in parallel with multiple workers if needed.
+
+    When ``OPENWISP_MONITORING_CHECK_BATCH_SIZE`` is set, the checks are
+    enqueued in chunks of the configured size, each one performed by the
+    ``perform_checks_batch`` task.
+
+    When ``OPENWISP_MONITORING_CHECK_SCHEDULER_TICK`` is set, only the
+    checks which are due before the next run are enqueued, each one with
+    a countdown which spreads the executions over time (see
+    ``CheckScheduler``).
     """
     # If checks is None, We should execute all the checks
     if checks is None:
@@ -47,15 +60,73 @@ def run_checks(checks=None):
         if import_string(check).may_execute():
             runnable_checks.append(check)
 
-    iterator = (
-        get_check_model()
-        .objects.filter(is_active=True, check_type__in=runnable_checks)
-        .only("id")
-        .values("id")
-        .iterator()
+    queryset = get_check_model().objects.filter(
+        is_active=True, check_type__in=runnable_checks
+    )
+    if app_settings.CHECK_SCHEDULER_TICK:
+        _schedule_checks(queryset, checks)
+        return
+    iterator = queryset.only("id").values("id").iterator()
+    _dispatch_checks((check["id"] for check in iterator))
+
+
+def _dispatch_checks(uuids, countdown=0):
+    if app_settings.CHECK_BATCH_SIZE > 0:
+        task = perform_checks_batch
+        uuids = _chunks((str(uuid) for uuid in uuids), app_settings.CHECK_BATCH_SIZE)
+    else:
+        task = perform_check
+    for item in uuids:
+        if countdown:
+            task.apply_async(args=[item], countdown=countdown)
+        else:
+            task.delay(item)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _schedule_checks(queryset, checks):
+    scheduler = CheckScheduler()
+    # the window of each run starts where the window
+    # of the previous run (with the same checks) ended
+    cache_key = "check-scheduler-{}".format(
+        hashlib.sha1(",".join(sorted(checks)).encode()).hexdigest()
     )
-    for check in iterator:
-        perform_check.delay(check["id"])
+    now = time.time()
+    start, end = scheduler.get_window(now, cache.get(cache_key))
+    cache.set(cache_key, end, timeout=None)
+    iterator = queryset.values(
+        "id", "check_type", "interval", "object_id", "backoff"
+    ).iterator()
+    if app_settings.ADAPTIVE_CHECKS["enabled"]:
+        iterator = _reset_stale_backoff(iterator)
+    for slot_start, uuids in scheduler.get_wheel(iterator, start, end):
+        _dispatch_checks(uuids, countdown=max(slot_start - now, 0))
+
+
+def _reset_stale_backoff(checks, chunk_size=1000):
+    """Restores the base interval of the devices which stopped sending data."""
+    for chunk in _chunks(checks, chunk_size):
+        stale = get_stale_devices(
+            {check["object_id"] for check in chunk if check["backoff"]}
+        )
+        reset = []
+        for check in chunk:
+            if check["backoff"] and check["object_id"] in stale:
+                check["backoff"] = 0
+                reset.append(check["id"])
+        if reset:
+            get_check_model().objects.filter(pk__in=reset).update(backoff=0)
+        yield from chunk
 
 
 @shared_task(time_limit=30 * 60)
@@ -71,10 +142,84 @@ def perform_check(uuid):
         logger.warning(f"The check with uuid {uuid} has been deleted")
         return
     result = check.perform_check()
+    # checks which have not been performed don't adapt their interval
+    if result is not None:
+        get_check_model().update_backoff([check])
     if settings.DEBUG:  # pragma: nocover
         print(json.dumps(result, indent=4, sort_keys=True))
 
 
+@shared_task(time_limit=30 * 60)
+def perform_checks_batch(uuids):
+    """Performs the checks with the specified uuids.
+
+    The checks are grouped by type and each group is performed by the
+    ``check_many`` method of the check class, which allows some checks
+    (eg: ``Ping``) to perform many checks at once.
+    """
+    checks = list(
+        get_check_model().objects.filter(pk__in=uuids).select_related("content_type")
+    )
+    _load_content_objects(checks)
+    groups = {}
+    for check in checks:
+        # an error in a check (eg: its related object has been deleted)
+        # shall not prevent the other checks from being performed
+        try:
+            if not check.is_performable():
+                continue
+            check_class, check_instance = check.check_class, check.check_instance
+        except Exception as e:
+            logger.exception(f"Error while preparing the check {check.pk}: {e}")
+            continue
+        groups.setdefault(check_class, []).append(check_instance)
+    performed = []
+    for check_class, checks in groups.items():
+        # an error in a group shall not prevent the
+        # other groups from being performed
+        try:
+            results = check_class.check_many(checks)
+        except Exception as e:
+            logger.exception(
+                f"Error while performing {len(checks)} {check_class.__name__} checks: {e}"
+            )
+            continue
+        performed.extend(
+            check.check_instance
+            for check, result in results.items()
+            if result is not None
+        )
+    get_check_model().update_backoff(performed)
+
+
+def _load_content_objects(checks):
+    """Loads the objects related to ``checks`` with one query per type.
+
+    The monitoring data, the organization and the configuration of the
+    devices, which are used by most checks, are loaded in the same query.
+    """
+    Device = load_model("config", "Device")
+    object_ids = {}
+    for check in checks:
+        if check.content_type_id and check.object_id:
+            object_ids.setdefault(check.content_type, set()).add(check.object_id)
+    objects = {}
+    for content_type, ids in object_ids.items():
+        model = content_type.model_class()
+        if model is None:
+            continue
+        queryset = model._default_manager.filter(pk__in=ids)
+        if issubclass(model, Device):
+            queryset = queryset.select_related("monitoring", "organization", "config")
+        for obj in queryset:
+            objects[(content_type.pk, str(obj.pk))] = obj
+    field = get_check_model()._meta.get_field("content_object")
+    for check in checks:
+        obj = objects.get((check.content_type_id, check.object_id))
+        if obj is not None:
+            field.set_cached_value(check, obj)
+
+
 @shared_task(base=OpenwispCeleryTask)
 def auto_create_check(
     model,
@@ -1,7 +1,12 @@
+import os
+import socket
+import struct
+import time
+from collections import deque
 from unittest.mock import patch
 
 from django.core.exceptions import ValidationError
-from django.test import TransactionTestCase, tag
+from django.test import SimpleTestCase, TransactionTestCase, tag
 from swapper import load_model
 
 from ... import settings as monitoring_settings
@@ -11,12 +16,14 @@ from .. import settings as app_settings
 from ..classes import Ping
 from ..classes.ping import get_ping_schema
 from ..exceptions import OperationalError
+from ..icmp import ICMP_ECHO_REPLY, ICMPV6_ECHO_REPLY, ICMPEngine, create_socket
 from . import _FPING_REACHABLE, _FPING_UNREACHABLE
 
 Chart = load_model("monitoring", "Chart")
 AlertSettings = load_model("monitoring", "AlertSettings")
 Metric = load_model("monitoring", "Metric")
 Check = load_model("check", "Check")
+Device = load_model("config", "Device")
 
 
 # These checks read data immediately after writing it, which is unreliable with
@@ -299,3 +306,258 @@ class TestPing(TestDeviceMonitoringMixin, TransactionTestCase):
         self.assertEqual(Chart.objects.exclude(metric__object_id=None).count(), 0)
         check.perform_check()
         self.assertEqual(Chart.objects.exclude(metric__object_id=None).count(), 0)
+
+    def test_parse_many(self):
+        output = (
+            "10.40.0.1 : xmt/rcv/%loss = 5/5/0%, min/avg/max = 0.04/0.08/0.15\n"
+            "10.40.0.2: error while sending ping: No route to host\n"
+            "10.40.0.2 : xmt/rcv/%loss = 5/0/100%\n"
+            "fd00::1 : xmt/rcv/%loss = 5/3/40%, min/avg/max = 1.10/2.20/3.30\n"
+        )
+        self.assertEqual(
+            Ping._parse_many(output),
+            {
+                "10.40.0.1": {
+                    "reachable": 1,
+                    "loss": 0.0,
+                    "rtt_min": 0.04,
+                    "rtt_avg": 0.08,
+                    "rtt_max": 0.15,
+                },
+                "10.40.0.2": {"reachable": 0, "loss": 100.0},
+                "fd00::1": {
+                    "reachable": 1,
+                    "loss": 40.0,
+                    "rtt_min": 1.1,
+                    "rtt_avg": 2.2,
+                    "rtt_max": 3.3,
+                },
+            },
+        )
+
+    @patch.object(app_settings, "AUTO_PING", False)
+    @patch("openwisp_monitoring.check.settings.MANAGEMENT_IP_ONLY", True)
+    def test_check_many(self):
+        org = self._create_org()
+        checks = []
+        for index, params in enumerate([{}, {}, {"count": 3}, {}, {}]):
+            device = self._create_device(
+                organization=org,
+                name=f"device-{index}",
+                mac_address=f"00:11:22:33:44:{index:02d}",
+                management_ip=f"10.40.0.{index}",
+            )
+            checks.append(
+                Check.objects.create(
+                    name="Ping check",
+                    check_type=self._PING,
+                    content_object=device,
+                    params=params,
+                )
+            )
+        # device without IP and "unknown" status
+        Device.objects.filter(pk=checks[3].object_id).update(management_ip=None)
+        # device without IP and "critical" status
+        Device.objects.filter(pk=checks[4].object_id).update(management_ip=None)
+        checks[4].content_object.monitoring.update_status("critical")
+
+        def command(command):
+            lines = []
+            for target in command[7:]:
+                if target == "10.40.0.1":
+                    lines.append(f"{target} : xmt/rcv/%loss = 5/0/100%")
+                else:
+                    lines.append(
+                        f"{target} : xmt/rcv/%loss = 5/5/0%, "
+                        "min/avg/max = 0.04/0.08/0.15"
+                    )
+            return "", "\n".join(lines).encode()
+
+        instances = [Check.objects.get(pk=check.pk).check_instance for check in checks]
+        with patch.object(Ping, "_command", side_effect=command) as mocked_command:
+            results = Ping.check_many(instances)
+        # one fping process for each group of parameters
+        self.assertEqual(mocked_command.call_count, 2)
+        self.assertEqual(
+            mocked_command.call_args_list[0][0][0][-2:], ["10.40.0.0", "10.40.0.1"]
+        )
+        self.assertEqual(mocked_command.call_args_list[1][0][0][2], "-c 3")
+        self.assertEqual(results[instances[0]]["reachable"], 1)
+        self.assertEqual(results[instances[1]], {"reachable": 0, "loss": 100.0})
+        self.assertEqual(results[instances[2]]["rtt_avg"], 0.08)
+        self.assertNotIn(instances[3], results)
+        self.assertEqual(results[instances[4]], {"reachable": 0, "loss": 100.0})
+        metrics = Metric.objects.filter(key="ping")
+        self.assertEqual(metrics.count(), 4)
+        self.assertEqual(AlertSettings.objects.filter(metric__in=metrics).count(), 4)
+        metric = metrics.get(object_id=checks[1].object_id)
+        points = self._read_metric(metric, limit=None, extra_fields=["loss"])
+        self.assertEqual(len(points), 1)
+        self.assertEqual(points[0]["reachable"], 0)
+        self.assertEqual(points[0]["loss"], 100.0)
+
+        with self.subTest("An error in a group doesn't stop the other groups"):
+
+            def failing_command(args):
+                if args[2] == "-c 3":
+                    raise OperationalError("fping failed")
+                return command(args)
+
+            with patch.object(
+                Ping, "_command", side_effect=failing_command
+            ), patch.object(Ping, "store_many", side_effect=ValueError), patch(
+                "openwisp_monitoring.check.classes.ping.logger.exception"
+            ) as mocked_logger:
+                results = Ping.check_many(instances)
+            # the error of the fping process and the error of the write
+            self.assertEqual(mocked_logger.call_count, 2)
+            self.assertNotIn(instances[2], results)
+            self.assertEqual(results[instances[0]]["reachable"], 1)
+            self.assertEqual(results[instances[4]], {"reachable": 0, "loss": 100.0})
+
+        with self.subTest("An error in a check doesn't stop the other checks"):
+            instances = [
+                Check.objects.get(pk=check.pk).check_instance for check in checks
+            ]
+            # the device of the check has been deleted
+            instances[0].related_object = None
+            with patch.object(Ping, "_command", side_effect=command), patch(
+                "openwisp_monitoring.check.classes.ping.logger.exception"
+            ) as mocked_logger:
+                results = Ping.check_many(instances, store=False)
+            mocked_logger.assert_called_once()
+            self.assertNotIn(instances[0], results)
+            self.assertEqual(results[instances[1]], {"reachable": 0, "loss": 100.0})
+            self.assertEqual(results[instances[2]]["rtt_avg"], 0.08)
+            self.assertEqual(results[instances[4]], {"reachable": 0, "loss": 100.0})
+
+    @patch.object(app_settings, "PING_BACKEND", "icmp")
+    @patch.object(ICMPEngine, "ping_many")
+    def test_icmp_backend(self, mocked_ping_many):
+        device = self._create_device(organization=self._create_org())
+        device.management_ip = "10.40.0.1"
+        check = Check(
+            name="Ping check", check_type=self._PING, content_object=device, params={}
+        )
+        mocked_ping_many.return_value = {"10.40.0.1": {"reachable": 0, "loss": 100.0}}
+        with patch.object(Ping, "_command") as mocked_command:
+            result = check.perform_check(store=False)
+        mocked_command.assert_not_called()
+        mocked_ping_many.assert_called_once_with(["10.40.0.1"], 5, 25, 56, 800)
+        self.assertEqual(result, {"reachable": 0, "loss": 100.0})
+
+
+class FakeICMPSocket(object):
+    """Answers echo requests in process.
+
+    A byte is written to a pipe for each reply, which allows the engine
+    to wait for the replies with the event loop like with real sockets.
+    ``drop`` is a callable which receives the target and the sequence
+    of a request and returns ``True`` if the request shall be lost.
+    """
+
+    type = socket.SOCK_DGRAM
+
+    def __init__(self, family, drop=None):
+        self.family = family
+        self.drop = drop or (lambda address, sequence: False)
+        self.sent = []
+        self._replies = deque()
+        self._reader, self._writer = os.pipe()
+        os.set_blocking(self._reader, False)
+
+    def fileno(self):
+        return self._reader
+
+    def sendto(self, data, address):
+        sequence = struct.unpack_from("!H", data, 6)[0]
+        self.sent.append((address[0], sequence, len(data)))
+        if self.drop(address[0], sequence):
+            return len(data)
+        reply = bytearray(data)
+        if self.family == socket.AF_INET:
+            reply[0] = ICMP_ECHO_REPLY
+        else:
+            reply[0] = ICMPV6_ECHO_REPLY
+        self._replies.append((bytes(reply), address))
+        os.write(self._writer, b"\x00")
+        return len(data)
+
+    def recvfrom(self, size):
+        os.read(self._reader, 1)
+        return self._replies.popleft()
+
+    def close(self):
+        os.close(self._reader)
+        os.close(self._writer)
+
+
+class TestICMPEngine(SimpleTestCase):
+    _RESULT_KEYS = TestPing._RESULT_KEYS
+
+    def _get_engine(self, drop=None):
+        self.sockets = {}
+
+        def socket_factory(family):
+            self.sockets[family] = FakeICMPSocket(family, drop=drop)
+            return self.sockets[family]
+
+        return ICMPEngine(socket_factory=socket_factory)
+
+    def test_ping_many(self):
+        def drop(address, sequence):
+            # "10.40.0.2" loses 2 probes out of 5, "10.40.0.3" is unreachable
+            return address == "10.40.0.3" or (address == "10.40.0.2" and sequence < 2)
+
+        engine = self._get_engine(drop=drop)
+        targets = ["10.40.0.1", "10.40.0.2", "10.40.0.3", "fd00::1"]
+        results = engine.ping_many(targets, count=5, interval=10, size=56, timeout=50)
+        self.assertEqual(list(results.keys()), targets)
+        for target in ["10.40.0.1", "fd00::1"]:
+            self.assertEqual(sorted(results[target].keys()), sorted(self._RESULT_KEYS))
+            self.assertEqual(results[target]["reachable"], 1)
+            self.assertEqual(results[target]["loss"], 0.0)
+            self.assertLess(results[target]["rtt_max"], 50)
+        self.assertEqual(results["10.40.0.2"]["loss"], 40.0)
+        self.assertEqual(results["10.40.0.3"], {"reachable": 0, "loss": 100.0})
+        # one socket per address family
+        self.assertEqual(len(self.sockets), 2)
+        sent = self.sockets[socket.AF_INET].sent
+        self.assertEqual(len(sent), 15)
+        # 8 bytes of ICMP header and 56 bytes of data
+        self.assertEqual({size for _, _, size in sent}, {64})
+
+    def test_ping_many_concurrency(self):
+        engine = self._get_engine()
+        targets = [f"10.{index // 250}.0.{index % 250 + 1}" for index in range(2000)]
+        start_time = time.perf_counter()
+        results = engine.ping_many(
+            targets, count=3, interval=100, size=12, timeout=1000
+        )
+        elapsed_time = time.perf_counter() - start_time
+        self.assertEqual(len(results), 2000)
+        self.assertTrue(all(result["reachable"] for result in results.values()))
+        # the targets are probed concurrently: 3 probes sent every 100 ms
+        # take about 200 ms, regardless of the number of targets
+        self.assertLess(elapsed_time, 5)
+
+    def test_unavailable_socket(self):
+        def socket_factory(family):
+            raise PermissionError("Operation not permitted")
+
+        with self.assertRaises(OperationalError):
+            ICMPEngine(socket_factory=socket_factory).ping_many(
+                ["10.40.0.1"], count=2, interval=10, size=12, timeout=50
+            )
+
+    def test_loopback(self):
+        try:
+            create_socket(socket.AF_INET).close()
+        except OSError as e:
+            self.skipTest(f"ICMP sockets are not available: {e}")
+        results = ICMPEngine().ping_many(
+            ["127.0.0.1"], count=3, interval=10, size=56, timeout=500
+        )
+        self.assertEqual(results["127.0.0.1"]["reachable"], 1)
+        self.assertEqual(results["127.0.0.1"]["loss"], 0.0)
+        self.assertLess(results["127.0.0.1"]["rtt_max"], 500)
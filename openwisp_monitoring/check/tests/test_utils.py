@@ -1,15 +1,27 @@
+import random
+import time
+import uuid
 from unittest.mock import patch
 
 from django.core import management
+from django.core.cache import cache
 from django.core.checks import Error
-from django.test import TestCase, TransactionTestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
 from swapper import load_model
 
 from ...device.tests import TestDeviceMonitoringMixin
 from .. import settings as app_settings
 from ..checks import check_wifi_clients_snooze_schedule
-from ..classes import Ping
-from ..tasks import perform_check
+from ..classes import ConfigApplied, Ping
+from ..exceptions import OperationalError
+from ..scheduler import (
+    CheckScheduler,
+    get_due_times,
+    get_phase,
+    get_stale_devices,
+    record_device_report,
+)
+from ..tasks import perform_check, perform_checks_batch, run_checks
 from ..utils import run_checks_async
 from . import _FPING_REACHABLE
 
@@ -41,6 +53,322 @@ class TestUtils(TestDeviceMonitoringMixin, TransactionTestCase):
         perform_check.delay(check.pk)
         mock.assert_called_with(f"The check with uuid {check.pk} has been deleted")
 
+    @patch.object(Ping, "_command", return_value=_FPING_REACHABLE)
+    def test_perform_checks_batch(self, mocked_method):
+        self._create_check()
+        device = self._create_device(
+            organization=self._create_org(name="org2", slug="org2"),
+            name="device2",
+            mac_address="00:11:22:33:44:66",
+        )
+        device.last_ip = "10.40.0.2"
+        device.save()
+        device.deactivate()
+        checks = Check.objects.all()
+        with patch.object(
+            Ping, "check_many", wraps=Ping.check_many
+        ) as mocked_check_many:
+            perform_checks_batch.delay([str(check.pk) for check in checks])
+        # the checks of the deactivated device are not performed
+        mocked_check_many.assert_called_once()
+        self.assertEqual(len(mocked_check_many.call_args[0][0]), 1)
+        mocked_method.assert_called_once()
+
+    @patch.object(app_settings, "CHECK_BATCH_SIZE", 3)
+    def test_run_checks_batch_size(self):
+        org = self._create_org()
+        for index in range(2):
+            self._create_device(
+                organization=org,
+                name=f"device{index}",
+                mac_address=f"00:11:22:33:44:5{index}",
+            )
+        check_ids = set(str(pk) for pk in Check.objects.values_list("pk", flat=True))
+        self.assertEqual(len(check_ids), 6)
+        with patch.object(perform_checks_batch, "delay") as mocked_batch, patch.object(
+            perform_check, "delay"
+        ) as mocked_check:
+            run_checks()
+        mocked_check.assert_not_called()
+        self.assertEqual(mocked_batch.call_count, 2)
+        dispatched = []
+        for call in mocked_batch.call_args_list:
+            dispatched.extend(call[0][0])
+        self.assertEqual(len(dispatched), 6)
+        self.assertEqual(set(dispatched), check_ids)
+
+    def test_perform_checks_batch_queries(self):
+        org = self._create_org()
+        for index in range(3):
+            device = self._create_device(
+                organization=org,
+                name=f"device{index}",
+                mac_address=f"00:11:22:33:44:5{index}",
+            )
+            self._create_config(device=device)
+        checks = Check.objects.filter(check_type=app_settings.CHECK_CLASSES[1][0])
+        uuids = [str(pk) for pk in checks.values_list("pk", flat=True)]
+        self.assertEqual(len(uuids), 3)
+        with patch.object(ConfigApplied, "check_many") as mocked_check_many:
+            # checks, devices (with their monitoring data,
+            # organization and configuration)
+            with self.assertNumQueries(2):
+                perform_checks_batch(uuids)
+                for check in mocked_check_many.call_args[0][0]:
+                    device = check.related_object
+                    device.monitoring.status
+                    device.organization.is_active
+                    device.config.status
+
+    @patch.object(app_settings, "CHECK_SCHEDULER_TICK", 300)
+    @patch.object(perform_check, "delay")
+    @patch.object(perform_check, "apply_async")
+    def test_run_checks_scheduler(self, mocked_apply_async, mocked_delay):
+        self._create_check()
+        cache.clear()
+        mocked_delay.reset_mock()
+        with patch("openwisp_monitoring.check.tasks.time.time", return_value=3000.0):
+            run_checks()
+        dispatched = mocked_apply_async.call_count + mocked_delay.call_count
+        # each check is due once per tick
+        self.assertEqual(dispatched, Check.objects.count())
+        for call in mocked_apply_async.call_args_list:
+            self.assertTrue(0 < call.kwargs["countdown"] < 300)
+        mocked_apply_async.reset_mock()
+        mocked_delay.reset_mock()
+        # the checks have already been scheduled until the next tick
+        with patch("openwisp_monitoring.check.tasks.time.time", return_value=3000.0):
+            run_checks()
+        mocked_apply_async.assert_not_called()
+        mocked_delay.assert_not_called()
+
+    @patch.object(app_settings, "CHECK_SCHEDULER_TICK", 300)
+    @patch.dict(
+        app_settings.ADAPTIVE_CHECKS, {"enabled": True, "min_healthy_period": 0}
+    )
+    def test_adaptive_checks_backoff(self):
+        self._create_check()
+        check = Check.objects.get(check_type=self._PING)
+        device = check.content_object
+        device.monitoring.update_status("ok")
+        record_device_report(device.pk)
+        for backoff in (1, 2, 3, 3):
+            Check.update_backoff([check])
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, backoff)
+
+        with self.subTest("health status changed"):
+            Check.health_status_changed_receiver(instance=device.monitoring)
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 0)
+
+        with self.subTest("threshold crossed"):
+            Check.update_backoff([check])
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 1)
+            Check.threshold_crossed_receiver(target=device)
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 0)
+
+        with self.subTest("device stopped sending data"):
+            record_device_report(device.pk, time.time() - 3600)
+            self.assertEqual(get_stale_devices([device.pk]), {str(device.pk)})
+            Check.update_backoff([check])
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 0)
+            Check.device_metrics_received_receiver(instance=device)
+            self.assertEqual(get_stale_devices([device.pk]), set())
+            Check.update_backoff([check])
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 1)
+
+        with self.subTest("device not healthy"):
+            device.monitoring.update_status("problem")
+            Check.update_backoff([check])
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 0)
+
+        with self.subTest("device healthy for less than min_healthy_period"):
+            device.monitoring.update_status("ok")
+            with patch.dict(app_settings.ADAPTIVE_CHECKS, {"min_healthy_period": 600}):
+                Check.update_backoff([check])
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 0)
+            Check.update_backoff([check])
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 1)
+
+        with self.subTest("ping of devices which don't send data"):
+            cache.clear()
+            Check.update_backoff([check])
+            check.refresh_from_db()
+            self.assertEqual(check.backoff, 0)
+            config_check = Check.objects.get(
+                check_type=app_settings.CHECK_CLASSES[1][0]
+            )
+            Check.update_backoff([config_check])
+            config_check.refresh_from_db()
+            self.assertEqual(config_check.backoff, 1)
+
+    @patch.object(app_settings, "CHECK_SCHEDULER_TICK", 300)
+    @patch.dict(app_settings.ADAPTIVE_CHECKS, {"enabled": True})
+    @patch.object(Check, "update_backoff")
+    def test_perform_check_backoff(self, mocked_update_backoff):
+        self._create_check()
+        check = Check.objects.get(check_type=self._PING)
+        check.content_object.deactivate()
+        perform_check(check.pk)
+        mocked_update_backoff.assert_not_called()
+
+    def test_check_many_error_isolation(self):
+        self._create_check()
+        check = Check.objects.get(check_type=app_settings.CHECK_CLASSES[1][0])
+        checks = [check.check_instance, Check.objects.get(pk=check.pk).check_instance]
+        with patch.object(
+            ConfigApplied, "timed_check", side_effect=[ValueError("error"), 1]
+        ), patch(
+            "openwisp_monitoring.check.classes.base.logger.exception"
+        ) as mocked_logger:
+            results = ConfigApplied.check_many(checks)
+        mocked_logger.assert_called_once()
+        self.assertEqual(results, {checks[1]: 1})
+
+    def test_perform_checks_batch_error_isolation(self):
+        self._create_check()
+        checks = {check.check_type: check for check in Check.objects.all()}
+        ping_check = checks[self._PING]
+        config_check = checks[app_settings.CHECK_CLASSES[1][0]]
+        with patch.object(
+            Ping, "check_many", side_effect=OperationalError("error")
+        ), patch.object(
+            ConfigApplied,
+            "check_many",
+            side_effect=lambda checks: {checks[0]: 1},
+        ), patch.object(
+            Check, "update_backoff"
+        ) as mocked_update_backoff, patch(
+            "openwisp_monitoring.check.tasks.logger.exception"
+        ) as mocked_logger:
+            perform_checks_batch([str(ping_check.pk), str(config_check.pk)])
+        mocked_logger.assert_called_once()
+        # the checks of the other groups are performed anyway
+        self.assertEqual(mocked_update_backoff.call_args[0][0], [config_check])
+
+    def test_perform_checks_batch_check_error_isolation(self):
+        org = self._create_org()
+        for index in range(3):
+            self._create_device(
+                organization=org,
+                name=f"device-{index}",
+                mac_address=f"00:11:22:33:44:{index:02d}",
+            )
+        checks = list(Check.objects.filter(check_type=self._PING))
+        # the check class of this check cannot be loaded
+        Check.objects.filter(pk=checks[0].pk).update(check_type="invalid.Check")
+        with patch.object(
+            Ping,
+            "check_many",
+            side_effect=lambda checks: {check: 1 for check in checks},
+        ) as mocked_check_many, patch.object(
+            Check, "update_backoff"
+        ) as mocked_update_backoff, patch(
+            "openwisp_monitoring.check.tasks.logger.exception"
+        ) as mocked_logger:
+            perform_checks_batch([str(check.pk) for check in checks])
+        mocked_logger.assert_called_once()
+        mocked_check_many.assert_called_once()
+        # the other checks are performed anyway
+        self.assertEqual(
+            {check.pk for check in mocked_update_backoff.call_args[0][0]},
+            {check.pk for check in checks[1:]},
+        )
+
+
+class TestCheckScheduler(SimpleTestCase):
+    def _get_checks(self, count, intervals=(None,)):
+        return [
+            {
+                "id": uuid.UUID(int=index),
+                "check_type": TestUtils._PING,
+                "interval": intervals[index % len(intervals)],
+            }
+            for index in range(count)
+        ]
+
+    def test_interval(self):
+        scheduler = CheckScheduler(
+            tick=300, resolution=10, intervals={TestUtils._PING: 600}
+        )
+        self.assertEqual(scheduler.get_interval(TestUtils._PING, 60), 60)
+        self.assertEqual(scheduler.get_interval(TestUtils._PING), 600)
+        self.assertEqual(scheduler.get_interval("other"), 300)
+
+    def test_adaptive_interval(self):
+        scheduler = CheckScheduler(
+            tick=300,
+            resolution=10,
+            intervals={},
+            adaptive={
+                "enabled": True,
+                "check_types": [TestUtils._PING],
+                "max_interval": 3600,
+            },
+        )
+        self.assertEqual(scheduler.get_max_backoff(TestUtils._PING), 3)
+        self.assertEqual(scheduler.get_interval(TestUtils._PING, backoff=2), 1200)
+        self.assertEqual(scheduler.get_interval(TestUtils._PING, backoff=5), 2400)
+        self.assertEqual(scheduler.get_max_backoff("other"), 0)
+        self.assertEqual(scheduler.get_interval("other", backoff=2), 300)
+        checks = self._get_checks(1000)
+        base = scheduler.get_wheel(checks, 0, 86400)
+        for check in checks:
+            check["backoff"] = 3
+        adaptive = scheduler.get_wheel(checks, 0, 86400)
+        executions = sum(len(items) for items in base.slots)
+        self.assertEqual(executions, 1000 * 86400 / 300)
+        self.assertEqual(sum(len(items) for items in adaptive.slots), executions / 8)
+        # the executions of checks backing off happen
+        # at the same time of the base executions
+        for base_items, items in zip(base.slots, adaptive.slots):
+            self.assertLessEqual(set(items), set(base_items))
+
+    def test_even_load(self):
+        scheduler = CheckScheduler(tick=300, resolution=10, intervals={})
+        checks = self._get_checks(30000)
+        wheel = scheduler.get_wheel(checks, 0, 300)
+        self.assertEqual(len(wheel.slots), 30)
+        mean = len(checks) / len(wheel.slots)
+        for items in wheel.slots:
+            self.assertLess(abs(len(items) - mean), mean * 0.1)
+
+    def test_dispatch_drift(self):
+        resolution, max_lateness = 10, 60
+        scheduler = CheckScheduler(tick=300, resolution=resolution, intervals={})
+        checks = self._get_checks(300, intervals=(60, None, 900))
+        dispatched = {check["id"]: [] for check in checks}
+        rand = random.Random(0)
+        now, previous_end = 100000.0, None
+        first_start = now
+        for _ in range(50):
+            start, end = scheduler.get_window(now, previous_end)
+            for slot_start, uuids in scheduler.get_wheel(checks, start, end):
+                for check_id in uuids:
+                    # the executions are enqueued with a countdown
+                    # or right away if their slot has already started
+                    dispatched[check_id].append(max(slot_start, now))
+            previous_end = end
+            # celery beat runs a bit earlier or later than expected
+            now += 300 + rand.uniform(-30, max_lateness)
+        for check in checks:
+            interval = scheduler.get_interval(check["check_type"], check["interval"])
+            phase = get_phase(check["id"], interval)
+            due_times = list(get_due_times(phase, interval, first_start, previous_end))
+            # executions are neither skipped nor repeated
+            self.assertEqual(len(dispatched[check["id"]]), len(due_times))
+            for dispatch_time, due in zip(dispatched[check["id"]], due_times):
+                self.assertGreater(dispatch_time, due - resolution)
+                self.assertLessEqual(dispatch_time, due + max_lateness)
+
 
 class TestCheckWifiClientsSnoozeSchedule(TestCase):
     def setUp(self):
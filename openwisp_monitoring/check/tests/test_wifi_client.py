@@ -7,6 +7,7 @@ from django.utils import timezone
 from freezegun import freeze_time
 from swapper import load_model
 
+from ...db import timeseries_db
 from ...device.tests import TestDeviceMonitoringMixin
 from .. import settings as app_settings
 from .. import tasks
@@ -75,7 +76,12 @@ class TestWifiClient(
     def test_device_no_wifi_client(self):
         device = self._create_device()
         check = Check.objects.filter(check_type=self._WIFI_CLIENTS).first()
-        result = check.perform_check()
+        with patch.object(
+            timeseries_db, "read_many", wraps=timeseries_db.read_many
+        ) as mocked_read_many:
+            result = check.perform_check()
+        # min and max are counted with a single request
+        self.assertEqual(len(mocked_read_many.call_args_list[0][0][0]), 2)
         self.assertEqual(result, {"wifi_clients_min": 0, "wifi_clients_max": 0})
         wifi_clients_max = Metric.objects.filter(
             key="wifi_clients_max", object_id=device.id
@@ -1,7 +1,6 @@
 import logging
 import operator
 import re
-import sys
 from collections import OrderedDict
 from datetime import datetime
 
@@ -12,12 +11,14 @@ from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from influxdb import InfluxDBClient
 from influxdb.exceptions import InfluxDBClientError
-from influxdb.line_protocol import make_lines
+from influxdb.resultset import ResultSet
 
 from openwisp_monitoring.utils import retry
 
 from ...exceptions import TimeseriesWriteException
 from .. import TIMESERIES_DB
+from .compression import GzipInfluxDBClient, compression_stats
+from .line_protocol import LineProtocolSerializer
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +55,7 @@ class DatabaseClient(object):
     ]
     _FORBIDDEN = ["drop", "create", "delete", "alter", "into"]
     backend_name = "influxdb"
+    _serializer = LineProtocolSerializer()
     _OPERATORS = [
         "=",
         "!=",
@@ -89,15 +91,25 @@ class DatabaseClient(object):
         """Returns an ``InfluxDBClient`` instance."""
         return self.dbs["default"]
 
+    def _get_client(self, **kwargs):
+        options = TIMESERIES_DB.get("OPTIONS", {})
+        args = (
+            TIMESERIES_DB["HOST"],
+            TIMESERIES_DB["PORT"],
+            TIMESERIES_DB["USER"],
+            TIMESERIES_DB["PASSWORD"],
+            self.db_name,
+        )
+        if options.get("gzip", False):
+            return GzipInfluxDBClient(
+                *args, gzip_min_size=options.get("gzip_min_size", 1024), **kwargs
+            )
+        return InfluxDBClient(*args, **kwargs)
+
     @cached_property
     def dbs(self):
         dbs = {
-            "default": InfluxDBClient(
-                TIMESERIES_DB["HOST"],
-                TIMESERIES_DB["PORT"],
-                TIMESERIES_DB["USER"],
-                TIMESERIES_DB["PASSWORD"],
-                self.db_name,
+            "default": self._get_client(
                 use_udp=TIMESERIES_DB.get("OPTIONS", {}).get("udp_writes", False),
                 udp_port=TIMESERIES_DB.get("OPTIONS", {}).get("udp_port", 8089),
             ),
@@ -106,31 +118,28 @@ class DatabaseClient(object):
             # When using UDP, InfluxDB allows only using one retention policy
             # per port. Therefore, we need to have different instances of
             # InfluxDBClient.
-            dbs["short"] = InfluxDBClient(
-                TIMESERIES_DB["HOST"],
-                TIMESERIES_DB["PORT"],
-                TIMESERIES_DB["USER"],
-                TIMESERIES_DB["PASSWORD"],
-                self.db_name,
+            dbs["short"] = self._get_client(
                 use_udp=TIMESERIES_DB.get("OPTIONS", {}).get("udp_writes", False),
                 udp_port=TIMESERIES_DB.get("OPTIONS", {}).get("udp_port", 8089) + 1,
             )
-            dbs["__all__"] = InfluxDBClient(
-                TIMESERIES_DB["HOST"],
-                TIMESERIES_DB["PORT"],
-                TIMESERIES_DB["USER"],
-                TIMESERIES_DB["PASSWORD"],
-                self.db_name,
-            )
+            dbs["__all__"] = self._get_client()
         else:
             dbs["short"] = dbs["default"]
             dbs["__all__"] = dbs["default"]
         return dbs
 
+    def get_compression_stats(self):
+        """Returns the counters of the gzip compression of the current process."""
+        return compression_stats.get()
+
     @cached_property
     def use_udp(self):
         return TIMESERIES_DB.get("OPTIONS", {}).get("udp_writes", False)
 
+    @cached_property
+    def udp_payload_size(self):
+        return TIMESERIES_DB.get("OPTIONS", {}).get("udp_payload_size", 1400)
+
     def _clean_operator(self, op):
         """Returns the operator if it is valid."""
         if op not in self._OPERATORS:
@@ -161,6 +170,79 @@ class DatabaseClient(object):
         elif exists and duration_changed:
             self.db.alter_retention_policy(name=name, duration=duration)
 
+    _rollup_functions = ["MEAN", "SUM", "MAX", "MIN"]
+
+    def _get_rollup_query(
+        self, retention_policy, interval, source_retention_policy, where=""
+    ):
+        functions = ", ".join(f"{function}(*)" for function in self._rollup_functions)
+        return (
+            f"SELECT {functions} "
+            f'INTO "{self.db_name}"."{retention_policy}".:MEASUREMENT '
+            f'FROM "{self.db_name}"."{source_retention_policy}"./.*/ {where}'
+            f"GROUP BY time({interval}), *"
+        )
+
+    @retry
+    def create_or_alter_rollup_query(
+        self,
+        retention_policy,
+        interval,
+        source_retention_policy="autogen",
+        resample_every=None,
+        resample_for=None,
+    ):
+        """Creates or alters the continuous query of a rollup retention policy.
+
+        The continuous query stores the ``MEAN``, ``SUM``, ``MAX`` and
+        ``MIN`` of every field of every measurement, grouped by
+        ``interval`` and by all the tags, in ``retention_policy``
+        (eg: ``mean_rx_bytes``, ``sum_rx_bytes``).
+        """
+        name = f"{retention_policy}_rollup"
+        select = self._get_rollup_query(
+            retention_policy, interval, source_retention_policy
+        )
+        resample_opts = []
+        if resample_every:
+            resample_opts.append(f"EVERY {resample_every}")
+        if resample_for:
+            resample_opts.append(f"FOR {resample_for}")
+        resample_opts = " ".join(resample_opts) or None
+        try:
+            # no-op if the same continuous query already exists
+            self.db.create_continuous_query(name, select, self.db_name, resample_opts)
+        except InfluxDBClientError as e:
+            # continuous queries cannot be altered
+            if "already exists" not in str(e):
+                raise
+            self.db.drop_continuous_query(name, self.db_name)
+            try:
+                self.db.create_continuous_query(
+                    name, select, self.db_name, resample_opts
+                )
+            except InfluxDBClientError as e:
+                # recreated in the meantime by another process
+                if "already exists" not in str(e):
+                    raise
+
+    @retry
+    def rollup(
+        self, retention_policy, interval, start, end, source_retention_policy="autogen"
+    ):
+        """Aggregates the data between ``start`` and ``end`` in a rollup.
+
+        Performs the same aggregation of the continuous query created by
+        ``create_or_alter_rollup_query``, ``start`` and ``end`` are
+        timestamps in seconds and shall be aligned to ``interval``.
+        """
+        where = f"WHERE time >= {int(start)}s AND time < {int(end)}s "
+        self.query(
+            self._get_rollup_query(
+                retention_policy, interval, source_retention_policy, where
+            )
+        )
+
     @retry
     def query(self, query, precision=None, **kwargs):
         database = kwargs.get("database") or self.db_name
@@ -172,12 +254,29 @@ class DatabaseClient(object):
             database=database,
         )
 
+    def query_many(self, queries, precision=None, **kwargs):
+        """Executes many queries with a single request.
+
+        The statements are joined with ``;`` and sent in a single
+        ``/query`` call, the list of ``ResultSet`` objects is returned in
+        the same order of ``queries``.
+        """
+        if not queries:
+            return []
+        query = "; ".join(query.strip().rstrip(";") for query in queries)
+        result = self.query(query, precision=precision, **kwargs)
+        if not isinstance(result, list):
+            result = [result]
+        return result
+
     def _write(self, points, database, retention_policy):
         """
         Write data points in the specified database.
 
-        This method writes data points to the specified database. If the size of the data exceeds
-        the limit of a UDP packet, it falls back to using a TCP connection for writing data.
+        When using UDP, the data points are packed in as many UDP packets
+        as needed, each one containing at most ``udp_payload_size`` bytes.
+        The data points which do not fit in a UDP packet on their own are
+        written using a TCP connection.
 
         Args:
             points (list): The data points to be stored.
@@ -191,19 +290,27 @@ class DatabaseClient(object):
             TimeseriesWriteException: If there is an error while writing the data points.
         """
         db = self.dbs["short"] if retention_policy else self.dbs["default"]
-        # If the size of data exceeds the limit of the UDP packet, then
-        # fallback to use TCP connection for writing data.
-        lines = make_lines({"points": points})
-        if sys.getsizeof(lines) > 65000:
-            # Size exceeds UDP limit, write using TCP.
-            db = self.dbs["__all__"]
+        lines = self._serializer.get_lines(points)
         try:
-            return db.write_points(
-                points=lines.split("\n")[:-1],
-                database=database,
-                retention_policy=retention_policy,
-                protocol="line",
-            )
+            if not self.use_udp:
+                return db.write_points(
+                    points=lines,
+                    database=database,
+                    retention_policy=retention_policy,
+                    protocol="line",
+                )
+            packets, oversized_lines = self._get_udp_packets(lines)
+            for packet in packets:
+                db.send_packet(packet, protocol="line")
+            if oversized_lines:
+                # Size exceeds UDP limit, write using TCP.
+                self.dbs["__all__"].write_points(
+                    points=oversized_lines,
+                    database=database,
+                    retention_policy=retention_policy,
+                    protocol="line",
+                )
+            return True
         except Exception as exception:
             logger.warning(f"got exception while writing to tsdb: {exception}")
             if isinstance(exception, self.client_error):
@@ -213,6 +320,33 @@ class DatabaseClient(object):
                     return
             raise TimeseriesWriteException
 
+    def _get_udp_packets(self, lines):
+        """Packs line protocol lines in UDP packets.
+
+        Returns the list of packets (lists of lines) whose payload does not
+        exceed ``udp_payload_size`` bytes and the list of lines which are
+        too big to be sent in a UDP packet.
+        """
+        packets = []
+        oversized_lines = []
+        packet = []
+        packet_size = 0
+        for line in lines:
+            # each line is terminated by a newline
+            line_size = len(line.encode("utf-8")) + 1
+            if line_size > self.udp_payload_size:
+                oversized_lines.append(line)
+                continue
+            if packet_size + line_size > self.udp_payload_size:
+                packets.append(packet)
+                packet = []
+                packet_size = 0
+            packet.append(line)
+            packet_size += line_size
+        if packet:
+            packets.append(packet)
+        return packets, oversized_lines
+
     def _get_timestamp(self, timestamp=None):
         timestamp = timestamp or now()
         if isinstance(timestamp, datetime):
@@ -249,6 +383,7 @@ class DatabaseClient(object):
                     "tags": data.get("tags"),
                     "fields": data.get("values"),
                     "time": timestamp,
+                    "metric": data.get("metric"),
                 }
             )
         for database in data_points.keys():
@@ -260,6 +395,22 @@ class DatabaseClient(object):
                 )
 
     def read(self, key, fields, tags, **kwargs):
+        q = self._get_read_query(key, fields, tags, **kwargs)
+        precision = kwargs.get("precision", "s")
+        return list(self.query(q, precision=precision).get_points())
+
+    def read_many(self, reads, precision="s"):
+        """Executes many reads with a single request.
+
+        ``reads`` is a list of dictionaries containing the arguments
+        accepted by ``read``, the statements are joined in a single query
+        and the points of each statement are returned in the same order.
+        """
+        queries = [self._get_read_query(**options) for options in reads]
+        result = self.query_many(queries, precision=precision)
+        return [list(result_set.get_points()) for result_set in result]
+
+    def _get_read_query(self, key, fields, tags, **kwargs):
         extra_fields = kwargs.get("extra_fields")
         since = kwargs.get("since")
         order = kwargs.get("order")
@@ -268,7 +419,6 @@ class DatabaseClient(object):
         count_fields = kwargs.get("count_fields", [])
         rp = kwargs.get("retention_policy")
         where = kwargs.get("where", [])
-        precision = kwargs.get("precision", "s")
 
         # Ensure fields is a list (in case it's passed as a string)
         if isinstance(fields, str):
@@ -345,10 +495,15 @@ class DatabaseClient(object):
             q = f"{q} ORDER BY {order}"
         if limit:
             q = f"{q} LIMIT {limit}"
-        return list(self.query(q, precision=precision).get_points())
+        return q
 
     def get_list_query(self, query, precision="s"):
-        result = self.query(query, precision=precision)
+        """Returns the result of ``query`` as a list of points.
+
+        ``query`` can also be one of the results returned by
+        ``query_many``.
+        """
+        result = self._get_result(query, precision)
         if not len(result.keys()) or result.keys()[0][1] is None:
             return list(result.get_points())
         # Handles query which contains "GROUP BY TAG" clause
@@ -367,6 +522,33 @@ class DatabaseClient(object):
                     result_points[values["time"]] = values
         return list(result_points.values())
 
+    def get_columns_query(self, query, precision="s"):
+        """Returns the result of ``query`` as a dictionary of columns.
+
+        Avoids building a dictionary for each point, the result is
+        ``None`` if it cannot be represented as a single table (eg: query
+        containing "GROUP BY TAG"), in this case ``get_list_query``
+        shall be used. Like in ``get_list_query``, ``query`` can also be
+        one of the results returned by ``query_many``.
+        """
+        result = self._get_result(query, precision)
+        series = result.raw.get("series", [])
+        if len(series) > 1 or (series and series[0].get("tags")):
+            return None
+        if not series or not series[0].get("values"):
+            return OrderedDict()
+        columns = series[0]["columns"]
+        values = zip(*series[0]["values"])
+        return OrderedDict(
+            (column, list(column_values))
+            for column, column_values in zip(columns, values)
+        )
+
+    def _get_result(self, query, precision):
+        if isinstance(query, ResultSet):
+            return query
+        return self.query(query, precision=precision)
+
     @retry
     def get_list_retention_policies(self):
         return self.db.get_list_retention_policies()
@@ -439,6 +621,46 @@ class DatabaseClient(object):
             query = f"{query} LIMIT 1"
         return f"{query} tz('{timezone}')"
 
+    _rollup_field_regex = re.compile(
+        r'\b(SUM|MEAN|MAX|MIN)\(\s*"?([\w-]+)"?\s*\)', flags=re.IGNORECASE
+    )
+    _function_regex = re.compile(r"\b(\w+)\s*\(")
+    _from_regex = re.compile(r"\bFROM\s+(\"[\w-]+\"|\w+)(?=\s|$)", flags=re.IGNORECASE)
+    # functions which can be applied on the aggregated values of a rollup
+    _rollup_transforms = ["ROUND", "ABS", "CEIL", "FLOOR", "TIME", "TZ"]
+
+    def get_rollup_query(self, query, retention_policy):
+        """Rewrites a chart query to read data from a rollup retention policy.
+
+        Each aggregated field is replaced with the field which stores the
+        same aggregation in the rollup (eg: ``SUM(rx_bytes)`` becomes
+        ``SUM("sum_rx_bytes")``). Returns ``None`` if the query uses
+        functions which cannot be computed on rolled up data (eg:
+        ``COUNT``, ``MODE``) or reads from more than one measurement.
+        """
+        functions = [
+            function
+            for function in self._function_regex.findall(query)
+            if function.upper() not in self._rollup_transforms
+        ]
+        if not functions or len(functions) != len(
+            self._rollup_field_regex.findall(query)
+        ):
+            return None
+        if len(re.findall(r"\bFROM\b", query, flags=re.IGNORECASE)) != 1:
+            return None
+        if not self._from_regex.search(query):
+            return None
+        query = self._rollup_field_regex.sub(
+            lambda match: '{0}("{1}_{2}")'.format(
+                match.group(1), match.group(1).lower(), match.group(2)
+            ),
+            query,
+        )
+        return self._from_regex.sub(
+            lambda match: f'FROM "{retention_policy}".{match.group(1)}', query
+        )
+
     _group_by_time_tag_regex = re.compile(
         r"GROUP BY ((time\(\w+\))(?:,\s+\w+)?)", flags=re.IGNORECASE
     )
@@ -0,0 +1,109 @@
+import gzip
+import json
+import threading
+
+from influxdb import InfluxDBClient
+
+
+class CompressionStats(object):
+    """Counts the bytes sent to and received from InfluxDB.
+
+    The counters are kept in memory, hence they refer only to the
+    current process.
+    """
+
+    KEYS = (
+        "requests_compressed",
+        "request_bytes",
+        "request_bytes_compressed",
+        "responses_compressed",
+        "response_bytes",
+        "response_bytes_compressed",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = dict.fromkeys(self.KEYS, 0)
+
+    def add(self, direction, size, compressed_size):
+        with self._lock:
+            self._counters[f"{direction}s_compressed"] += 1
+            self._counters[f"{direction}_bytes"] += size
+            self._counters[f"{direction}_bytes_compressed"] += compressed_size
+
+    def get(self):
+        """Returns the counters and the bytes saved by compression."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["bytes_saved"] = (
+            stats["request_bytes"]
+            - stats["request_bytes_compressed"]
+            + stats["response_bytes"]
+            - stats["response_bytes_compressed"]
+        )
+        return stats
+
+
+compression_stats = CompressionStats()
+
+
+class GzipInfluxDBClient(InfluxDBClient):
+    """``InfluxDBClient`` which compresses requests and responses with gzip.
+
+    The bodies of the requests (eg: writes) are compressed only when
+    they're at least ``gzip_min_size`` bytes long. Compressed responses
+    (eg: query results) are requested with the ``Accept-Encoding``
+    header and decompressed transparently by ``requests``.
+    """
+
+    compresslevel = 6
+
+    def __init__(self, *args, gzip_min_size=1024, stats=compression_stats, **kwargs):
+        # compression is handled in "request"
+        kwargs["gzip"] = False
+        super().__init__(*args, **kwargs)
+        self.gzip_min_size = gzip_min_size
+        self.stats = stats
+
+    def request(
+        self,
+        url,
+        method="GET",
+        params=None,
+        data=None,
+        stream=False,
+        expected_response_code=200,
+        headers=None,
+    ):
+        headers = dict(headers or self._headers)
+        headers["Accept-Encoding"] = "gzip"
+        if isinstance(data, (dict, list)):
+            data = json.dumps(data)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if data is not None and len(data) >= self.gzip_min_size:
+            size = len(data)
+            data = gzip.compress(data, compresslevel=self.compresslevel)
+            headers["Content-Encoding"] = "gzip"
+            self.stats.add("request", size, len(data))
+        response = super().request(
+            url,
+            method=method,
+            params=params,
+            data=data,
+            stream=stream,
+            expected_response_code=expected_response_code,
+            headers=headers,
+        )
+        if (
+            not stream
+            and response.headers.get("Content-Encoding") == "gzip"
+            and response.content
+        ):
+            # the number of bytes read from the network
+            self.stats.add("response", len(response.content), response.raw.tell())
+        return response
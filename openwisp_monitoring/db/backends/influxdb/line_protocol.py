@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from dateutil.parser import parse as parse_date
+from influxdb.line_protocol import _escape_tag, _escape_value
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@lru_cache(maxsize=4096)
+def _get_prefix(measurement, tags):
+    """Returns the escaped ``measurement,tag=value`` prefix of a line.
+
+    ``tags`` is a tuple of ``(key, value)`` pairs.
+    """
+    prefix = [_escape_tag(measurement)]
+    for key, value in sorted(tags):
+        key = _escape_tag(key)
+        value = _escape_tag(value)
+        if key and value:
+            prefix.append(f"{key}={value}")
+    return ",".join(prefix)
+
+
+def _get_field(key, value):
+    # faster paths for the most common types,
+    # other types are handled by the influxdb library
+    value_type = type(value)
+    if value_type is float:
+        value = repr(value)
+    elif value_type is int:
+        value = f"{value}i"
+    else:
+        value = _escape_value(value)
+    if not value:
+        return None
+    return f"{_escape_tag(key)}={value}"
+
+
+def get_timestamp(timestamp):
+    """Converts ``timestamp`` to nanoseconds since the epoch.
+
+    Accepts integers (which are assumed to be in nanoseconds), datetime
+    objects and ISO 8601 strings.
+    """
+    if isinstance(timestamp, int):
+        return timestamp
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            timestamp = parse_date(timestamp)
+    if not timestamp.tzinfo:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    delta = timestamp - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000000 + delta.microseconds * 1000
+
+
+class LineProtocolSerializer(object):
+    """Serializes data points to the InfluxDB line protocol.
+
+    Produces the same output of ``influxdb.line_protocol.make_lines``,
+    but the escaped ``measurement,tag=value`` prefix of the lines is
+    computed once per metric (or per combination of measurement and
+    tags) and integer timestamps in nanoseconds are used directly.
+
+    Each point is a dictionary with the keys ``measurement``, ``tags``,
+    ``fields``, ``time`` and optionally ``metric``, the ``Metric``
+    instance which produced the point. The prefix cached in the metric
+    is invalidated by ``Metric`` when its tags change.
+    """
+
+    # attribute of Metric instances which is reset when the tags change
+    metric_cache_attr = "_timeseries_tags_cache"
+
+    def get_prefix(self, measurement, tags, metric=None):
+        metric_cache = getattr(metric, "__dict__", None)
+        if metric_cache is not None:
+            cached = metric_cache.get(self.metric_cache_attr)
+            if cached and cached[0] == measurement:
+                return cached[1]
+        tags = tuple(tags.items()) if tags else ()
+        try:
+            prefix = _get_prefix(measurement, tags)
+        except TypeError:
+            # unhashable tag values
+            prefix = _get_prefix.__wrapped__(measurement, tags)
+        if metric_cache is not None:
+            metric_cache[self.metric_cache_attr] = (measurement, prefix)
+        return prefix
+
+    def get_line(self, point):
+        prefix = self.get_prefix(
+            point["measurement"], point.get("tags"), point.get("metric")
+        )
+        fields = point["fields"]
+        fields = ",".join(
+            field
+            for field in (_get_field(key, fields[key]) for key in sorted(fields))
+            if field
+        )
+        line = f"{prefix} {fields}" if fields else prefix
+        if point.get("time") is not None:
+            line = f"{line} {get_timestamp(point['time'])}"
+        return line
+
+    def get_lines(self, points):
+        """Returns the list of lines of ``points``."""
+        get_line = self.get_line
+        return [get_line(point) for point in points]
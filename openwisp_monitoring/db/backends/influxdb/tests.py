@@ -1,13 +1,17 @@
+import socket
 from datetime import datetime, timedelta
 from unittest.mock import patch
 
 from celery.exceptions import Retry
+from django.apps import apps
 from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models.signals import post_migrate
 from django.test import TestCase, tag
 from django.utils.timezone import make_aware, now
 from freezegun import freeze_time
 from influxdb import InfluxDBClient
 from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+from influxdb.line_protocol import make_lines
 from pytz import timezone as tz
 from swapper import load_model
 
@@ -19,14 +23,19 @@ from openwisp_monitoring.device.utils import (
     DEFAULT_RP,
     SHORT_RP,
     manage_default_retention_policy,
+    manage_rollup_retention_policies,
     manage_short_retention_policy,
 )
-from openwisp_monitoring.monitoring.tests import TestMonitoringMixin
+from openwisp_monitoring.monitoring import settings as monitoring_settings
+from openwisp_monitoring.monitoring.tasks import rollup_timeseries
+from openwisp_monitoring.monitoring.tests import TestMonitoringMixin, benchmark
 from openwisp_monitoring.settings import MONITORING_TIMESERIES_RETRY_OPTIONS
 from openwisp_utils.tests import capture_stderr
 
 from ...exceptions import TimeseriesWriteException
-from .. import get_timeseries_database, timeseries_db
+from .. import TIMESERIES_DB, get_timeseries_database, timeseries_db
+from .compression import CompressionStats, GzipInfluxDBClient
+from .line_protocol import LineProtocolSerializer
 
 Chart = load_model("monitoring", "Chart")
 Notification = load_model("openwisp_notifications", "Notification")
@@ -121,6 +130,46 @@ class TestDatabaseClient(TestMonitoringMixin, TestCase):
         measurement = timeseries_db.get_list_query(q)[0]
         self.assertEqual(measurement["value"], 3)
 
+    def test_get_columns_query(self):
+        om = self._create_object_metric()
+        om.write(3)
+        om.write(4)
+        q = f"select value from test_metric WHERE object_id = '{om.object_id}'"
+        points = timeseries_db.get_list_query(q)
+        columns = timeseries_db.get_columns_query(q)
+        self.assertEqual(list(columns.keys()), ["time", "value"])
+        self.assertEqual(columns["value"], [3, 4])
+        self.assertEqual(columns["time"], [point["time"] for point in points])
+        with self.subTest("empty result"):
+            q = "select value from test_metric WHERE object_id = 'unknown'"
+            self.assertEqual(timeseries_db.get_columns_query(q), {})
+        with self.subTest("group by tag"):
+            q = "select value from test_metric GROUP BY object_id"
+            self.assertIsNone(timeseries_db.get_columns_query(q))
+
+    def test_query_many(self):
+        om = self._create_object_metric()
+        om.write(3)
+        om.write(4)
+        queries = [
+            f"select value from test_metric WHERE object_id = '{om.object_id}'",
+            "select value from test_metric WHERE object_id = 'unknown';",
+            f"select sum(value) from test_metric WHERE object_id = '{om.object_id}'",
+        ]
+        with patch.object(
+            timeseries_db, "query", wraps=timeseries_db.query
+        ) as mocked_query:
+            results = timeseries_db.query_many(queries, precision="s")
+        mocked_query.assert_called_once()
+        self.assertEqual(len(results), 3)
+        self.assertEqual(
+            timeseries_db.get_list_query(results[0]),
+            timeseries_db.get_list_query(queries[0]),
+        )
+        self.assertEqual(timeseries_db.get_columns_query(results[1]), {})
+        self.assertEqual(timeseries_db.get_list_query(results[2])[0]["sum"], 7)
+        self.assertEqual(timeseries_db.query_many([]), [])
+
     def test_general_same_key_different_fields(self):
         down = self._create_general_metric(
             name="traffic (download)", key="traffic", field_name="download"
@@ -252,6 +301,69 @@ class TestDatabaseClient(TestMonitoringMixin, TestCase):
         self.assertEqual(rp[1]["default"], False)
         self.assertEqual(rp[1]["duration"], SHORT_RETENTION_POLICY)
 
+    def test_get_rollup_query(self):
+        rollups = {
+            "rollup_1h": {"interval": "1h", "duration": "0s"},
+            "rollup_1d": {"interval": "1d", "duration": "0s"},
+        }
+        c = self._create_chart(test_data=None, configuration="uptime")
+        with patch.object(monitoring_settings, "ROLLUP_RETENTION_POLICIES", rollups):
+            self.assertNotIn("rollup", c.get_query(time="1d"))
+            q = c.get_query(time="30d", timezone="UTC")
+            self.assertIn('MEAN("mean_value")*100', q)
+            self.assertIn('FROM "rollup_1d".test_metric', q)
+            # daily rollups are aligned to UTC
+            q = c.get_query(time="30d", timezone="Europe/Rome")
+            self.assertIn('FROM "rollup_1h".test_metric', q)
+            q = c.get_query(time="30d", timezone="Asia/Kolkata")
+            self.assertNotIn("rollup", q)
+        self.assertIsNone(
+            timeseries_db.get_rollup_query(
+                "SELECT COUNT(DISTINCT(mac)) FROM wifi GROUP BY time(1d)", "rollup_1d"
+            )
+        )
+
+    def test_rollup(self):
+        rollups = {
+            "rollup_1h": {"interval": "1h", "duration": "0s", "continuous_query": False}
+        }
+        c = self._create_chart(configuration="uptime")
+        expected = c.read(time="30d")
+        with patch.object(monitoring_settings, "ROLLUP_RETENTION_POLICIES", rollups):
+            manage_rollup_retention_policies()
+            rp = timeseries_db.get_list_retention_policies()
+            self.assertIn("rollup_1h", [policy["name"] for policy in rp])
+            rollup_timeseries.delay(start=str(now() - timedelta(days=3)))
+            self.assertIn('FROM "rollup_1h"', c.get_query(time="30d"))
+            self.assertEqual(c.read(time="30d"), expected)
+
+    def test_rollup_retention_policies_post_migrate(self):
+        app_config = apps.get_app_config("device_monitoring")
+        with patch(
+            "openwisp_monitoring.device.apps.manage_rollup_retention_policies"
+        ) as mocked_manage:
+            post_migrate.send(
+                sender=app_config,
+                app_config=app_config,
+                verbosity=0,
+                interactive=False,
+                using="default",
+                apps=apps,
+                plan=[],
+            )
+        mocked_manage.assert_called_once()
+
+    def test_rollup_query_recreated_concurrently(self):
+        error = InfluxDBClientError("continuous query already exists")
+        with patch.object(
+            timeseries_db.db, "create_continuous_query", side_effect=[error, error]
+        ) as mocked_create, patch.object(
+            timeseries_db.db, "drop_continuous_query"
+        ) as mocked_drop:
+            timeseries_db.create_or_alter_rollup_query("rollup_1h", "1h")
+        self.assertEqual(mocked_create.call_count, 2)
+        mocked_drop.assert_called_once()
+
     def test_query_set(self):
         c = self._create_chart(configuration="histogram")
         expected = (
@@ -391,6 +503,41 @@ class TestDatabaseClient(TestMonitoringMixin, TestCase):
                 current=False,
             )
 
+    def test_gzip_compression(self):
+        stats = CompressionStats()
+        client = GzipInfluxDBClient(
+            TIMESERIES_DB["HOST"],
+            TIMESERIES_DB["PORT"],
+            TIMESERIES_DB["USER"],
+            TIMESERIES_DB["PASSWORD"],
+            self.TEST_DB,
+            gzip_min_size=1024,
+            stats=stats,
+        )
+        with self.subTest("Small payloads are not compressed"):
+            client.write_points(["test_gzip value=1i 1"], protocol="line")
+            self.assertEqual(stats.get()["requests_compressed"], 0)
+        with self.subTest("Large payloads are compressed"):
+            lines = [
+                f"test_gzip,object_id={index} value={index}i {index + 2}"
+                for index in range(500)
+            ]
+            client.write_points(lines, protocol="line")
+            result = stats.get()
+            self.assertEqual(result["requests_compressed"], 1)
+            self.assertGreater(
+                result["request_bytes"], result["request_bytes_compressed"]
+            )
+        with self.subTest("Query results are compressed"):
+            points = list(client.query("SELECT * FROM test_gzip").get_points())
+            self.assertEqual(len(points), 501)
+            result = stats.get()
+            self.assertEqual(result["responses_compressed"], 1)
+            self.assertGreater(
+                result["response_bytes"], result["response_bytes_compressed"]
+            )
+            self.assertGreater(result["bytes_saved"], 0)
+
     def _retry_task(self, task_signature):
         task_kwargs = task_signature.kwargs
         task_signature.type.run(**task_kwargs)
@@ -427,3 +574,132 @@ class TestDatabaseClientUdp(TestMonitoringMixin, TestCase):
             ).get_points()
         )
         self.assertEqual(len(measurement), 1)
+
+    def _receive_udp_lines(self, listener, expected):
+        packets = []
+        lines = []
+        while len(lines) < expected:
+            packet = listener.recv(65535)
+            packets.append(packet)
+            lines.extend(packet.decode().split("\n")[:-1])
+        return packets, lines
+
+    def test_udp_write_packets(self):
+        points = [
+            {
+                "measurement": "test_udp_write",
+                "tags": {"object_id": str(index)},
+                "fields": {"value": index},
+            }
+            for index in range(200)
+        ]
+        oversized_point = {
+            "measurement": "test_udp_write",
+            "fields": {"value": "O" * 2000},
+        }
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as listener:
+            listener.bind(("127.0.0.1", 0))
+            listener.settimeout(5)
+            udp_db = InfluxDBClient(
+                "127.0.0.1", use_udp=True, udp_port=listener.getsockname()[1]
+            )
+            tcp_db = InfluxDBClient("127.0.0.1")
+            with patch.dict(
+                timeseries_db.__dict__,
+                {
+                    "dbs": {"default": udp_db, "short": udp_db, "__all__": tcp_db},
+                    "use_udp": True,
+                    "udp_payload_size": 1400,
+                },
+            ), patch.object(tcp_db, "write_points") as mocked_tcp_write:
+                timeseries_db._write(
+                    points + [oversized_point],
+                    database=self.TEST_DB,
+                    retention_policy=None,
+                )
+                packets, lines = self._receive_udp_lines(listener, len(points))
+        self.assertGreater(len(packets), 1)
+        for packet in packets:
+            self.assertLessEqual(len(packet), 1400)
+        self.assertEqual(
+            sorted(lines),
+            sorted(make_lines({"points": points}).split("\n")[:-1]),
+        )
+        mocked_tcp_write.assert_called_once_with(
+            points=[make_lines({"points": [oversized_point]}).strip()],
+            database=self.TEST_DB,
+            retention_policy=None,
+            protocol="line",
+        )
+
+
+class TestLineProtocolSerializer(TestMonitoringMixin, TestCase):
+    def _get_points(self, metric, number):
+        start = now()
+        return [
+            {
+                "measurement": metric.key,
+                "tags": metric.tags,
+                "fields": {
+                    "value": index,
+                    "float": index / 3,
+                    "string": 'quote " and\nnewline',
+                    "bool": bool(index % 2),
+                    "none": None,
+                },
+                "time": (start + timedelta(seconds=index)).isoformat(),
+                "metric": metric,
+            }
+            for index in range(number)
+        ]
+
+    def _make_lines(self, points):
+        points = [
+            {key: value for key, value in point.items() if key != "metric"}
+            for point in points
+        ]
+        return make_lines({"points": points}).split("\n")[:-1]
+
+    def test_get_lines(self):
+        metric = self._create_object_metric(
+            name="test serializer",
+            main_tags={"ifname": "eth0 ,=1"},
+            extra_tags={"empty": ""},
+        )
+        serializer = LineProtocolSerializer()
+        points = self._get_points(metric, 10)
+        points += [
+            {"measurement": "int time", "fields": {"value": 1}, "time": 10**18},
+            {"measurement": "datetime", "fields": {"value": 1}, "time": now()},
+            {"measurement": "no time", "tags": {"a": "b"}, "fields": {"value": 1}},
+        ]
+        self.assertEqual(serializer.get_lines(points), self._make_lines(points))
+
+        with self.subTest("The prefix is cached in the metric"):
+            self.assertIn(serializer.metric_cache_attr, metric.__dict__)
+
+        with self.subTest("The prefix is invalidated when the tags change"):
+            metric.extra_tags = {"added": "tag"}
+            self.assertNotIn(serializer.metric_cache_attr, metric.__dict__)
+            points = self._get_points(metric, 1)
+            self.assertIn("added=tag", serializer.get_lines(points)[0])
+            metric.main_tags = {"ifname": "eth1"}
+            points = self._get_points(metric, 1)
+            self.assertIn("ifname=eth1", serializer.get_lines(points)[0])
+
+    @tag("benchmark")
+    def test_throughput_benchmark(self):
+        metric = self._create_object_metric(
+            name="test serializer", main_tags={"ifname": "eth0"}
+        )
+        serializer = LineProtocolSerializer()
+        points = self._get_points(metric, 1000)
+        self.assertEqual(serializer.get_lines(points), self._make_lines(points))
+        benchmark(
+            f"make_lines ({len(points)} points)",
+            lambda: make_lines({"points": points}),
+        )
+        benchmark(
+            f"LineProtocolSerializer.get_lines ({len(points)} points)",
+            lambda: serializer.get_lines(points),
+        )
@@ -136,6 +136,7 @@ class CheckInline(DeactivatedDeviceReadOnlyInlinePermissionMixin, GenericStacked
     fields = [
         "is_active",
         "check_type",
+        "interval",
     ]
     inline_permission_suffix = "check_inline"
 
@@ -0,0 +1,34 @@
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser, JSONParser
+
+
+class NDJSONParser(BaseParser):
+    """Parses newline delimited JSON (one JSON document per line).
+
+    Returns the list of the documents, the lines which are not valid
+    JSON are returned as ``None``, which allows reporting them as
+    invalid records without discarding the rest of the stream.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        records = []
+        for line in stream.read().decode(encoding).splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(None)
+        return records
+
+
+class JSONMergePatchParser(JSONParser):
+    """Parses JSON merge patches (RFC 7386)."""
+
+    media_type = "application/merge-patch+json"
@@ -15,6 +15,11 @@ urlpatterns = [
         views.device_metric_list,
         name="api_device_metric_list",
     ),
+    path(
+        "api/v1/monitoring/device/bulk/",
+        views.device_metric_bulk,
+        name="api_device_metric_bulk",
+    ),
     path(
         # uuid_any is registered by openwisp-controller
         "api/v1/monitoring/device/<uuid_any:pk>/",
@@ -4,6 +4,7 @@ from datetime import datetime
 from cache_memoize import cache_memoize
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.gis.db.models.functions import Distance
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db.models import Count, Q
 from django.db.models.functions import Round
@@ -13,14 +14,17 @@ from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
 from pytz import UTC
 from rest_framework import serializers, status
+from rest_framework.exceptions import ParseError
 from rest_framework.generics import (
     GenericAPIView,
     ListAPIView,
     RetrieveAPIView,
     get_object_or_404,
 )
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from swapper import load_model
 
 from openwisp_controller.config.api.views import DeviceListCreateView
@@ -38,15 +42,19 @@ from openwisp_utils.api.pagination import OpenWispPagination
 
 from ...settings import CACHE_TIMEOUT
 from ...views import MonitoringApiViewMixin
+from .. import codecs
+from .. import settings as app_settings
 from ..schema import schema
 from ..signals import device_metrics_received
-from ..tasks import write_device_metrics
+from ..tasks import write_device_metrics, write_device_metrics_batch
+from ..utils import get_device_cache_key, get_device_data_task_kwargs, merge_patch
 from .filters import (
     MonitoringDeviceFilter,
     MonitoringLocationDeviceFilter,
     MonitoringNearbyDeviceFilter,
     WifiSessionFilter,
 )
+from .parsers import JSONMergePatchParser, NDJSONParser
 from .serializers import (
     DeviceMetricSerializer,
     MonitoringDeviceDetailSerializer,
@@ -79,6 +87,11 @@ def get_charts_args_rewrite(view, request, pk):
     return (pk,)
 
 
+def get_device_key_args_rewrite(view, key):
+    """Use only the device key for calculating the cache key"""
+    return key
+
+
 class DeviceKeyAuthenticationMixin(object):
     def get_permissions(self):
         if self.request.method in SAFE_METHODS and not self.request.query_params.get(
@@ -119,6 +132,7 @@ class DeviceMetricView(
     )
     serializer_class = serializers.Serializer
     permission_classes = [DevicePermission]
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, JSONMergePatchParser]
     schema = schema
 
     @classmethod
@@ -144,8 +158,13 @@ class DeviceMetricView(
         if not request.query_params.get("csv"):
             charts_data = dict(response.data)
             device_metrics_data = MonitoringDeviceDetailSerializer(self.instance).data
+            headers = {}
+            if response.has_header("Server-Timing"):
+                headers["Server-Timing"] = response["Server-Timing"]
             return Response(
-                {**device_metrics_data, **charts_data}, status=status.HTTP_200_OK
+                {**device_metrics_data, **charts_data},
+                status=status.HTTP_200_OK,
+                headers=headers,
             )
         return response
 
@@ -165,6 +184,21 @@ class DeviceMetricView(
     def get_object(self, pk):
         return super().get_object()
 
+    def _merge_delta_report(self, request):
+        """Returns the full data of a delta report.
+
+        The data is reconstructed by applying the JSON merge patch sent by
+        the device to the data it sent previously, identified by the
+        ``base`` query string parameter (the ``time`` of the previous
+        report). Returns ``None`` if the base data is not available.
+        """
+        if not app_settings.DEVICE_DATA_DELTA_REPORTS:
+            return None
+        base = cache.get(get_device_cache_key(self.instance, context="delta-base"))
+        if not base or base["time"] != request.query_params.get("base"):
+            return None
+        return merge_patch(codecs.decode(base["data"]), request.data)
+
     def post(self, request, pk):
         self.instance = self.get_object(pk)
         if self.instance._is_deactivated:
@@ -172,7 +206,16 @@ class DeviceMetricView(
             # We don't use "Device.is_deactivated()" to avoid
             # generating query for the related config.
             raise Http404
-        self.instance.data = request.data
+        if request.content_type.startswith(JSONMergePatchParser.media_type):
+            data = self._merge_delta_report(request)
+            if data is None:
+                return Response(
+                    {"detail": _("Base data not available, send the full data")},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            self.instance.data = data
+        else:
+            self.instance.data = request.data
         # validate incoming data
         try:
             self.instance.validate_data()
@@ -189,9 +232,26 @@ class DeviceMetricView(
             )
         except ValueError:
             return Response({"detail": _("Incorrect time format")}, status=400)
-        # writing data is intensive, let's pass that to the background workers
+        # the next report can be sent as a delta of this one, as long as
+        # this one is the latest report and its time is known to the device
+        if (
+            app_settings.DEVICE_DATA_DELTA_REPORTS
+            and "time" in request.query_params
+            and str(current).lower() == "true"
+        ):
+            cache.set(
+                get_device_cache_key(self.instance, context="delta-base"),
+                {"time": time_obj, "data": codecs.encode(self.instance.data)},
+                timeout=CACHE_TIMEOUT,
+            )
+        # writing data is intensive, let's pass that to the background workers,
+        # the data has already been validated, hence it's not validated again
         write_device_metrics.delay(
-            str(self.instance.pk), self.instance.data, time=time_obj, current=current
+            str(self.instance.pk),
+            time=time_obj,
+            current=current,
+            validated=True,
+            **get_device_data_task_kwargs(self.instance.data),
         )
         device_metrics_received.send(
             sender=self.model,
@@ -206,6 +266,134 @@ class DeviceMetricView(
 device_metric = DeviceMetricView.as_view()
 
 
+class DeviceMetricBulkView(GenericAPIView):
+    """Collects the metrics and status of many devices at once.
+
+    Meant to be used by collectors which send the data of the devices
+    they proxy. Accepts a JSON array or a newline delimited JSON stream
+    of records, each record contains the ``key`` of the device, its
+    ``data`` and optionally ``time`` and ``current``.
+
+    Each record is authenticated by its device key and validated
+    on its own, the errors of the invalid records are returned in
+    the response while the valid records are written in the background.
+    """
+
+    model = DeviceData
+    queryset = DeviceMetricView.queryset
+    serializer_class = serializers.Serializer
+    parser_classes = [JSONParser, NDJSONParser]
+    # each record is authenticated by its device key
+    authentication_classes = []
+    permission_classes = []
+
+    @classmethod
+    def invalidate_get_device_cache(cls, instance, **kwargs):
+        """Called from signal receiver which performs cache invalidation"""
+        view = cls()
+        view.get_device_by_pk.invalidate(view, instance.pk)
+        view.get_device_pk.invalidate(view, instance.key)
+        logger.debug(f"invalidated bulk view cache for device ID {instance.pk}")
+
+    @cache_memoize(CACHE_TIMEOUT, args_rewrite=get_device_key_args_rewrite)
+    def get_device_pk(self, key):
+        return self.get_queryset().filter(key=key).values_list("pk", flat=True).first()
+
+    @cache_memoize(CACHE_TIMEOUT, args_rewrite=get_device_args_rewrite)
+    def get_device_by_pk(self, pk):
+        return self.get_queryset().filter(pk=pk).first()
+
+    def get_device(self, key):
+        """Returns the device identified by ``key``.
+
+        The device is cached by its primary key and its key is checked on
+        each request, the mapping of keys which have been changed in the
+        meantime is discarded, hence old keys stop authenticating devices
+        as soon as the new key is saved.
+        """
+        pk = self.get_device_pk(key)
+        if pk is None:
+            return None
+        device = self.get_device_by_pk(pk)
+        if device is None or device.key != key:
+            self.get_device_pk.invalidate(self, key)
+            return None
+        return device
+
+    def _get_record(self, record):
+        if not isinstance(record, dict):
+            raise ValidationError(_("Invalid record"))
+        key = record.get("key")
+        device = self.get_device(key) if isinstance(key, str) and key else None
+        if device is None or device._is_deactivated:
+            raise ValidationError(_("Invalid device key"))
+        device.data = record.get("data")
+        device.validate_data()
+        time_obj = record.get("time", now().utcnow().strftime("%d-%m-%Y_%H:%M:%S.%f"))
+        try:
+            time = datetime.strptime(time_obj, "%d-%m-%Y_%H:%M:%S.%f").replace(
+                tzinfo=UTC
+            )
+        except (TypeError, ValueError):
+            raise ValidationError(_("Incorrect time format"))
+        # interpreted like the "current" query string parameter
+        # of the single device endpoint, other values are rejected
+        current = str(record.get("current", False)).lower()
+        if current not in ("true", "false"):
+            raise ValidationError(_("Invalid current value"))
+        return device, time, time_obj, current == "true"
+
+    def post(self, request):
+        records = request.data
+        if not isinstance(records, list):
+            raise ParseError(_("Expected a list of records"))
+        if len(records) > app_settings.BULK_MAX_RECORDS:
+            raise ParseError(
+                _("Too many records, the maximum is {0}").format(
+                    app_settings.BULK_MAX_RECORDS
+                )
+            )
+        accepted = []
+        errors = []
+        for index, record in enumerate(records):
+            try:
+                accepted.append(self._get_record(record))
+            except ValidationError as e:
+                logger.info(e.message)
+                errors.append({"index": index, "detail": e.message})
+        writes = [
+            dict(
+                pk=str(device.pk),
+                time=time_obj,
+                current=current,
+                **get_device_data_task_kwargs(device.data),
+            )
+            for device, _time, time_obj, current in accepted
+        ]
+        # writing data is intensive, let's pass that to the background workers
+        batch_size = app_settings.BULK_BATCH_SIZE
+        for start in range(0, len(writes), batch_size):
+            end = start + batch_size
+            write_device_metrics_batch.delay(writes[start:end])
+        for device, time, _time_obj, current in accepted:
+            device_metrics_received.send(
+                sender=self.model,
+                instance=device,
+                request=request,
+                time=time,
+                current=current,
+            )
+        response_status = status.HTTP_200_OK
+        if errors and not accepted:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {"accepted": len(accepted), "errors": errors}, status=response_status
+        )
+
+
+device_metric_bulk = DeviceMetricBulkView.as_view()
+
+
 class MonitoringGeoJsonLocationList(GeoJsonLocationList):
     serializer_class = MonitoringGeoJsonLocationSerializer
     queryset = (
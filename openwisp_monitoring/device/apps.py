@@ -4,7 +4,7 @@ from django.apps import AppConfig
 from django.conf import settings
 from django.core.cache import cache
 from django.db.models import Count
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 from swapper import get_model_name, load_model
@@ -26,11 +26,13 @@ from ..check import settings as check_settings
 from ..monitoring.signals import threshold_crossed
 from ..settings import MONITORING_API_BASEURL, MONITORING_API_URLCONF
 from ..utils import transaction_on_commit
+from . import checks  # noqa
 from . import settings as app_settings
 from .signals import device_metrics_received, health_status_changed
 from .utils import (
     get_device_cache_key,
     manage_default_retention_policy,
+    manage_rollup_retention_policies,
     manage_short_retention_policy,
 )
 
@@ -43,6 +45,7 @@ class DeviceMonitoringConfig(AppConfig):
     def ready(self):
         manage_default_retention_policy()
         manage_short_retention_policy()
+        self.connect_rollup_retention_policies()
         self.connect_is_working_changed()
         self.connect_device_signals()
         self.connect_config_status_changed()
@@ -55,6 +58,23 @@ class DeviceMonitoringConfig(AppConfig):
         self.register_menu_groups()
         self.add_connection_ignore_notification_reasons()
 
+    def connect_rollup_retention_policies(self):
+        """Manages the rollup retention policies when migrations are applied.
+
+        Creating the continuous queries may require dropping and
+        recreating them, which is done once by the ``migrate`` command
+        instead of each time a process (web, celery workers) starts.
+        """
+        post_migrate.connect(
+            self.rollup_retention_policies_receiver,
+            sender=self,
+            dispatch_uid="post_migrate_manage_rollup_retention_policies",
+        )
+
+    @classmethod
+    def rollup_retention_policies_receiver(cls, **kwargs):
+        manage_rollup_retention_policies()
+
     def connect_check_signals(self):
         from django.db.models.signals import post_delete, post_save
         from swapper import load_model
@@ -74,7 +94,7 @@ class DeviceMonitoringConfig(AppConfig):
         )
 
     def connect_device_signals(self):
-        from .api.views import DeviceMetricView
+        from .api.views import DeviceMetricBulkView, DeviceMetricView
 
         Device = load_model("config", "Device")
         DeviceData = load_model("device_monitoring", "DeviceData")
@@ -99,6 +119,11 @@ class DeviceMonitoringConfig(AppConfig):
             sender=DeviceLocation,
             dispatch_uid="post_save_devicelocation_invalidate_devicedata_cache",
         )
+        post_save.connect(
+            DeviceMetricBulkView.invalidate_get_device_cache,
+            sender=Device,
+            dispatch_uid="device_post_save_invalidate_bulk_view_device_cache",
+        )
         post_save.connect(
             DeviceMetricView.invalidate_get_charts_cache,
             sender=Metric,
@@ -119,6 +144,11 @@ class DeviceMonitoringConfig(AppConfig):
             sender=Device,
             dispatch_uid="device_post_delete_invalidate_view_device_cache",
         )
+        post_delete.connect(
+            DeviceMetricBulkView.invalidate_get_device_cache,
+            sender=Device,
+            dispatch_uid="device_post_delete_invalidate_bulk_view_device_cache",
+        )
         post_delete.connect(
             DeviceMetricView.invalidate_get_charts_cache,
             sender=Device,
@@ -159,6 +189,11 @@ class DeviceMonitoringConfig(AppConfig):
             sender=Device,
             dispatch_uid="device_deactivated_invalidate_view_device_cache",
         )
+        device_deactivated.connect(
+            DeviceMetricBulkView.invalidate_get_device_cache,
+            sender=Device,
+            dispatch_uid="device_deactivated_invalidate_bulk_view_device_cache",
+        )
         device_activated.connect(
             DeviceMonitoring.handle_activated_device,
             sender=Device,
@@ -169,6 +204,11 @@ class DeviceMonitoringConfig(AppConfig):
             sender=Device,
             dispatch_uid="device_activated_invalidate_view_device_cache",
         )
+        device_activated.connect(
+            DeviceMetricBulkView.invalidate_get_device_cache,
+            sender=Device,
+            dispatch_uid="device_activated_invalidate_bulk_view_device_cache",
+        )
 
     @classmethod
     def device_post_save_receiver(cls, instance, created, **kwargs):
@@ -1,6 +1,7 @@
 import json
 import random
 from collections import OrderedDict
+from copy import deepcopy
 from datetime import datetime
 
 import swapper
@@ -14,8 +15,9 @@ from django.dispatch import receiver
 from django.utils.module_loading import import_string
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
-from jsonschema import draft7_format_checker, validate
+from jsonschema import Draft7Validator, draft7_format_checker
 from jsonschema.exceptions import ValidationError as SchemaError
+from jsonschema.exceptions import best_match
 from model_utils import Choices
 from model_utils.fields import StatusField
 from netaddr import EUI, NotRegisteredError
@@ -30,6 +32,7 @@ from ...db import device_data_query, timeseries_db
 from ...monitoring.signals import threshold_crossed
 from ...monitoring.tasks import _timeseries_write
 from ...settings import CACHE_TIMEOUT
+from .. import codecs
 from .. import settings as app_settings
 from .. import tasks
 from ..schema import schema
@@ -50,6 +53,8 @@ class AbstractDeviceData(object):
     __data = None
     __key = "device_data"
     __data_timestamp = None
+    # the last encoded snapshot read and its decoded data
+    __snapshot = None
 
     def __init__(self, *args, **kwargs):
         from ..writer import DeviceDataWriter
@@ -104,7 +109,9 @@ class AbstractDeviceData(object):
     def data_user_friendly(self):
         if not self.data:
             return None
-        data = self.data
+        # the data read from the timeseries database is reused,
+        # hence it must not be modified
+        data = deepcopy(self.data)
         # slicing to eliminate the nanoseconds from timestamp
         measured_at = datetime.strptime(self.data_timestamp[0:19], "%Y-%m-%dT%H:%M:%S")
         time_elapsed = int((datetime.utcnow() - measured_at).total_seconds())
@@ -160,7 +167,16 @@ class AbstractDeviceData(object):
         if not points:
             return None
         self.data_timestamp = points[0]["time"]
-        return json.loads(points[0]["data"])
+        return self._decode_data(points[0]["data"])
+
+    def _decode_data(self, value):
+        """Decodes a data snapshot.
+
+        The decoded data is reused as long as the snapshot does not change.
+        """
+        if self.__snapshot is None or self.__snapshot[0] != value:
+            self.__snapshot = (value, codecs.decode(value))
+        return self.__snapshot[1]
 
     @data.setter
     def data(self, data):
@@ -177,10 +193,28 @@ class AbstractDeviceData(object):
         """Sets the timestamp related to the data."""
         self.__data_timestamp = value
 
+    @classmethod
+    def _get_schema_validator(cls):
+        """Returns the validator of ``schema``.
+
+        The validator is built (and the schema checked) only once
+        per class, unless ``schema`` is replaced.
+        """
+        validator = cls.__dict__.get("_schema_validator")
+        if validator is None or validator.schema is not cls.schema:
+            Draft7Validator.check_schema(cls.schema)
+            validator = Draft7Validator(
+                cls.schema, format_checker=draft7_format_checker
+            )
+            cls._schema_validator = validator
+        return validator
+
     def validate_data(self):
         """Validates data according to NetJSON DeviceMonitoring schema."""
         try:
-            validate(self.data, self.schema, format_checker=draft7_format_checker)
+            error = best_match(self._get_schema_validator().iter_errors(self.data))
+            if error is not None:
+                raise error
         except SchemaError as e:
             path = [str(el) for el in e.path]
             trigger = "/".join(path)
@@ -256,20 +290,27 @@ class AbstractDeviceData(object):
         except NotRegisteredError:
             return ""
 
-    def save_data(self, time=None):
-        """Validates and saves data to Timeseries Database."""
-        self.validate_data()
+    def save_data(self, time=None, validated=False):
+        """Validates and saves data to Timeseries Database.
+
+        Validation is skipped if ``validated`` is ``True``, which
+        means the data has already been validated (eg: by the API).
+        """
+        if not validated:
+            self.validate_data()
         self._transform_data()
         time = time or now()
         options = dict(tags={"pk": self.pk}, timestamp=time, retention_policy=SHORT_RP)
-        _timeseries_write(name=self.__key, values={"data": self.json()}, **options)
+        # the data is encoded once for both the timeseries DB and the cache
+        value = codecs.encode(self.data)
+        _timeseries_write(name=self.__key, values={"data": value}, **options)
         cache_key = get_device_cache_key(device=self, context="current-data")
         # cache current data to allow getting it without querying the timeseries DB
         cache.set(
             cache_key,
             [
                 {
-                    "data": self.json(),
+                    "data": value,
                     "time": time.astimezone(tz=tz("UTC")).isoformat(timespec="seconds"),
                 }
             ],
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from . import settings as app_settings
+
+# cache backends which are not shared between processes
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+
+@register()
+def check_device_data_claim_check_cache(app_configs, **kwargs):
+    if not app_settings.DEVICE_DATA_CLAIM_CHECK:
+        return []
+    setting_name = "OPENWISP_MONITORING_DEVICE_DATA_CLAIM_CHECK_CACHE"
+    alias = app_settings.DEVICE_DATA_CLAIM_CHECK_CACHE
+    if alias not in settings.CACHES:
+        return [
+            Error(
+                f'The cache "{alias}" is not defined',
+                hint="Use a cache defined in the CACHES setting",
+                obj=setting_name,
+            )
+        ]
+    backend = settings.CACHES[alias].get("BACKEND")
+    if backend in LOCAL_CACHE_BACKENDS:
+        return [
+            Error(
+                f'The cache "{alias}" is not shared with the celery workers',
+                hint=(
+                    "OPENWISP_MONITORING_DEVICE_DATA_CLAIM_CHECK requires a cache "
+                    "shared between the web application and the celery workers "
+                    "(e.g.: Redis), use a shared cache or disable the setting"
+                ),
+                obj=setting_name,
+            )
+        ]
+    return []
@@ -0,0 +1,69 @@
+import base64
+import json
+import zlib
+
+from django.utils.module_loading import import_string
+
+from . import settings as app_settings
+
+
+class JSONCodec(object):
+    """Stores the device data snapshots as JSON documents."""
+
+    # identifies the snapshots encoded with the codec,
+    # JSON documents are recognized by the lack of a prefix
+    prefix = ""
+
+    def encode(self, data):
+        return json.dumps(data)
+
+    def decode(self, value):
+        return json.loads(value)
+
+
+class ZlibJSONCodec(JSONCodec):
+    """Stores the device data snapshots as zlib compressed JSON documents.
+
+    The compressed bytes are encoded in base64 because the snapshots
+    are stored in a string field of the timeseries database.
+    """
+
+    prefix = "zlib:"
+    level = 6
+
+    def encode(self, data):
+        value = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        value = base64.b64encode(zlib.compress(value, self.level))
+        return f"{self.prefix}{value.decode('ascii')}"
+
+    def decode(self, value):
+        prefix_length = len(self.prefix)
+        value = base64.b64decode(value[prefix_length:])
+        return json.loads(zlib.decompress(value))
+
+
+def get_codec():
+    return import_string(app_settings.DEVICE_DATA_CODEC)()
+
+
+codec = get_codec()
+# snapshots written with other codecs (eg: before changing the setting)
+# can be decoded until they expire from the "short" retention policy,
+# the longest prefixes are matched first
+_codecs = sorted(
+    [codec, ZlibJSONCodec(), JSONCodec()],
+    key=lambda item: len(item.prefix),
+    reverse=True,
+)
+
+
+def encode(data):
+    """Encodes a device data snapshot with the configured codec."""
+    return codec.encode(data)
+
+
+def decode(value):
+    """Decodes a device data snapshot encoded with any known codec."""
+    for item in _codecs:
+        if value.startswith(item.prefix):
+            return item.decode(value)
@@ -0,0 +1,2 @@
+class DeviceDataNotFound(Exception):
+    pass
@@ -54,6 +54,17 @@ def get_health_status_labels():
 
 SHORT_RETENTION_POLICY = get_settings_value("SHORT_RETENTION_POLICY", "24h0m0s")
 DEFAULT_RETENTION_POLICY = get_settings_value("DEFAULT_RETENTION_POLICY", "26280h0m0s")
+DEVICE_DATA_CODEC = get_settings_value(
+    "DEVICE_DATA_CODEC", "openwisp_monitoring.device.codecs.JSONCodec"
+)
+DEVICE_DATA_CLAIM_CHECK = get_settings_value("DEVICE_DATA_CLAIM_CHECK", False)
+DEVICE_DATA_CLAIM_CHECK_CACHE = get_settings_value(
+    "DEVICE_DATA_CLAIM_CHECK_CACHE", "default"
+)
+DEVICE_DATA_CLAIM_CHECK_TIMEOUT = get_settings_value(
+    "DEVICE_DATA_CLAIM_CHECK_TIMEOUT", 3600
+)
+DEVICE_DATA_DELTA_REPORTS = get_settings_value("DEVICE_DATA_DELTA_REPORTS", False)
 CRITICAL_DEVICE_METRICS = get_critical_device_metrics()
 HEALTH_STATUS_LABELS = get_health_status_labels()
 AUTO_CLEAR_MANAGEMENT_IP = get_settings_value("AUTO_CLEAR_MANAGEMENT_IP", True)
@@ -62,3 +73,5 @@ DEVICE_RECOVERY_DETECTION = get_settings_value("DEVICE_RECOVERY_DETECTION", True
 MAC_VENDOR_DETECTION = get_settings_value("MAC_VENDOR_DETECTION", True)
 DASHBOARD_MAP = get_settings_value("DASHBOARD_MAP", True)
 WIFI_SESSIONS_ENABLED = get_settings_value("WIFI_SESSIONS_ENABLED", True)
+BULK_MAX_RECORDS = get_settings_value("BULK_MAX_RECORDS", 1000)
+BULK_BATCH_SIZE = get_settings_value("BULK_BATCH_SIZE", 50)
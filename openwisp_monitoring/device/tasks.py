@@ -9,6 +9,8 @@ from swapper import load_model
 from openwisp_utils.tasks import OpenwispCeleryTask
 
 from ..check.tasks import perform_check
+from .exceptions import DeviceDataNotFound
+from .utils import discard_device_data, load_device_data
 
 logger = logging.getLogger(__name__)
 
@@ -81,13 +83,51 @@ def offline_device_close_session(device_id):
 
 
 @shared_task(base=OpenwispCeleryTask)
-def write_device_metrics(pk, data, time=None, current=False):
+def write_device_metrics(
+    pk, data=None, time=None, current=False, validated=False, data_ref=None
+):
+    """Writes the data of a device.
+
+    The data can be passed directly with ``data`` or with ``data_ref``,
+    a reference to the data stored in the cache by the API, in which
+    case the data is loaded only if the device exists and the task
+    fails if the data cannot be loaded.
+    """
     DeviceData = load_model("device_monitoring", "DeviceData")
     try:
         device_data = DeviceData.get_devicedata(str(pk))
     except DeviceData.DoesNotExist:
+        if data_ref:
+            discard_device_data(data_ref)
         return
-    device_data.writer.write(data, time, current)
+    if data_ref:
+        data = load_device_data(data_ref)
+        if data is None:
+            message = (
+                f"The data of the device {pk} has expired, is corrupted or "
+                "the cache is not shared with the workers, it will not be written"
+            )
+            logger.error(message)
+            raise DeviceDataNotFound(message)
+    device_data.writer.write(data, time, current, validated=validated)
+    if data_ref:
+        discard_device_data(data_ref)
+
+
+@shared_task(base=OpenwispCeleryTask)
+def write_device_metrics_batch(records):
+    """Writes the data of many devices.
+
+    Each record contains the arguments of ``write_device_metrics``,
+    the data of the records has already been validated.
+    """
+    for record in records:
+        try:
+            write_device_metrics(validated=True, **record)
+        except Exception as e:
+            logger.exception(
+                f"Error while writing the data of the device {record['pk']}: {e}"
+            )
 
 
 @shared_task(base=OpenwispCeleryTask)
@@ -2,13 +2,14 @@ import json
 from copy import deepcopy
 from datetime import datetime, timedelta
 from unittest.mock import patch
+from urllib.parse import quote
 from uuid import uuid4
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
-from django.test import tag
+from django.test import override_settings, tag
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
@@ -21,9 +22,14 @@ from openwisp_users.tests.utils import TestMultitenantAdminMixin
 from openwisp_utils.tests import capture_any_output, catch_signal
 
 from ... import settings as monitoring_settings
+from ...db import timeseries_db
 from ...monitoring.signals import post_metric_write, pre_metric_write
+from .. import settings as app_settings
 from ..api.serializers import WifiSessionSerializer
+from ..exceptions import DeviceDataNotFound
 from ..signals import device_metrics_received
+from ..tasks import write_device_metrics
+from ..utils import load_device_data, merge_patch
 from . import DeviceMonitoringTestCase, TestWifiClientSessionMixin
 
 start_time = timezone.now()
@@ -196,6 +202,268 @@ class TestDeviceApi(AuthenticationMixin, TestGeoMixin, DeviceMonitoringTestCase)
         self.assertEqual(r.status_code, 200)
         mocked_task.assert_called_once()
 
+    @patch.object(app_settings, "DEVICE_DATA_CLAIM_CHECK", True)
+    @patch("openwisp_monitoring.device.tasks.write_device_metrics.delay")
+    def test_background_write_claim_check(self, mocked_task):
+        device = self._create_device(organization=self._create_org())
+        data = self._data()
+        r = self._post_data(device.id, device.key, data)
+        self.assertEqual(r.status_code, 200)
+        kwargs = mocked_task.call_args.kwargs
+        self.assertNotIn("data", kwargs)
+        self.assertEqual(load_device_data(kwargs["data_ref"]), data)
+
+        with self.subTest("The data is written and discarded"):
+            write_device_metrics(str(device.pk), **kwargs)
+            self.assertEqual(DeviceData(pk=device.pk).data["general"], data["general"])
+            self.assertIsNone(load_device_data(kwargs["data_ref"]))
+
+        with self.subTest("Expired data fails the task"), patch(
+            "openwisp_monitoring.device.tasks.logger.error"
+        ) as mocked_error, patch.object(DeviceData, "save_data") as mocked_save:
+            with self.assertRaises(DeviceDataNotFound):
+                write_device_metrics(str(device.pk), **kwargs)
+            mocked_error.assert_called_once()
+            mocked_save.assert_not_called()
+
+        with self.subTest("Checksum mismatch"):
+            r = self._post_data(device.id, device.key, data)
+            data_ref = mocked_task.call_args.kwargs["data_ref"]
+            self.assertIsNotNone(load_device_data(data_ref))
+            data_ref["checksum"] = "0" * 64
+            self.assertIsNone(load_device_data(data_ref))
+
+        with self.subTest("Claim check disabled"), patch.object(
+            app_settings, "DEVICE_DATA_CLAIM_CHECK", False
+        ):
+            r = self._post_data(device.id, device.key, data)
+            kwargs = mocked_task.call_args.kwargs
+            self.assertNotIn("data_ref", kwargs)
+            self.assertEqual(kwargs["data"], data)
+
+    def test_merge_patch(self):
+        target = {"a": 1, "b": {"c": 2, "d": [1, 2]}, "e": 3}
+        patch = {"a": None, "b": {"c": 4, "d": [3]}, "f": {"g": None, "h": 5}}
+        self.assertEqual(
+            merge_patch(target, patch), {"b": {"c": 4, "d": [3]}, "e": 3, "f": {"h": 5}}
+        )
+        self.assertEqual(target, {"a": 1, "b": {"c": 2, "d": [1, 2]}, "e": 3})
+        self.assertEqual(merge_patch(target, [1]), [1])
+
+    @patch.object(app_settings, "DEVICE_DATA_DELTA_REPORTS", True)
+    @patch.object(app_settings, "DEVICE_DATA_CLAIM_CHECK", True)
+    @patch("openwisp_monitoring.device.tasks.write_device_metrics.delay")
+    def test_delta_report(self, mocked_task):
+        device = self._create_device(organization=self._create_org())
+        data = self._data()
+        time1 = "18-10-2026_10:00:00.000000"
+        time2 = "18-10-2026_10:05:00.000000"
+        r = self.client.post(
+            f"{self._url(device.pk, device.key, time1)}&current=true",
+            json.dumps(data),
+            content_type="application/json",
+        )
+        self.assertEqual(r.status_code, 200)
+
+        def post_delta(delta, base):
+            return self.client.post(
+                f"{self._url(device.pk, device.key, time2)}&current=true&base={base}",
+                json.dumps(delta),
+                content_type="application/merge-patch+json",
+            )
+
+        delta = {"general": {"uptime": 9000}, "resources": None}
+        r = post_delta(delta, time1)
+        self.assertEqual(r.status_code, 200)
+        expected = deepcopy(data)
+        expected["general"]["uptime"] = 9000
+        del expected["resources"]
+        data_ref = mocked_task.call_args.kwargs["data_ref"]
+        self.assertEqual(load_device_data(data_ref), expected)
+
+        with self.subTest("The following delta is based on the reconstructed data"):
+            r = post_delta({"general": {"uptime": 9300}}, time2)
+            self.assertEqual(r.status_code, 200)
+            data_ref = mocked_task.call_args.kwargs["data_ref"]
+            self.assertNotIn("resources", load_device_data(data_ref))
+
+        with self.subTest("Stale base"):
+            r = post_delta(delta, time1)
+            self.assertEqual(r.status_code, 409)
+
+        with self.subTest("Reports which are not current are not used as base"):
+            r = self._post_data(device.id, device.key, data, time=time1)
+            self.assertEqual(r.status_code, 200)
+            r = post_delta(delta, time1)
+            self.assertEqual(r.status_code, 409)
+            r = post_delta(delta, time2)
+            self.assertEqual(r.status_code, 200)
+
+        with self.subTest("Reports without time are not used as base"):
+            r = self.client.post(
+                f"{self._url(device.pk, device.key)}&current=true",
+                json.dumps(data),
+                content_type="application/json",
+            )
+            self.assertEqual(r.status_code, 200)
+            r = post_delta(delta, time2)
+            self.assertEqual(r.status_code, 200)
+
+        with self.subTest("Invalid reconstructed data"):
+            r = post_delta({"type": "invalid"}, time2)
+            self.assertEqual(r.status_code, 400)
+
+        with self.subTest("Delta reports disabled"), patch.object(
+            app_settings, "DEVICE_DATA_DELTA_REPORTS", False
+        ):
+            r = post_delta(delta, time2)
+            self.assertEqual(r.status_code, 409)
+
+    def test_data_validated_once(self):
+        device = self._create_device(organization=self._create_org())
+        with patch.object(
+            DeviceData, "validate_data", autospec=True
+        ) as mocked_validate:
+            r = self._post_data(device.id, device.key, self._data())
+        self.assertEqual(r.status_code, 200)
+        mocked_validate.assert_called_once()
+
+    def test_bulk_post(self):
+        org = self._create_org()
+        device1 = self._create_device(organization=org)
+        device2 = self._create_device(
+            organization=org, name="device2", mac_address="22:33:44:55:66:77"
+        )
+        time = timezone.now().strftime("%d-%m-%Y_%H:%M:%S.%f")
+        invalid_data = {"type": "DeviceMonitoring", "interfaces": [{}]}
+        records = [
+            {"key": device1.key, "time": time, "data": self._data()},
+            {"key": device2.key, "data": self._data()},
+            {"key": "invalid", "data": self._data()},
+            {"key": device1.key, "data": invalid_data},
+            {"key": device1.key, "time": "invalid", "data": self._data()},
+            "invalid",
+        ]
+        url = reverse("monitoring:api_device_metric_bulk")
+        with catch_signal(device_metrics_received) as handler:
+            r = self.client.post(url, records, content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["accepted"], 2)
+        self.assertEqual(handler.call_count, 2)
+        errors = {error["index"]: str(error["detail"]) for error in r.data["errors"]}
+        self.assertEqual(list(errors.keys()), [2, 3, 4, 5])
+        self.assertEqual(errors[2], "Invalid device key")
+        self.assertIn('"#/interfaces/0"', errors[3])
+        self.assertEqual(errors[4], "Incorrect time format")
+        self.assertEqual(errors[5], "Invalid record")
+        for device in (device1, device2):
+            self.assertEqual(
+                DeviceData(pk=device.pk).data["interfaces"], self._data()["interfaces"]
+            )
+
+        with self.subTest("NDJSON stream"):
+            lines = [json.dumps(records[1]), "", "{invalid"]
+            r = self.client.post(
+                url, "\n".join(lines), content_type="application/x-ndjson"
+            )
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.data["accepted"], 1)
+            self.assertEqual(r.data["errors"][0]["index"], 1)
+
+        with self.subTest("No valid record"):
+            r = self.client.post(url, records[2:], content_type="application/json")
+            self.assertEqual(r.status_code, 400)
+            self.assertEqual(r.data["accepted"], 0)
+            self.assertEqual(len(r.data["errors"]), 4)
+
+        with self.subTest("Invalid body"):
+            r = self.client.post(url, records[0], content_type="application/json")
+            self.assertEqual(r.status_code, 400)
+
+        with self.subTest("Too many records"), patch.object(
+            app_settings, "BULK_MAX_RECORDS", 1
+        ):
+            r = self.client.post(url, records[:2], content_type="application/json")
+            self.assertEqual(r.status_code, 400)
+
+        with self.subTest("Deactivated device"):
+            device2.deactivate()
+            r = self.client.post(url, records[1:2], content_type="application/json")
+            self.assertEqual(r.status_code, 400)
+            self.assertEqual(str(r.data["errors"][0]["detail"]), "Invalid device key")
+
+    def test_bulk_post_changed_key(self):
+        device = self._create_device(organization=self._create_org())
+        old_key = device.key
+        url = reverse("monitoring:api_device_metric_bulk")
+        r = self.client.post(
+            url,
+            [{"key": old_key, "data": self._data()}],
+            content_type="application/json",
+        )
+        self.assertEqual(r.data["accepted"], 1)
+        device.key = "new-device-key"
+        device.save()
+        r = self.client.post(
+            url,
+            [{"key": old_key, "data": self._data()}],
+            content_type="application/json",
+        )
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(str(r.data["errors"][0]["detail"]), "Invalid device key")
+        r = self.client.post(
+            url,
+            [{"key": device.key, "data": self._data()}],
+            content_type="application/json",
+        )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["accepted"], 1)
+
+    @patch("openwisp_monitoring.device.tasks.write_device_metrics_batch.delay")
+    def test_bulk_post_current(self, mocked_task):
+        device = self._create_device(organization=self._create_org())
+        values = [True, "true", "True", False, "false", "FALSE", None, 1, "yes"]
+        records = [
+            {"key": device.key, "data": self._data(), "current": value}
+            for value in values
+        ]
+        records.append({"key": device.key, "data": self._data()})
+        with catch_signal(device_metrics_received) as handler:
+            r = self.client.post(
+                reverse("monitoring:api_device_metric_bulk"),
+                records,
+                content_type="application/json",
+            )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["accepted"], 7)
+        errors = {error["index"]: str(error["detail"]) for error in r.data["errors"]}
+        self.assertEqual(
+            errors, {index: "Invalid current value" for index in (6, 7, 8)}
+        )
+        expected = [True, True, True, False, False, False, False]
+        writes = mocked_task.call_args[0][0]
+        self.assertEqual([write["current"] for write in writes], expected)
+        self.assertEqual(
+            [call.kwargs["current"] for call in handler.call_args_list], expected
+        )
+
+    @patch.object(app_settings, "BULK_BATCH_SIZE", 2)
+    @patch("openwisp_monitoring.device.tasks.write_device_metrics_batch.delay")
+    def test_bulk_post_batches(self, mocked_task):
+        device = self._create_device(organization=self._create_org())
+        records = [{"key": device.key, "data": self._data()}] * 5
+        with self.assertNumQueries(2):
+            r = self.client.post(
+                reverse("monitoring:api_device_metric_bulk"),
+                records,
+                content_type="application/json",
+            )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["accepted"], 5)
+        self.assertEqual(mocked_task.call_count, 3)
+        self.assertEqual(len(mocked_task.call_args_list[0][0][0]), 2)
+        self.assertEqual(len(mocked_task.call_args_list[2][0][0]), 1)
+
     @tag("flaky_with_udp_writes")
     def test_200_traffic_counter_incremented(self):
         dd = self.create_test_data(no_resources=True)
@@ -277,11 +545,13 @@ class TestDeviceApi(AuthenticationMixin, TestGeoMixin, DeviceMonitoringTestCase)
         # creation of resources metrics can be avoided here as it is not involved
         # this speeds up the test by reducing requests made
         del data2["resources"]
-        additional_queries = 0 if self._is_timeseries_udp_writes else 1
-        with self.assertNumQueries(21 + additional_queries):
+        # the metrics and their alert settings are fetched with one query
+        # after the write, both when the data is written synchronously
+        # (UDP) and when it's written by the background task (TCP)
+        with self.assertNumQueries(15):
             response = self._post_data(device.id, device.key, data2)
         # Ensure cache is working
-        with self.assertNumQueries(13 + additional_queries):
+        with self.assertNumQueries(10):
             response = self._post_data(device.id, device.key, data2)
         self.assertEqual(response.status_code, 200)
         # Add 1 for general metric and chart
@@ -548,6 +818,83 @@ class TestDeviceApi(AuthenticationMixin, TestGeoMixin, DeviceMonitoringTestCase)
         self.assertEqual(r.status_code, 200)
         self.assertIsInstance(r.data["charts"], list)
 
+    @patch("openwisp_monitoring.monitoring.settings.CHART_CACHE", False)
+    def test_get_device_metrics_parallel_read(self):
+        dd = self.create_test_data()
+        d = self.device_model.objects.get(pk=dd.pk)
+        url = self._url(d.pk, d.key)
+        with patch("openwisp_monitoring.views.CHART_READ_POOL_SIZE", 1):
+            expected = self.client.get(url)
+        with patch("openwisp_monitoring.views.CHART_READ_POOL_SIZE", 4):
+            r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data["x"], expected.data["x"])
+        self.assertEqual(r.data["charts"], expected.data["charts"])
+
+        with self.subTest("Test Server-Timing header"):
+            # not sent unless enabled
+            self.assertFalse(r.has_header("Server-Timing"))
+            with patch("openwisp_monitoring.views.SERVER_TIMING", True):
+                r = self.client.get(url)
+            timings = r["Server-Timing"].split(", ")
+            charts = self.chart_queryset.filter(metric__object_id=d.pk)
+            self.assertEqual(len(timings), charts.count())
+            for timing in timings:
+                self.assertRegex(timing, r'^chart;desc="\w+";dur=\d+\.\d$')
+
+        with self.subTest("Test Server-Timing header in DEBUG mode"), override_settings(
+            DEBUG=True
+        ):
+            r = self.client.get(url)
+            self.assertTrue(r.has_header("Server-Timing"))
+            self.assertNotIn(str(charts.first().pk), r["Server-Timing"])
+
+    @patch("openwisp_monitoring.views.SERVER_TIMING", True)
+    def test_get_device_metrics_cache(self):
+        dd = self.create_test_data()
+        d = self.device_model.objects.get(pk=dd.pk)
+        url = self._url(d.pk, d.key)
+        r = self.client.get(url)
+        self.assertNotIn(" hit", r["Server-Timing"])
+        with patch.object(timeseries_db, "query_many") as mocked_query_many:
+            cached = self.client.get(url)
+        mocked_query_many.assert_not_called()
+        self.assertEqual(cached.data["charts"], r.data["charts"])
+        self.assertEqual(cached.data["x"], r.data["x"])
+        self.assertNotIn(" miss", cached["Server-Timing"])
+
+        with self.subTest("Test newest bucket refreshed after writes"):
+            self._post_data(d.id, d.key, self._data())
+            r = self.client.get(url)
+            self.assertIn(" refresh", r["Server-Timing"])
+
+    def test_get_device_metrics_since(self):
+        dd = self.create_test_data()
+        d = self.device_model.objects.get(pk=dd.pk)
+        url = self._url(d.pk, d.key)
+        r = self.client.get(url)
+        since = r.data["x"][-1]
+        r2 = self.client.get(f"{url}&since={quote(since)}")
+        self.assertEqual(r2.status_code, 200)
+        self.assertEqual(r2.data["x"], [since])
+        self.assertLessEqual(r2.data["x_start"], r.data["x"][0])
+        self.assertEqual(len(r2.data["charts"]), len(r.data["charts"]))
+        for chart, full_chart in zip(r2.data["charts"], r.data["charts"]):
+            self.assertEqual(chart["title"], full_chart["title"])
+            self.assertEqual(chart["summary"], full_chart["summary"])
+            for trace, full_trace in zip(chart["traces"], full_chart["traces"]):
+                self.assertEqual(trace[1], full_trace[1][-1:])
+
+        with self.subTest("Test without chart cache"):
+            with patch("openwisp_monitoring.monitoring.settings.CHART_CACHE", False):
+                r3 = self.client.get(f"{url}&since={quote(since)}")
+            self.assertEqual(r3.data["x"], r2.data["x"])
+            self.assertEqual(r3.data["charts"], r2.data["charts"])
+
+        with self.subTest("Test invalid since"):
+            r = self.client.get(f"{url}&since=yesterday")
+            self.assertEqual(r.status_code, 400)
+
     def test_get_device_metrics_404(self):
         r = self.client.get(self._url(uuid4(), "MADEUP"))
         self.assertEqual(r.status_code, 404)
@@ -1,13 +1,17 @@
 import json
+import random
 from copy import deepcopy
 from unittest.mock import patch
 
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import transaction
+from django.db import connection, transaction
 from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now, timedelta
 from freezegun import freeze_time
+from jsonschema import Draft7Validator, draft7_format_checker, validate
+from jsonschema.exceptions import ValidationError as SchemaError
 from swapper import load_model
 
 from openwisp_controller.connection.tasks import update_config
@@ -16,6 +20,8 @@ from openwisp_utils.tests import catch_signal
 
 from ...db import timeseries_db
 from ...monitoring import settings as monitoring_settings
+from ...monitoring.tests import benchmark
+from .. import codecs
 from .. import settings as app_settings
 from ..signals import health_status_changed
 from ..tasks import delete_wifi_clients_and_sessions, trigger_device_critical_checks
@@ -31,6 +37,8 @@ DeviceData = load_model("device_monitoring", "DeviceData")
 WifiClient = load_model("device_monitoring", "WifiClient")
 WifiSession = load_model("device_monitoring", "WifiSession")
 Metric = load_model("monitoring", "Metric")
+Chart = load_model("monitoring", "Chart")
+AlertSettings = load_model("monitoring", "AlertSettings")
 
 
 class MonitoringTestMixin(object):
@@ -300,6 +308,58 @@ class TestDeviceData(MonitoringTestMixin, DeviceMonitoringTestCase):
         else:
             self.fail("ValidationError not raised")
 
+    def test_schema_validator_cached(self):
+        dd = self._create_device_data()
+        validator = dd._get_schema_validator()
+        self.assertIs(DeviceData(pk=dd.pk)._get_schema_validator(), validator)
+        with patch.object(DeviceData, "schema", deepcopy(DeviceData.schema)):
+            self.assertIsNot(DeviceData._get_schema_validator(), validator)
+
+    def test_validate_data_same_errors(self):
+        dd = self._create_device_data()
+        data = self._get_router_data()
+        data["interfaces"][3]["statistics"]["rx_bytes"] = "invalid"
+        dd.data = data
+        with self.assertRaises(SchemaError) as context:
+            validate(data, dd.schema, format_checker=draft7_format_checker)
+        expected = context.exception
+        with patch(
+            "openwisp_monitoring.device.base.models.Draft7Validator",
+            wraps=Draft7Validator,
+        ) as mocked_validator, patch.object(DeviceData, "_schema_validator", None):
+            for _ in range(3):
+                with self.assertRaises(ValidationError) as context:
+                    dd.validate_data()
+                path = "/".join(str(el) for el in expected.path)
+                self.assertIn(f'Invalid data in "#/{path}"', context.exception.message)
+                self.assertIn(expected.message, context.exception.message)
+            # the validator is built only once
+            mocked_validator.assert_called_once()
+
+    @tag("benchmark")
+    def test_validate_data_benchmark(self):
+        dd = self._create_device_data()
+        data = self._get_router_data()
+        interfaces = data["interfaces"][:4]
+        # large payload: a device with hundreds of interfaces
+        for i in range(50):
+            for interface in interfaces:
+                interface = deepcopy(interface)
+                interface["name"] = f'{interface["name"]}.{i}'
+                data["interfaces"].append(interface)
+        dd.data = data
+        dd.validate_data()
+        legacy_duration = benchmark(
+            "jsonschema.validate",
+            lambda: validate(data, dd.schema, format_checker=draft7_format_checker),
+            number=20,
+        )
+        duration = benchmark("DeviceData.validate_data", dd.validate_data, number=20)
+        print(
+            f"validations per second ({len(data['interfaces'])} interfaces): "
+            f"{1 / legacy_duration:.1f} -> {1 / duration:.1f}"
+        )
+
     def test_validate_neighbors_data(self):
         dd = self._create_device_data()
         try:
@@ -318,11 +378,118 @@ class TestDeviceData(MonitoringTestMixin, DeviceMonitoringTestCase):
         dd.save_data()
         return dd
 
+    def test_save_data_validated(self):
+        dd = self._create_device_data()
+        dd.data = deepcopy(self._sample_data)
+        with patch.object(DeviceData, "validate_data") as mocked_validate:
+            dd.save_data(validated=True)
+        mocked_validate.assert_not_called()
+        self.assertEqual(DeviceData(pk=dd.pk).data, self._sample_data)
+
     def test_read_data(self):
         dd = self.test_save_data()
         dd = DeviceData(pk=dd.pk)
         self.assertEqual(dd.data, self._sample_data)
 
+    def test_read_data_decoded_once(self):
+        dd = self.test_save_data()
+        dd = DeviceData(pk=dd.pk)
+        with patch.object(codecs, "decode", wraps=codecs.decode) as mocked_decode:
+            self.assertEqual(dd.data, self._sample_data)
+            self.assertEqual(dd.data, self._sample_data)
+            mocked_decode.assert_called_once()
+        with self.subTest("A new snapshot is decoded again"):
+            data = deepcopy(self._sample_data)
+            data["general"]["uptime"] = 1
+            DeviceData(pk=dd.pk, data=data).save_data()
+            self.assertEqual(dd.data["general"]["uptime"], 1)
+
+    @patch.object(codecs, "codec", codecs.ZlibJSONCodec())
+    def test_read_data_zlib_codec(self):
+        dd = self.test_save_data()
+        cache_key = get_device_cache_key(device=dd, context="current-data")
+        self.assertTrue(cache.get(cache_key)[0]["data"].startswith("zlib:"))
+        self.assertEqual(DeviceData(pk=dd.pk).data, self._sample_data)
+        with self.subTest("Read from the timeseries database"):
+            cache.delete(cache_key)
+            self.assertEqual(DeviceData(pk=dd.pk).data, self._sample_data)
+        with self.subTest("JSON snapshots are still decoded"):
+            value = codecs.JSONCodec().encode(self._sample_data)
+            self.assertEqual(codecs.decode(value), self._sample_data)
+
+    def _get_router_data(self, interfaces=24, clients=60, neighbors=200, leases=250):
+        def mac():
+            return ":".join(f"{random.randint(0, 255):02x}" for _ in range(6))
+
+        def ip():
+            octets = [random.randint(0, 255), random.randint(0, 255)]
+            return "10.{}.{}.{}".format(*octets, random.randint(1, 254))
+
+        data = deepcopy(self._sample_data)
+        statistics = data["interfaces"][0]["statistics"]
+        wireless = data["interfaces"][0]["wireless"]
+        client = wireless["clients"][0]
+        data["interfaces"] = []
+        for index in range(interfaces):
+            interface = {
+                "name": f"eth{index}",
+                "type": "ethernet",
+                "mac": mac(),
+                "statistics": {
+                    key: random.randint(0, 10**9) for key in statistics.keys()
+                },
+                "addresses": [
+                    {"proto": "static", "family": "ipv4", "address": ip(), "mask": 24}
+                ],
+            }
+            if index < 4:
+                interface["type"] = "wireless"
+                interface["wireless"] = dict(
+                    wireless,
+                    clients=[
+                        dict(client, mac=mac(), signature=f"signature-{i}")
+                        for i in range(clients // 4)
+                    ],
+                )
+            data["interfaces"].append(interface)
+        data["neighbors"] = [
+            {"ip": ip(), "mac": mac(), "interface": "br-lan", "state": "STALE"}
+            for _ in range(neighbors)
+        ]
+        data["dhcp_leases"] = [
+            {
+                "expiry": 1586943200 + index,
+                "mac": mac(),
+                "ip": ip(),
+                "client_name": f"client-{index}",
+                "client_id": f"01:{mac()}",
+            }
+            for index in range(leases)
+        ]
+        return data
+
+    def test_data_codecs(self):
+        data = self._get_router_data()
+        json_codec = codecs.JSONCodec()
+        zlib_codec = codecs.ZlibJSONCodec()
+        json_value = json_codec.encode(data)
+        zlib_value = zlib_codec.encode(data)
+        self.assertEqual(json_codec.decode(json_value), data)
+        self.assertEqual(zlib_codec.decode(zlib_value), data)
+        self.assertEqual(codecs.decode(json_value), data)
+        self.assertEqual(codecs.decode(zlib_value), data)
+        self.assertLess(len(zlib_value), len(json_value) / 2)
+
+    @tag("benchmark")
+    def test_data_codecs_benchmark(self):
+        data = self._get_router_data()
+        for codec in [codecs.JSONCodec(), codecs.ZlibJSONCodec()]:
+            name = codec.__class__.__name__
+            value = codec.encode(data)
+            print(f"{name}: {len(value)} bytes")
+            benchmark(f"{name}.encode", lambda: codec.encode(data), number=100)
+            benchmark(f"{name}.decode", lambda: codec.decode(value), number=100)
+
     def test_read_data_none(self):
         dd = self._create_device_data()
         self.assertEqual(dd.data, None)
@@ -589,6 +756,73 @@ class TestDeviceData(MonitoringTestMixin, DeviceMonitoringTestCase):
         result = dd.writer._calculate_increment("wlan0", "rx_bytes", 1234.56)
         self.assertEqual(result, 1234)
 
+    @patch.object(app_settings, "WIFI_SESSIONS_ENABLED", False)
+    @patch.object(Metric, "batch_write")
+    def test_interface_counters_cache(self, *args):
+        device = self._create_device(organization=self._create_org())
+        dd = DeviceData.get_devicedata(str(device.pk))
+        cache_key = get_device_cache_key(device=dd, context="interface-counters")
+        data = deepcopy(self._sample_data)
+        statistics = data["interfaces"][0]["statistics"]
+        dd.writer.write(deepcopy(data))
+        self.assertEqual(
+            cache.get(cache_key)["wlan0"],
+            (statistics["rx_bytes"], statistics["tx_bytes"]),
+        )
+        statistics["rx_bytes"] += 1000
+        statistics["tx_bytes"] += 500
+        with patch.object(
+            dd.writer, "_get_snapshot_counters"
+        ) as mocked_snapshot_counters:
+            dd.writer.write(deepcopy(data))
+        mocked_snapshot_counters.assert_not_called()
+        self.assertEqual(
+            cache.get(cache_key)["wlan0"],
+            (statistics["rx_bytes"], statistics["tx_bytes"]),
+        )
+
+        with self.subTest("Counters read from the snapshot if not cached"):
+            cache.delete(cache_key)
+            dd.writer._init_previous_data()
+            self.assertEqual(
+                dd.writer._calculate_increment(
+                    "wlan0", "rx_bytes", statistics["rx_bytes"] + 300
+                ),
+                300,
+            )
+
+    @patch.object(app_settings, "WIFI_SESSIONS_ENABLED", False)
+    @patch.object(Metric, "batch_write")
+    def test_write_bulk_metric_resolution(self, *args):
+        org = self._create_org()
+
+        def get_write_queries(interface_count):
+            device = self._create_device(
+                name=f"device-{interface_count}",
+                mac_address=f"00:11:22:33:44:{interface_count:02d}",
+                organization=org,
+            )
+            dd = DeviceData.get_devicedata(str(device.pk))
+            data = deepcopy(self._sample_data)
+            data["interfaces"] = [
+                {
+                    "name": f"eth{index}",
+                    "type": "ethernet",
+                    "statistics": {"rx_bytes": 100, "tx_bytes": 50},
+                }
+                for index in range(interface_count)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                dd.writer.write(data)
+            return len(context.captured_queries)
+
+        # the number of queries performed by a write operation
+        # must not depend on the number of interfaces
+        self.assertEqual(get_write_queries(2), get_write_queries(20))
+        self.assertEqual(Metric.objects.filter(key="traffic").count(), 22)
+        self.assertEqual(Chart.objects.filter(configuration="traffic").count(), 22)
+        self.assertEqual(AlertSettings.objects.count(), 4)
+
 
 class TestDeviceMonitoring(
     CreateConnectionsMixin, MonitoringTestMixin, DeviceMonitoringTestCase
@@ -1,7 +1,11 @@
 from unittest.mock import patch
 
+from django.core.checks import Error
 from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
 
+from .. import settings as app_settings
+from ..checks import check_device_data_claim_check_cache
 from . import DeviceMonitoringTestCase
 
 
@@ -18,3 +22,30 @@ class TestSettings(DeviceMonitoringTestCase):
             from ..settings import get_critical_device_metrics
 
             get_critical_device_metrics()
+
+    @patch.object(app_settings, "DEVICE_DATA_CLAIM_CHECK", True)
+    def test_device_data_claim_check_cache(self):
+        setting_name = "OPENWISP_MONITORING_DEVICE_DATA_CLAIM_CHECK_CACHE"
+        locmem = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+
+        with self.subTest("Shared cache"):
+            self.assertEqual(check_device_data_claim_check_cache(None), [])
+
+        with self.subTest("Local cache"), override_settings(CACHES={"default": locmem}):
+            errors = check_device_data_claim_check_cache(None)
+            self.assertEqual(len(errors), 1)
+            self.assertIsInstance(errors[0], Error)
+            self.assertEqual(errors[0].obj, setting_name)
+            self.assertIn("is not shared", errors[0].msg)
+
+        with self.subTest("Undefined cache"), patch.object(
+            app_settings, "DEVICE_DATA_CLAIM_CHECK_CACHE", "undefined"
+        ):
+            errors = check_device_data_claim_check_cache(None)
+            self.assertEqual(len(errors), 1)
+            self.assertEqual(errors[0].msg, 'The cache "undefined" is not defined')
+
+        with self.subTest("Claim check disabled"), patch.object(
+            app_settings, "DEVICE_DATA_CLAIM_CHECK", False
+        ), override_settings(CACHES={"default": locmem}):
+            self.assertEqual(check_device_data_claim_check_cache(None), [])
@@ -1,4 +1,12 @@
+import hashlib
+from uuid import uuid4
+
+from django.core.cache import caches
+
 from ..db import timeseries_db
+from ..monitoring import settings as monitoring_settings
+from ..monitoring.utils import get_interval_seconds
+from . import codecs
 from . import settings as app_settings
 
 SHORT_RP = "short"
@@ -9,6 +17,68 @@ def get_device_cache_key(device, context="react-to-updates"):
     return f"device-{device.pk}-{context}"
 
 
+def _get_checksum(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _get_device_data_cache():
+    return caches[app_settings.DEVICE_DATA_CLAIM_CHECK_CACHE]
+
+
+def store_device_data(data):
+    """Stores device data in the cache and returns a reference to it.
+
+    Allows passing only the reference to the background workers instead
+    of the whole data (claim-check pattern). The data is encoded with
+    the configured device data codec.
+    """
+    value = codecs.encode(data)
+    reference = {"key": f"device-data-{uuid4().hex}", "checksum": _get_checksum(value)}
+    _get_device_data_cache().set(
+        reference["key"], value, timeout=app_settings.DEVICE_DATA_CLAIM_CHECK_TIMEOUT
+    )
+    return reference
+
+
+def load_device_data(reference):
+    """Returns the device data stored with ``store_device_data``.
+
+    Returns ``None`` if the data has expired or does not match
+    the checksum of the reference.
+    """
+    value = _get_device_data_cache().get(reference["key"])
+    if value is None or _get_checksum(value) != reference["checksum"]:
+        return None
+    return codecs.decode(value)
+
+
+def discard_device_data(reference):
+    _get_device_data_cache().delete(reference["key"])
+
+
+def get_device_data_task_kwargs(data):
+    """Returns the arguments which pass ``data`` to ``write_device_metrics``."""
+    if app_settings.DEVICE_DATA_CLAIM_CHECK:
+        return {"data_ref": store_device_data(data)}
+    return {"data": data}
+
+
+def merge_patch(target, patch):
+    """Applies a JSON merge patch (RFC 7386) to ``target``.
+
+    Returns a new object, ``target`` is not modified.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    target = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = merge_patch(target.get(key), value)
+    return target
+
+
 def manage_short_retention_policy():
     """creates or updates the "short" retention policy"""
     duration = app_settings.SHORT_RETENTION_POLICY
@@ -19,3 +89,30 @@ def manage_default_retention_policy():
     """creates or updates the "default" retention policy"""
     duration = app_settings.DEFAULT_RETENTION_POLICY
     timeseries_db.create_or_alter_retention_policy(DEFAULT_RP, duration)
+
+
+def manage_rollup_retention_policies():
+    """creates or updates the rollup retention policies
+
+    Unless disabled with the ``continuous_query`` option, a continuous
+    query which aggregates the data of the default retention policy is
+    created for each rollup retention policy. The continuous query runs
+    every sixth of the rollup interval (between 1 and 60 minutes) and
+    recomputes the last two intervals, so that the newest rollup point
+    includes the data received after its interval has started.
+    """
+    for name, options in monitoring_settings.ROLLUP_RETENTION_POLICIES.items():
+        timeseries_db.create_or_alter_retention_policy(name, options["duration"])
+        if not options.get("continuous_query", True):
+            continue
+        interval = get_interval_seconds(options["interval"])
+        resample_every = options.get("resample_every")
+        if not resample_every:
+            resample_every = f"{max(60, min(interval // 6, 3600))}s"
+        timeseries_db.create_or_alter_rollup_query(
+            name,
+            options["interval"],
+            source_retention_policy=DEFAULT_RP,
+            resample_every=resample_every,
+            resample_for=f"{interval * 2}s",
+        )
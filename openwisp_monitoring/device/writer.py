@@ -1,15 +1,19 @@
 import logging
-from copy import deepcopy
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 from pytz import UTC
 from swapper import load_model
 
 from .. import settings as monitoring_settings
+from ..monitoring.base.models import get_metric_cache_key
 from ..monitoring.configuration import ACCESS_TECHNOLOGIES
+from ..monitoring.utils import bulk_create_with_signals
+from .utils import get_device_cache_key
 
 Chart = load_model("monitoring", "Chart")
 Metric = load_model("monitoring", "Metric")
@@ -27,18 +31,45 @@ class DeviceDataWriter(object):
     of OpenWISP.
     """
 
+    # interface counters used to calculate the traffic increments
+    COUNTERS = ("rx_bytes", "tx_bytes")
+
     def __init__(self, device_data):
         self.device_data = device_data
 
+    @property
+    def _counters_cache_key(self):
+        return get_device_cache_key(self.device_data, context="interface-counters")
+
     def _init_previous_data(self):
-        """makes NetJSON interfaces of previous snapshots more easy to access"""
+        """Loads the interface counters of the previous write.
+
+        The counters are kept in the cache as ``{ifname: (rx, tx)}``,
+        the previous snapshot is read only if they're not available
+        (eg: the cache entry has expired).
+        """
+        counters = cache.get(self._counters_cache_key)
+        if counters is None:
+            counters = self._get_snapshot_counters()
+        self._previous_counters = counters
+        self._counters = {}
+
+    def _get_snapshot_counters(self):
+        """Returns the interface counters of the previous snapshot."""
         data = self.device_data.data or {}
-        if data:
-            data = deepcopy(data)
-            data["interfaces_dict"] = {}
+        counters = {}
         for interface in data.get("interfaces", []):
-            data["interfaces_dict"][interface["name"]] = interface
-        self._previous_data = data
+            statistics = interface.get("statistics") or {}
+            counters[interface["name"]] = tuple(
+                statistics.get(stat) for stat in self.COUNTERS
+            )
+        return counters
+
+    def _save_counters(self):
+        # all the counters are saved at once
+        counters = {ifname: tuple(values) for ifname, values in self._counters.items()}
+        timeout = monitoring_settings.CACHE_TIMEOUT
+        cache.set(self._counters_cache_key, counters, timeout=timeout)
 
     def _append_metric_data(
         self, metric, value, current=False, time=None, extra_values=None
@@ -60,7 +91,63 @@ class DeviceDataWriter(object):
             )
         )
 
-    def write(self, data, time=None, current=False):
+    def _get_metric(self, on_create=None, **options):
+        """Registers a metric needed to write the current data.
+
+        The metrics are not retrieved one by one: all the metrics needed
+        by a write operation are resolved at once by ``_resolve_metrics``.
+        ``on_create`` is a list of callables which are executed if the
+        metric is created. Returns the key which identifies the metric in
+        the data appended with ``_append_metric_data``.
+        """
+        lookup_kwargs = {
+            key: value
+            for key, value in options.items()
+            if key not in ["name", "extra_tags"]
+        }
+        key = get_metric_cache_key(**lookup_kwargs)
+        if key not in self._metrics:
+            self._metrics[key] = {"options": options, "on_create": []}
+        self._metrics[key]["on_create"].extend(on_create or [])
+        return key
+
+    def _resolve_metrics(self):
+        """Gets or creates all the metrics registered with ``_get_metric``.
+
+        Charts and alert settings of newly created metrics are created in
+        bulk as well.
+        """
+        if not self._metrics:
+            return
+        self._charts = []
+        self._alert_settings = []
+        results = Metric._get_or_create_many(
+            [item["options"] for item in self._metrics.values()]
+        )
+        metrics = {}
+        for (key, item), (metric, created) in zip(self._metrics.items(), results):
+            metrics[key] = metric
+            if not created:
+                continue
+            for callback in item["on_create"]:
+                callback(metric)
+        if self._charts:
+            bulk_create_with_signals(Chart, self._charts)
+        if self._alert_settings:
+            bulk_create_with_signals(AlertSettings, self._alert_settings)
+        self.write_device_metrics = [
+            (metrics[key], kwargs) for key, kwargs in self.write_device_metrics
+        ]
+
+    def _get_resources_callbacks(self, resource):
+        return [
+            lambda metric: self._create_resources_chart(metric, resource=resource),
+            lambda metric: self._create_resources_alert_settings(
+                metric, resource=resource
+            ),
+        ]
+
+    def write(self, data, time=None, current=False, validated=False):
         if time:
             time = datetime.strptime(time, "%d-%m-%Y_%H:%M:%S.%f").replace(tzinfo=UTC)
         else:
@@ -68,11 +155,12 @@ class DeviceDataWriter(object):
         self._init_previous_data()
         self.device_data.data = data
         # saves raw device data
-        self.device_data.save_data()
+        self.device_data.save_data(validated=validated)
         data = self.device_data.data
         ct = ContentType.objects.get_for_model(Device)
         device_extra_tags = self._get_extra_tags(self.device_data)
         self.write_device_metrics = []
+        self._metrics = OrderedDict()
         for interface in data.get("interfaces", []):
             ifname = interface["name"]
             if "mobile" in interface:
@@ -94,7 +182,8 @@ class DeviceDataWriter(object):
                     )
                 }
                 name = f"{ifname} traffic"
-                metric, created = Metric._get_or_create(
+                metric = self._get_metric(
+                    on_create=[self._create_traffic_chart],
                     object_id=self.device_data.pk,
                     content_type_id=ct.id,
                     configuration="traffic",
@@ -106,8 +195,6 @@ class DeviceDataWriter(object):
                 self._append_metric_data(
                     metric, field_value, current, time=time, extra_values=extra_values
                 )
-                if created:
-                    self._create_traffic_chart(metric)
             try:
                 clients = interface["wireless"]["clients"]
             except KeyError:
@@ -115,7 +202,8 @@ class DeviceDataWriter(object):
             if not isinstance(clients, list):
                 continue
             name = "{0} wifi clients".format(ifname)
-            metric, created = Metric._get_or_create(
+            metric = self._get_metric(
+                on_create=[self._create_clients_chart],
                 object_id=self.device_data.pk,
                 content_type_id=ct.id,
                 configuration="clients",
@@ -133,8 +221,7 @@ class DeviceDataWriter(object):
                     metric, client["mac"], current, time=client_time
                 )
                 client_time += timedelta(microseconds=1)
-            if created:
-                self._create_clients_chart(metric)
+        self._save_counters()
         if "resources" in data:
             if "load" in data["resources"] and "cpus" in data["resources"]:
                 self._write_cpu(
@@ -157,6 +244,7 @@ class DeviceDataWriter(object):
                     current,
                     time=time,
                 )
+        self._resolve_metrics()
         try:
             Metric.batch_write(self.write_device_metrics)
         except ValueError as error:
@@ -210,7 +298,8 @@ class DeviceDataWriter(object):
         if signal_strength is not None:
             signal_strength = float(signal_strength)
         if signal_strength is not None or signal_power is not None:
-            metric, created = Metric._get_or_create(
+            metric = self._get_metric(
+                on_create=[self._create_signal_strength_chart],
                 object_id=self.device_data.pk,
                 content_type_id=ct.id,
                 configuration="signal_strength",
@@ -221,8 +310,6 @@ class DeviceDataWriter(object):
             self._append_metric_data(
                 metric, signal_strength, current, time=time, extra_values=extra_values
             )
-            if created:
-                self._create_signal_strength_chart(metric)
 
         snr = signal_quality = None
         extra_values = {}
@@ -239,7 +326,8 @@ class DeviceDataWriter(object):
         if signal_quality is not None:
             signal_quality = float(signal_quality)
         if snr is not None or signal_quality is not None:
-            metric, created = Metric._get_or_create(
+            metric = self._get_metric(
+                on_create=[self._create_signal_quality_chart],
                 object_id=self.device_data.pk,
                 content_type_id=ct.id,
                 configuration="signal_quality",
@@ -250,10 +338,9 @@ class DeviceDataWriter(object):
             self._append_metric_data(
                 metric, signal_quality, current, time=time, extra_values=extra_values
             )
-            if created:
-                self._create_signal_quality_chart(metric)
         # create access technology chart
-        metric, created = Metric._get_or_create(
+        metric = self._get_metric(
+            on_create=[self._create_access_tech_chart],
             object_id=self.device_data.pk,
             content_type_id=ct.id,
             configuration="access_tech",
@@ -267,8 +354,6 @@ class DeviceDataWriter(object):
             current,
             time=time,
         )
-        if created:
-            self._create_access_tech_chart(metric)
 
     def _write_cpu(
         self, load, cpus, primary_key, content_type, current=False, time=None
@@ -278,12 +363,12 @@ class DeviceDataWriter(object):
             "load_5": float(load[1]),
             "load_15": float(load[2]),
         }
-        metric, created = Metric._get_or_create(
-            object_id=primary_key, content_type_id=content_type.id, configuration="cpu"
+        metric = self._get_metric(
+            on_create=self._get_resources_callbacks("cpu"),
+            object_id=primary_key,
+            content_type_id=content_type.id,
+            configuration="cpu",
         )
-        if created:
-            self._create_resources_chart(metric, resource="cpu")
-            self._create_resources_alert_settings(metric, resource="cpu")
         self._append_metric_data(
             metric,
             100 * float(load[0] / cpus),
@@ -300,12 +385,12 @@ class DeviceDataWriter(object):
             used_bytes += disk["used_bytes"]
             size_bytes += disk["size_bytes"]
             available_bytes += disk["available_bytes"]
-        metric, created = Metric._get_or_create(
-            object_id=primary_key, content_type_id=content_type.id, configuration="disk"
+        metric = self._get_metric(
+            on_create=self._get_resources_callbacks("disk"),
+            object_id=primary_key,
+            content_type_id=content_type.id,
+            configuration="disk",
         )
-        if created:
-            self._create_resources_chart(metric, resource="disk")
-            self._create_resources_alert_settings(metric, resource="disk")
         try:
             value = 100 * used_bytes / size_bytes
         except ZeroDivisionError:
@@ -333,26 +418,28 @@ class DeviceDataWriter(object):
                 percent_used = 100 * (
                     1 - (memory["available"] + memory["buffered"]) / memory["total"]
                 )
-        metric, created = Metric._get_or_create(
+        metric = self._get_metric(
+            on_create=self._get_resources_callbacks("memory"),
             object_id=primary_key,
             content_type_id=content_type.id,
             configuration="memory",
         )
-        if created:
-            self._create_resources_chart(metric, resource="memory")
-            self._create_resources_alert_settings(metric, resource="memory")
         self._append_metric_data(
             metric, percent_used, current, time=time, extra_values=extra_values
         )
 
     def _calculate_increment(self, ifname, stat, value):
         """Returns how much a counter has incremented since its last saved value."""
+        index = self.COUNTERS.index(stat)
+        # keep the current counter for the next write
+        self._counters.setdefault(ifname, [None] * len(self.COUNTERS))[index] = value
         # get previous counters
-        data = self._previous_data
         try:
-            previous_counter = data["interfaces_dict"][ifname]["statistics"][stat]
+            previous_counter = self._previous_counters[ifname][index]
         except KeyError:
-            # if no previous measurements present, counter will start from zero
+            previous_counter = None
+        # if no previous measurements present, counter will start from zero
+        if previous_counter is None:
             previous_counter = 0
         # if current value is higher than previous value,
         # it means the interface traffic counter is increasing
@@ -366,45 +453,41 @@ class DeviceDataWriter(object):
         else:
             return int(value)
 
+    def _add_chart(self, metric, configuration):
+        """Validates a new chart which is then created by ``_resolve_metrics``."""
+        chart = Chart(metric=metric, configuration=configuration)
+        # the metric has just been created, there's no need to validate
+        # its existence nor the uniqueness of the chart
+        chart.full_clean(exclude=["metric"], validate_unique=False)
+        self._charts.append(chart)
+
     def _create_traffic_chart(self, metric):
         """Creates "traffic (GB)" chart."""
         if "traffic" not in monitoring_settings.AUTO_CHARTS:
             return
-        chart = Chart(metric=metric, configuration="traffic")
-        chart.full_clean()
-        chart.save()
+        self._add_chart(metric, "traffic")
 
     def _create_clients_chart(self, metric):
         """Creates "WiFi associations" chart."""
         if "wifi_clients" not in monitoring_settings.AUTO_CHARTS:
             return
-        chart = Chart(metric=metric, configuration="wifi_clients")
-        chart.full_clean()
-        chart.save()
+        self._add_chart(metric, "wifi_clients")
 
     def _create_resources_chart(self, metric, resource):
         if resource not in monitoring_settings.AUTO_CHARTS:
             return
-        chart = Chart(metric=metric, configuration=resource)
-        chart.full_clean()
-        chart.save()
+        self._add_chart(metric, resource)
 
     def _create_resources_alert_settings(self, metric, resource):
         alert_settings = AlertSettings(metric=metric)
-        alert_settings.full_clean()
-        alert_settings.save()
+        alert_settings.full_clean(exclude=["metric"], validate_unique=False)
+        self._alert_settings.append(alert_settings)
 
     def _create_signal_strength_chart(self, metric):
-        chart = Chart(metric=metric, configuration="signal_strength")
-        chart.full_clean()
-        chart.save()
+        self._add_chart(metric, "signal_strength")
 
     def _create_signal_quality_chart(self, metric):
-        chart = Chart(metric=metric, configuration="signal_quality")
-        chart.full_clean()
-        chart.save()
+        self._add_chart(metric, "signal_quality")
 
     def _create_access_tech_chart(self, metric):
-        chart = Chart(metric=metric, configuration="access_tech")
-        chart.full_clean()
-        chart.save()
+        self._add_chart(metric, "access_tech")
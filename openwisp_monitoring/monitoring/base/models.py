@@ -11,10 +11,11 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MaxValueValidator
-from django.db import IntegrityError, models
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from openwisp_notifications.signals import notify
@@ -22,7 +23,15 @@ from pytz import timezone as tz
 from pytz import utc
 from swapper import get_model_name
 
-from openwisp_monitoring.monitoring.utils import clean_timeseries_data_key
+from openwisp_monitoring.monitoring.utils import (
+    bulk_create_with_signals,
+    bulk_update_with_signals,
+    clean_timeseries_data_key,
+    format_timestamps,
+    get_interval_seconds,
+    round_value,
+    round_values,
+)
 from openwisp_utils.base import TimeStampedEditableModel
 
 from ...db import default_chart_query, timeseries_db
@@ -40,6 +49,7 @@ from ..configuration import (
 from ..exceptions import InvalidChartConfigException, InvalidMetricConfigException
 from ..signals import pre_metric_write, threshold_crossed
 from ..tasks import _timeseries_batch_write, _timeseries_write, delete_timeseries
+from ..tolerance import ToleranceTracker
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -129,6 +139,8 @@ class AbstractMetric(TimeStampedEditableModel):
     def __setattr__(self, attrname, value):
         if attrname in ["main_tags", "extra_tags"]:
             value = self._sort_dict(value)
+            # data derived from the tags by the timeseries backend
+            self.__dict__.pop("_timeseries_tags_cache", None)
         return super().__setattr__(attrname, value)
 
     def clean(self):
@@ -207,6 +219,87 @@ class AbstractMetric(TimeStampedEditableModel):
                 return cls._get_or_create(**kwargs)
         return metric, created
 
+    @classmethod
+    def _get_or_create_many(cls, options_list):
+        """Gets or creates many metrics at once.
+
+        Bulk version of ``_get_or_create``: cached metrics are retrieved
+        with a single ``cache.get_many``, the remaining ones are looked up
+        with a single query and the missing ones are created with
+        ``bulk_create``.
+
+        Returns a list of ``(metric, created)`` tuples in the same order
+        of ``options_list``.
+        """
+        lookups = OrderedDict()
+        requested = []
+        for options in options_list:
+            options = deepcopy(options)
+            if "key" in options:
+                options["key"] = cls._makekey(options["key"])
+            lookup_kwargs = deepcopy(options)
+            if lookup_kwargs.get("name"):
+                del lookup_kwargs["name"]
+            extra_tags = lookup_kwargs.pop("extra_tags", {})
+            cache_key = get_metric_cache_key(**lookup_kwargs)
+            lookups.setdefault(cache_key, lookup_kwargs)
+            requested.append((cache_key, options, extra_tags))
+        metrics = cache.get_many(list(lookups.keys()))
+        missing = [key for key in lookups.keys() if key not in metrics]
+        if missing:
+            query = models.Q()
+            for cache_key in missing:
+                query |= models.Q(**lookups[cache_key])
+            found = {}
+            for metric in cls.objects.filter(query):
+                for cache_key in missing:
+                    if cache_key not in found and cls._matches_lookup(
+                        metric, lookups[cache_key]
+                    ):
+                        found[cache_key] = metric
+            cache.set_many(found, CACHE_TIMEOUT)
+            metrics.update(found)
+        results = []
+        new_metrics = OrderedDict()
+        for cache_key, options, extra_tags in requested:
+            if cache_key in metrics:
+                metric = metrics[cache_key]
+                if extra_tags != metric.extra_tags:
+                    metric.extra_tags.update(extra_tags)
+                    metric.extra_tags = cls._sort_dict(metric.extra_tags)
+                    metric.save()
+                results.append((metric, False))
+                continue
+            if cache_key in new_metrics:
+                results.append((new_metrics[cache_key], False))
+                continue
+            metric = cls(**options)
+            # Uniqueness is ensured by the lookup performed above and
+            # by the database constraint in case of race conditions.
+            metric.full_clean(exclude=["content_type"], validate_unique=False)
+            new_metrics[cache_key] = metric
+            results.append((metric, True))
+        if not new_metrics:
+            return results
+        try:
+            with transaction.atomic():
+                bulk_create_with_signals(cls, list(new_metrics.values()))
+        except IntegrityError:
+            # Same race condition handled in "_get_or_create":
+            # fall back to resolving the metrics one by one.
+            return [cls._get_or_create(**options) for options in options_list]
+        return results
+
+    @staticmethod
+    def _matches_lookup(metric, lookup_kwargs):
+        for field, value in lookup_kwargs.items():
+            current = getattr(metric, field)
+            if field == "object_id":
+                current, value = str(current), str(value)
+            if current != value:
+                return False
+        return True
+
     @classmethod
     @cache_memoize(CACHE_TIMEOUT, key_generator_callable=get_metric_cache_key)
     def _get_metric(cls, *args, **kwargs):
@@ -323,7 +416,13 @@ class AbstractMetric(TimeStampedEditableModel):
         return True
 
     def _set_is_healthy_tolerant(
-        self, alert_settings, value, time, retention_policy, send_alert
+        self,
+        alert_settings,
+        value,
+        time,
+        retention_policy,
+        send_alert,
+        tolerance_points=None,
     ):
         """Sets the value of "is_tolerance_healthy" if necessary.
 
@@ -339,7 +438,9 @@ class AbstractMetric(TimeStampedEditableModel):
         and more complex.
         """
         time = self._get_time(time)
-        crossed = alert_settings._is_crossed_by(value, time, retention_policy)
+        crossed = alert_settings._is_crossed_by(
+            value, time, retention_policy, tolerance_points=tolerance_points
+        )
         first_time = False
         # situation has not changed
         if (not crossed and self.is_healthy_tolerant) or (
@@ -384,6 +485,27 @@ class AbstractMetric(TimeStampedEditableModel):
 
     def check_threshold(self, value, time=None, retention_policy=None, send_alert=True):
         """Checks if the threshold is crossed and notifies users accordingly"""
+        result = self._check_threshold(value, time, retention_policy, send_alert)
+        if not result:
+            return
+        update_fields, signal_kwargs = result
+        self.save(update_fields=update_fields)
+        threshold_crossed.send(**signal_kwargs)
+
+    def _check_threshold(
+        self,
+        value,
+        time=None,
+        retention_policy=None,
+        send_alert=True,
+        tolerance_points=None,
+    ):
+        """Updates the health status of the metric without saving it.
+
+        Returns ``None`` if the health status did not change, otherwise
+        returns the fields to update and the arguments of the
+        ``threshold_crossed`` signal.
+        """
         try:
             alert_settings = self.alertsettings
         except ObjectDoesNotExist:
@@ -391,7 +513,12 @@ class AbstractMetric(TimeStampedEditableModel):
 
         is_healthy_changed = self._set_is_healthy(alert_settings, value)
         tolerance_healthy_changed_first_time = self._set_is_healthy_tolerant(
-            alert_settings, value, time, retention_policy, send_alert
+            alert_settings,
+            value,
+            time,
+            retention_policy,
+            send_alert,
+            tolerance_points=tolerance_points,
         )
         is_healthy_tolerant_changed = tolerance_healthy_changed_first_time is not None
         # Do nothing if none of the fields changed.
@@ -402,8 +529,7 @@ class AbstractMetric(TimeStampedEditableModel):
             update_fields.append("is_healthy")
         if is_healthy_tolerant_changed:
             update_fields.append("is_healthy_tolerant")
-        self.save(update_fields=update_fields)
-        threshold_crossed.send(
+        signal_kwargs = dict(
             sender=self.__class__,
             alert_settings=alert_settings,
             metric=self,
@@ -411,6 +537,72 @@ class AbstractMetric(TimeStampedEditableModel):
             first_time=tolerance_healthy_changed_first_time,
             tolerance_crossed=is_healthy_tolerant_changed,
         )
+        return update_fields, signal_kwargs
+
+    @classmethod
+    def check_threshold_many(cls, checks):
+        """Bulk version of ``check_threshold``.
+
+        ``checks`` is a list of ``(metric, check_threshold_kwargs)``
+        tuples. The reads needed to evaluate the tolerance of all the
+        metrics are performed with a single query (or answered by the
+        ``ToleranceTracker``, which rebuilds the missing information with
+        a single query); the changes to the health status are saved
+        with a single query, the ``threshold_crossed`` signal is sent for
+        each change as usual.
+        """
+        indexes = []
+        items = []
+        for index, (metric, kwargs) in enumerate(checks):
+            try:
+                alert_settings = metric.alertsettings
+            except ObjectDoesNotExist:
+                continue
+            time = metric._get_time(kwargs.get("time"))
+            retention_policy = kwargs.get("retention_policy")
+            metric_reads = alert_settings._get_tolerance_reads(
+                kwargs["value"], time, retention_policy
+            )
+            if metric_reads is None:
+                continue
+            indexes.append(index)
+            items.append(
+                (
+                    metric,
+                    metric_reads,
+                    alert_settings._tolerance_search_range,
+                    time or timezone.now(),
+                    retention_policy,
+                )
+            )
+        if app_settings.TOLERANCE_TRACKER:
+            results = ToleranceTracker.read_many(items)
+        else:
+            reads = [
+                metric._get_read_options(**options)
+                for metric, metric_reads, *rest in items
+                for options in metric_reads
+            ]
+            points = timeseries_db.read_many(reads)
+            # each metric needs two reads
+            results = list(zip(points[::2], points[1::2]))
+        tolerance_points = [None] * len(checks)
+        for index, result in zip(indexes, results):
+            tolerance_points[index] = result
+        changed = OrderedDict()
+        update_fields = set()
+        signals = []
+        for (metric, kwargs), metric_points in zip(checks, tolerance_points):
+            result = metric._check_threshold(tolerance_points=metric_points, **kwargs)
+            if not result:
+                continue
+            changed[metric.pk] = metric
+            update_fields.update(result[0])
+            signals.append(result[1])
+        if changed:
+            bulk_update_with_signals(cls, list(changed.values()), update_fields)
+        for signal_kwargs in signals:
+            threshold_crossed.send(**signal_kwargs)
 
     def write(
         self,
@@ -493,9 +685,18 @@ class AbstractMetric(TimeStampedEditableModel):
 
     def read(self, **kwargs):
         """reads timeseries data"""
+        return timeseries_db.read(**self._get_read_options(**kwargs))
+
+    def read_many(self, reads):
+        """performs many reads of timeseries data with a single request"""
+        return timeseries_db.read_many(
+            [self._get_read_options(**options) for options in reads]
+        )
+
+    def _get_read_options(self, **kwargs):
         options = dict(key=self.key, fields=self.field_name, tags=self.tags)
         options.update(kwargs)
-        return timeseries_db.read(**options)
+        return options
 
     def _notify_users(self, notification_type, alert_settings):
         """creates notifications for users"""
@@ -697,17 +898,20 @@ class AbstractChart(TimeStampedEditableModel):
         start_date=None,
         end_date=None,
         additional_params=None,
+        since=None,
     ):
         query = query or self.query
         if summary and self.summary_query:
             query = self.summary_query
         additional_params = additional_params or {}
         params = self._get_query_params(time, start_date, end_date)
+        if since:
+            params["time"] = since
         params.update(additional_params)
         params.update({"start_date": start_date, "end_date": end_date})
         if not params.get("organization_id") and self.config_dict.get("__all__", False):
             params["organization_id"] = ["__all__"]
-        return timeseries_db.get_query(
+        query = timeseries_db.get_query(
             self.type,
             params,
             time,
@@ -717,6 +921,42 @@ class AbstractChart(TimeStampedEditableModel):
             query,
             timezone,
         )
+        retention_policy = self._get_rollup_retention_policy(time, timezone)
+        if retention_policy:
+            query = timeseries_db.get_rollup_query(query, retention_policy) or query
+        return query
+
+    def _get_rollup_retention_policy(self, time, timezone=settings.TIME_ZONE):
+        """Returns the rollup retention policy to be used for ``time``.
+
+        The coarsest rollup whose interval divides the group interval of
+        the chart is chosen. Rollups are aligned to UTC, hence they're
+        skipped when the UTC offset of ``timezone`` is not a multiple of
+        their interval (eg: daily rollups are used only with UTC).
+        """
+        rollups = app_settings.ROLLUP_RETENTION_POLICIES
+        if (
+            not rollups
+            or self.type == "histogram"
+            or self.config_dict.get("rollup") is False
+        ):
+            return None
+        group_interval = get_interval_seconds(self._get_group_map(time).get(time))
+        if not group_interval:
+            return None
+        utc_offset = datetime.now(tz(timezone)).utcoffset().total_seconds()
+        candidates = []
+        for name, options in rollups.items():
+            interval = get_interval_seconds(options["interval"])
+            if (
+                interval
+                and group_interval % interval == 0
+                and utc_offset % interval == 0
+            ):
+                candidates.append((interval, name))
+        if not candidates:
+            return None
+        return max(candidates)[1]
 
     def get_top_fields(self, number):
         """Returns the top fields.
@@ -773,6 +1013,29 @@ class AbstractChart(TimeStampedEditableModel):
             time = str(now - timedelta(days=days))[0:19]
         return time
 
+    @staticmethod
+    def _get_since(since, timezone):
+        """Converts a value of the x axys to a UTC timestamp."""
+        since = datetime.strptime(since, "%Y-%m-%d %H:%M")
+        since = tz(timezone).localize(since).astimezone(utc)
+        return str(since.replace(tzinfo=None))
+
+    @classmethod
+    def _get_x_start(cls, time, timezone, start_date=None, end_date=None):
+        """Returns the first value of the x axys in the time range.
+
+        The buckets ending before the start of the time range are not
+        returned by the timeseries database, used to discard the old
+        buckets when the data is updated incrementally.
+        """
+        start = parse_date(cls._get_time(time, start_date, end_date))
+        if start.tzinfo is None:
+            start = utc.localize(start)
+        interval = get_interval_seconds(cls._get_group_map(time).get(time)) or 0
+        cutoff = (start - timedelta(seconds=interval)).astimezone(tz(timezone))
+        x_start = cutoff.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        return x_start.strftime("%Y-%m-%d %H:%M")
+
     def read(
         self,
         decimal_places=2,
@@ -782,11 +1045,22 @@ class AbstractChart(TimeStampedEditableModel):
         start_date=None,
         end_date=None,
         additional_query_kwargs=None,
+        since=None,
     ):
+        """Reads the chart data.
+
+        When ``since`` is supplied (a value of the x axys, eg:
+        ``2024-01-31 10:20``), only the points at or after that time are
+        returned, while the summary is computed on the whole time range
+        (ignored by histograms).
+        """
         additional_query_kwargs = additional_query_kwargs or {}
         traces = {}
-        if x_axys:
-            x = []
+        # histograms do not have the x axys
+        if since and self.type != "histogram":
+            since = self._get_since(since, timezone)
+        else:
+            since = None
         try:
             query_kwargs = dict(
                 time=time, timezone=timezone, start_date=start_date, end_date=end_date
@@ -794,36 +1068,32 @@ class AbstractChart(TimeStampedEditableModel):
             query_kwargs.update(additional_query_kwargs)
             if self.top_fields:
                 fields = self.get_top_fields(self.top_fields)
-                data_query = self.get_query(fields=fields, **query_kwargs)
+                data_query = self.get_query(fields=fields, since=since, **query_kwargs)
                 summary_query = self.get_query(
                     fields=fields, summary=True, **query_kwargs
                 )
             else:
-                data_query = self.get_query(**query_kwargs)
+                data_query = self.get_query(since=since, **query_kwargs)
                 summary_query = self.get_query(summary=True, **query_kwargs)
-            points = timeseries_db.get_list_query(data_query)
-            summary = timeseries_db.get_list_query(summary_query)
+            # the data and the summary are fetched with a single request
+            data_result, summary_result = timeseries_db.query_many(
+                [data_query, summary_query], precision="s"
+            )
+            columns = timeseries_db.get_columns_query(data_result)
+            if columns is None:
+                columns = self._get_columns(timeseries_db.get_list_query(data_result))
+            summary = timeseries_db.get_list_query(summary_result)
         except timeseries_db.client_error as e:
             logging.error(e, exc_info=True)
             raise e
-        for point in points:
-            for key, value in point.items():
-                if key == "time":
-                    continue
-                traces.setdefault(key, [])
-                if decimal_places and isinstance(value, (int, float)):
-                    value = self._round(value, decimal_places)
-                traces[key].append(value)
-            time = datetime.fromtimestamp(point["time"], tz=tz(timezone)).strftime(
-                "%Y-%m-%d %H:%M"
-            )
-            if x_axys:
-                x.append(time)
+        times = columns.pop("time", [])
+        for key, values in columns.items():
+            traces[key] = round_values(values, decimal_places)
         # prepare result to be returned
         # (transform chart data so its order is not random)
         result = {"traces": sorted(traces.items())}
         if x_axys:
-            result["x"] = x
+            result["x"] = format_timestamps(times, tz(timezone))
         # add summary
         if len(summary) > 0:
             result["summary"] = {}
@@ -855,13 +1125,23 @@ class AbstractChart(TimeStampedEditableModel):
         except KeyError as e:
             logger.warning(f"Got KeyError in Chart.json method: {e}")
 
+    @staticmethod
+    def _get_columns(points):
+        """Converts a list of points to a dictionary of columns.
+
+        Points may not contain all the keys (eg: "GROUP BY TAG" queries),
+        hence each column contains only the values which are present.
+        """
+        columns = OrderedDict(time=[])
+        for point in points:
+            for key, value in point.items():
+                columns.setdefault(key, []).append(value)
+        return columns
+
     @staticmethod
     def _round(value, decimal_places):
         """Rounds value when necessary."""
-        control = 1.0 / 10**decimal_places
-        if value < control:
-            decimal_places += 2
-        return round(value, decimal_places)
+        return round_value(value, decimal_places)
 
 
 class AbstractAlertSettings(TimeStampedEditableModel):
@@ -915,6 +1195,7 @@ class AbstractAlertSettings(TimeStampedEditableModel):
     def invalidate_cache(cls, instance, *args, **kwargs):
         Metric = instance.metric._meta.model
         Metric.invalidate_cache(instance.metric)
+        ToleranceTracker.invalidate(instance.metric_id)
 
     def full_clean(self, *args, **kwargs):
         if self.custom_threshold == self.config_dict["threshold"]:
@@ -971,11 +1252,12 @@ class AbstractAlertSettings(TimeStampedEditableModel):
             return tolerance_seconds + int(tolerance_seconds * 0.25)
         return tolerance_seconds
 
-    def _is_crossed_by(self, current_value, time=None, retention_policy=None):
-        """Answers the following question:
+    def _get_tolerance_reads(self, current_value, time=None, retention_policy=None):
+        """Returns the reads needed to evaluate the tolerance.
 
-        do current_value and time cross the threshold and trespass the
-        tolerance?
+        Returns a tuple containing the arguments of the two ``read``
+        operations performed by ``_is_crossed_by`` or ``None`` if
+        the tolerance does not need to be evaluated.
         """
         value_crossed = self._value_crossed(current_value)
         if value_crossed is NotImplemented:
@@ -983,7 +1265,7 @@ class AbstractAlertSettings(TimeStampedEditableModel):
         tolerance = self.tolerance * 60
         # no tolerance specified, return immediately
         if tolerance == 0 or tolerance < app_settings.TOLERANCE_INTERVAL:
-            return value_crossed
+            return None
         now = time or timezone.now()
         if value_crossed:
             operator = self.operator
@@ -997,15 +1279,57 @@ class AbstractAlertSettings(TimeStampedEditableModel):
             else:
                 operator = ">="
                 flapping_operator = "<"
+        since = now - timedelta(seconds=self._tolerance_search_range)
         # There should be atleast two points that have trespassed the threshold
-        trespassed_points = self.metric.read(
+        trespassed_points = dict(
             limit=2,
             retention_policy=retention_policy,
-            since=(now - timedelta(seconds=self._tolerance_search_range)),
+            since=since,
             where=[
                 (self.metric.alert_field, operator, self.threshold),
             ],
         )
+        # Get the last point written before the threshold was crossed
+        under_threshold = dict(
+            limit=1,
+            retention_policy=retention_policy,
+            order="-time",
+            since=since,
+            where=[
+                (self.metric.alert_field, flapping_operator, self.threshold),
+            ],
+        )
+        return trespassed_points, under_threshold
+
+    def _is_crossed_by(
+        self, current_value, time=None, retention_policy=None, tolerance_points=None
+    ):
+        """Answers the following question:
+
+        do current_value and time cross the threshold and trespass the
+        tolerance?
+
+        ``tolerance_points`` allows to supply the results of the reads
+        returned by ``_get_tolerance_reads`` when these have already
+        been performed (eg: in bulk), otherwise these are answered by
+        the ``ToleranceTracker`` or by querying the timeseries database
+        if the tracker is disabled.
+        """
+        now = time or timezone.now()
+        reads = self._get_tolerance_reads(current_value, now, retention_policy)
+        value_crossed = self._value_crossed(current_value)
+        # no tolerance specified, return immediately
+        if reads is None:
+            return value_crossed
+        tolerance = self.tolerance * 60
+        if tolerance_points is None and app_settings.TOLERANCE_TRACKER:
+            tolerance_points = ToleranceTracker(self.metric).read(
+                reads, self._tolerance_search_range, now, retention_policy
+            )
+        if tolerance_points is None:
+            # both reads are performed with a single request
+            tolerance_points = self.metric.read_many(reads)
+        trespassed_points = tolerance_points[0]
 
         # We need at least two offending points to determine if the metric has
         # crossed the threshold. These points should be at least `tolerance` seconds apart.
@@ -1019,16 +1343,7 @@ class AbstractAlertSettings(TimeStampedEditableModel):
             )
 
         # Ensure metric is not flapping
-        # Get the last point written before the threshold was crossed
-        under_threshold = self.metric.read(
-            limit=1,
-            retention_policy=retention_policy,
-            order="-time",
-            since=(now - timedelta(seconds=self._tolerance_search_range)),
-            where=[
-                (self.metric.alert_field, flapping_operator, self.threshold),
-            ],
-        )
+        under_threshold = tolerance_points[1]
         if len(under_threshold) != 0:
             # No points found, so we cannot determine if the metric is flapping
             return not self.metric.is_healthy_tolerant
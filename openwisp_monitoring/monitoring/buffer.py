@@ -0,0 +1,94 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer(object):
+    """Coalesces timeseries points coming from many device reports.
+
+    Points are kept in memory and handed over to ``flush_func`` in one
+    go as soon as ``max_points`` points have been collected or when
+    ``max_interval`` milliseconds have passed since the first point
+    was buffered, whichever comes first.
+    """
+
+    def __init__(self, flush_func, max_points=1000, max_interval=500):
+        self.flush_func = flush_func
+        self.max_points = max_points
+        self.max_interval = max_interval
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._points = []
+        self._first_added = None
+        self._timer = None
+
+    def _check_pid(self):
+        # state inherited from a parent process (eg: pre-forking
+        # web or celery workers) must not be shared with the children
+        if self._pid != os.getpid():
+            self._reset()
+
+    def add(self, points):
+        self._check_pid()
+        with self._lock:
+            self._points.extend(points)
+            if self._first_added is None:
+                self._first_added = time.monotonic()
+                self._start_timer()
+            elapsed = (time.monotonic() - self._first_added) * 1000
+            if len(self._points) < self.max_points and elapsed < self.max_interval:
+                return
+            points = self._pop()
+        self._flush(points)
+
+    def flush(self):
+        self._check_pid()
+        with self._lock:
+            points = self._pop()
+        self._flush(points)
+
+    def __len__(self):
+        return len(self._points)
+
+    def _pop(self):
+        points = self._points
+        self._points = []
+        self._first_added = None
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        return points
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.max_interval / 1000, self._timer_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _timer_flush(self):
+        try:
+            self.flush()
+        finally:
+            # the timer runs in its own thread, which shall not
+            # leave behind the database connections opened by
+            # ``flush_func`` (eg: to check the alert thresholds)
+            connections.close_all()
+
+    def _flush(self, points):
+        if not points:
+            return
+        try:
+            self.flush_func(points)
+        except Exception as e:
+            logger.exception(
+                f"Could not flush {len(points)} buffered timeseries points: {e}"
+            )
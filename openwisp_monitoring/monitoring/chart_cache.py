@@ -0,0 +1,204 @@
+import hashlib
+import json
+import time as time_module
+from bisect import bisect_left
+from datetime import datetime
+
+from django.core.cache import cache
+from pytz import timezone as tz
+
+from .utils import get_interval_seconds
+
+_X_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class ChartCache(object):
+    """Caches the data returned by ``Chart.read``.
+
+    The data is cached for the duration of the group interval of the
+    chart (eg: ``10m`` for ``1d``, ``24h`` for ``30d``), the cache key
+    contains all the arguments passed to ``Chart.read`` (time range,
+    timezone, custom dates and additional query parameters).
+
+    When new data is written for the metric of the chart, only the
+    newest bucket of the cached data is read again from the timeseries
+    database (together with the summary) and merged with the rest of
+    the cached data, which does not change.
+
+    Hit, refresh and miss counters are kept in the cache and can be
+    retrieved with ``ChartCache.get_stats``.
+    """
+
+    STATUSES = ("hit", "refresh", "miss")
+    # the longest group interval used by charts
+    _max_timeout = 7 * 24 * 60 * 60
+
+    def __init__(self, chart):
+        self.chart = chart
+        self.status = None
+
+    @staticmethod
+    def get_write_key(metric_pk=None, key=None):
+        """Returns the cache key storing the time of the last write.
+
+        The data of object metrics (eg: device metrics) is tracked
+        individually by primary key, while general metrics (eg: dashboard
+        charts) are tracked by measurement key, because their charts
+        aggregate the data of all the objects.
+        """
+        if metric_pk:
+            return f"chart-cache-write-{metric_pk}"
+        return f"chart-cache-write-key-{key}"
+
+    @classmethod
+    def register_writes(cls, metric_pks, keys):
+        """Marks the newest bucket of the cached chart data as outdated.
+
+        ``metric_pks`` are the primary keys of the metrics which have been
+        written, ``keys`` are the names of the measurements.
+        """
+        now = time_module.time()
+        cache_keys = [cls.get_write_key(metric_pk=pk) for pk in metric_pks]
+        cache_keys += [cls.get_write_key(key=key) for key in keys]
+        if cache_keys:
+            cache.set_many(dict.fromkeys(cache_keys, now), cls._max_timeout)
+
+    @classmethod
+    def get_stats(cls):
+        keys = {cls._get_stats_key(status): status for status in cls.STATUSES}
+        stats = cache.get_many(keys.keys())
+        return {status: stats.get(key, 0) for key, status in keys.items()}
+
+    @staticmethod
+    def _get_stats_key(status):
+        return f"chart-cache-stats-{status}"
+
+    def _incr_stats(self, status):
+        key = self._get_stats_key(status)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # the key has been evicted in the meantime
+            cache.set(key, 1, timeout=None)
+
+    def get_cache_key(self, **kwargs):
+        options = json.dumps(
+            dict(modified=self.chart.modified, **kwargs), sort_keys=True, default=str
+        )
+        digest = hashlib.md5(options.encode()).hexdigest()
+        return f"chart-cache-{self.chart.pk}-{digest}"
+
+    def _get_interval(self, time):
+        interval = self.chart._get_group_map(time).get(time)
+        return get_interval_seconds(interval) or self._max_timeout
+
+    def _get_last_write(self):
+        metric = self.chart.metric
+        if metric.object_id:
+            key = self.get_write_key(metric_pk=metric.pk)
+        else:
+            key = self.get_write_key(key=metric.key)
+        return cache.get(key, 0)
+
+    def _parse_x(self, value, timezone):
+        value = datetime.strptime(value, _X_FORMAT)
+        return tz(timezone).localize(value).timestamp()
+
+    def _get_expiration(self, result, interval, now, timezone):
+        """Returns the time in which the newest bucket ends."""
+        if result.get("x"):
+            newest_bucket_end = self._parse_x(result["x"][-1], timezone) + interval
+            if newest_bucket_end > now:
+                return newest_bucket_end
+        return now + interval
+
+    def _is_fresh(self, entry, now):
+        return entry["expires"] > now and self._get_last_write() < entry["cached_at"]
+
+    def _can_refresh(self, entry):
+        return (
+            self.chart.type != "histogram"
+            and not self.chart.top_fields
+            and bool(entry["result"].get("x"))
+        )
+
+    def read(self, since=None, **kwargs):
+        """Returns the data of the chart, reading it from the cache if possible.
+
+        Accepts the same arguments of ``Chart.read``.
+        """
+        timezone = kwargs["timezone"]
+        interval = self._get_interval(kwargs["time"])
+        key = self.get_cache_key(**kwargs)
+        now = time_module.time()
+        entry = cache.get(key)
+        result = None
+        if entry is not None and self._is_fresh(entry, now):
+            self.status = "hit"
+            result = entry["result"]
+        elif entry is not None and self._can_refresh(entry):
+            self.status = "refresh"
+            result = self._refresh(entry["result"], **kwargs)
+        if result is None:
+            self.status = "miss"
+            result = self.chart.read(**kwargs)
+        if self.status != "hit":
+            entry = dict(
+                result=result,
+                cached_at=now,
+                expires=self._get_expiration(result, interval, now, timezone),
+            )
+            cache.set(key, entry, interval)
+        self._incr_stats(self.status)
+        if since:
+            result = self.slice(result, since)
+        return result
+
+    def _refresh(self, cached, **kwargs):
+        """Reads again only the newest bucket of the ``cached`` data.
+
+        Returns ``None`` when the data read cannot be merged with the
+        cached data (eg: the traces have changed).
+        """
+        tail = self.chart.read(since=cached["x"][-1], **kwargs)
+        traces = dict(cached["traces"])
+        tail_traces = dict(tail["traces"])
+        if not tail.get("x") or set(traces.keys()) != set(tail_traces.keys()):
+            return None
+        x = cached["x"]
+        index = bisect_left(x, tail["x"][0])
+        result = dict(cached)
+        result["x"] = x[:index] + tail["x"]
+        result["traces"] = [
+            (name, list(traces[name][:index]) + list(tail_traces[name]))
+            for name, _ in cached["traces"]
+        ]
+        result.pop("summary", None)
+        if "summary" in tail:
+            result["summary"] = tail["summary"]
+        return self._trim(result, **kwargs)
+
+    def _trim(self, result, **kwargs):
+        """Removes the buckets which are not in the time range anymore."""
+        x_start = self.chart._get_x_start(
+            kwargs["time"],
+            kwargs["timezone"],
+            kwargs.get("start_date"),
+            kwargs.get("end_date"),
+        )
+        return self.slice(result, x_start)
+
+    @staticmethod
+    def slice(result, since):
+        """Returns the points of ``result`` at or after ``since``."""
+        if not result.get("x"):
+            return result
+        index = bisect_left(result["x"], since)
+        if index:
+            result = dict(result)
+            result["x"] = result["x"][index:]
+            result["traces"] = [
+                (name, values[index:]) for name, values in result["traces"]
+            ]
+        return result
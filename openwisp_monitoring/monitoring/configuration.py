@@ -802,12 +802,10 @@ def _validate_chart_configuration(chart_config):
 def register_metric_notifications(metric_name, metric_config):
     if "notification" not in metric_config:
         return
-    register_notification_type(
-        f"{metric_name}_problem", metric_config["notification"]["problem"]
-    )
-    register_notification_type(
-        f"{metric_name}_recovery", metric_config["notification"]["recovery"]
-    )
+    # compiled configurations are read-only
+    notification = deepcopy(metric_config["notification"])
+    register_notification_type(f"{metric_name}_problem", notification["problem"])
+    register_notification_type(f"{metric_name}_recovery", notification["recovery"])
 
 
 def unregister_metric_notifications(metric_name):
@@ -818,7 +816,102 @@ def unregister_metric_notifications(metric_name):
     unregister_notification_type(f"{metric_name}_recovery")
 
 
-def get_metric_configuration():
+class _ReadOnlyDict(dict):
+    """Dictionary which cannot be modified, used for compiled configurations.
+
+    Copies (``copy()``, ``copy.copy``, ``copy.deepcopy``) are regular
+    dictionaries which can be modified. The nested lists are instances
+    of ``_ReadOnlyList``.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Compiled configurations are read-only, copy them first.")
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = __ior__ = _read_only
+
+    def copy(self):
+        return dict(self)
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self),)
+
+
+class _ReadOnlyList(list):
+    """List which cannot be modified, used for compiled configurations."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Compiled configurations are read-only, copy them first.")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def copy(self):
+        return list(self)
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+
+def _compile_configuration(config):
+    if isinstance(config, dict):
+        return _ReadOnlyDict(
+            (key, _compile_configuration(value)) for key, value in config.items()
+        )
+    if isinstance(config, list):
+        return _ReadOnlyList(_compile_configuration(value) for value in config)
+    return config
+
+
+# Incremented by the functions which register and unregister metrics and
+# charts, causes the compiled configurations to be built again.
+_registry_version = 0
+_registry = {}
+
+
+def _bump_registry_version():
+    global _registry_version
+    _registry_version += 1
+
+
+def _get_registry_version():
+    # the settings and the number of the registered configurations
+    # are included to detect changes which do not go through the
+    # register/unregister functions (eg: patched settings in tests)
+    return (
+        _registry_version,
+        id(app_settings.ADDITIONAL_METRICS),
+        id(app_settings.ADDITIONAL_CHARTS),
+        len(DEFAULT_METRICS),
+        len(DEFAULT_CHARTS),
+    )
+
+
+def _get_registry():
+    """Returns the compiled metric and chart configurations.
+
+    The configurations are merged with the settings and validated only
+    when the registry version changes, lookups return the same
+    read-only objects until then.
+    """
+    global _registry
+    registry = _registry
+    if registry.get("version") == _get_registry_version():
+        return registry
+    metrics = _build_metric_configuration()
+    charts = _build_chart_configuration(metrics)
+    registry = {
+        "metrics": _compile_configuration(metrics),
+        "charts": _compile_configuration(charts),
+        # computed after building, which adds the charts of the metrics
+        # to DEFAULT_CHARTS
+        "version": _get_registry_version(),
+    }
+    _registry = registry
+    return registry
+
+
+def _build_metric_configuration():
     additional_metrics = deepcopy(app_settings.ADDITIONAL_METRICS)
     for metric_name in list(additional_metrics.keys()):
         if additional_metrics[metric_name].get("partial", False):
@@ -838,6 +931,10 @@ def get_metric_configuration():
     return metrics
 
 
+def get_metric_configuration():
+    return _get_registry()["metrics"]
+
+
 def get_metric_configuration_choices():
     metrics = get_metric_configuration()
     choices = []
@@ -872,6 +969,7 @@ def register_metric(metric_name, metric_config):
     for chart in metric_config.get("charts", {}).values():
         _validate_chart_configuration(chart_config=chart)
     DEFAULT_METRICS.update({metric_name: metric_config})
+    _bump_registry_version()
     _register_metric_configuration_choice(metric_name, metric_config)
     register_metric_notifications(metric_name, metric_config)
 
@@ -883,6 +981,7 @@ def unregister_metric(metric_name):
         raise ImproperlyConfigured(f'No such Chart configuation "{metric_name}".')
     unregister_metric_notifications(metric_name)
     DEFAULT_METRICS.pop(metric_name)
+    _bump_registry_version()
     _unregister_metric_configuration_choice(metric_name)
 
 
@@ -898,8 +997,7 @@ def _unregister_metric_configuration_choice(metric_name):
             return
 
 
-def get_chart_configuration():
-    metrics = get_metric_configuration()
+def _build_chart_configuration(metrics):
     for metric in metrics.values():
         if "charts" in metric:
             DEFAULT_CHARTS.update(metric["charts"])
@@ -910,6 +1008,10 @@ def get_chart_configuration():
     return charts
 
 
+def get_chart_configuration():
+    return _get_registry()["charts"]
+
+
 def get_chart_configuration_choices():
     charts = get_chart_configuration()
     choices = []
@@ -931,6 +1033,7 @@ def register_chart(chart_name, chart_config):
         )
     _validate_chart_configuration(chart_config)
     DEFAULT_CHARTS.update({chart_name: chart_config})
+    _bump_registry_version()
     _register_chart_configuration_choice(chart_name, chart_config)
 
 
@@ -940,6 +1043,7 @@ def unregister_chart(chart_name):
     if chart_name not in DEFAULT_CHARTS:
         raise ImproperlyConfigured(f'No such Chart configuation "{chart_name}"')
     DEFAULT_CHARTS.pop(chart_name)
+    _bump_registry_version()
     _unregister_chart_configuration_choice(chart_name)
 
 
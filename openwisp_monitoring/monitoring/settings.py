@@ -11,3 +11,12 @@ RETRY_OPTIONS = get_settings_value(
 )
 ADDITIONAL_DASHBOARD_TRAFFIC_CHART = get_settings_value("DASHBOARD_TRAFFIC_CHART", {})
 TOLERANCE_INTERVAL = get_settings_value("TOLERANCE_INTERVAL", 300)
+WRITE_BUFFER = dict(
+    enabled=False,
+    max_points=1000,
+    max_interval=500,
+)
+WRITE_BUFFER.update(get_settings_value("WRITE_BUFFER", {}))
+TOLERANCE_TRACKER = get_settings_value("TOLERANCE_TRACKER", False)
+CHART_CACHE = get_settings_value("CHART_CACHE", True)
+ROLLUP_RETENTION_POLICIES = get_settings_value("ROLLUP_RETENTION_POLICIES", {})
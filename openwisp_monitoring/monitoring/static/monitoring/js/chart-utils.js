@@ -233,6 +233,8 @@ django.jQuery(
         baseUrl = `${apiUrl}?time=`,
         globalLoadingOverlay = $("#loading-overlay"),
         localLoadingOverlay = $("#chart-loading-overlay"),
+        // data of the charts currently shown, used for incremental refreshes
+        loadedChartsData = null,
         getChartFetchUrl = function (time) {
           var url = baseUrl + time;
           // pass pickerEndDate and pickerStartDate to url
@@ -264,6 +266,8 @@ django.jQuery(
           return url;
         },
         createCharts = function (data) {
+          // createChart alters the data, hence a copy is stored
+          loadedChartsData = $.extend(true, {}, data);
           $.each(data.charts, function (i, chart) {
             var htmlId = "chart-" + i,
               chartDiv = $("#" + htmlId),
@@ -457,11 +461,102 @@ django.jQuery(
           .join("&");
         location.href = `${apiUrl}?${queryString}`;
       });
-      // fetch chart data and replace the old charts with the new ones
+      // returns the last value of the x axys of the charts currently shown,
+      // or null if the charts cannot be refreshed incrementally
+      function getRefreshSince() {
+        if (
+          !loadedChartsData ||
+          !loadedChartsData.x ||
+          !loadedChartsData.x.length ||
+          localStorage.getItem(isCustomDateRange) === "true"
+        ) {
+          return null;
+        }
+        return loadedChartsData.x[loadedChartsData.x.length - 1];
+      }
+      // merges the buckets returned by an incremental refresh into the
+      // charts currently shown, returns null if the data cannot be merged;
+      // the charts are matched by title because the charts which have no
+      // data in the refreshed range are not returned by the server
+      function mergeChartsData(loaded, fetched) {
+        var x = fetched.x || [],
+          fetchedCharts = {},
+          start = 0,
+          end = loaded.x.length,
+          merged = $.extend(true, {}, fetched);
+        while (start < loaded.x.length && loaded.x[start] < fetched.x_start) {
+          start++;
+        }
+        if (x.length) {
+          end = loaded.x.indexOf(x[0]);
+          if (end < 0) {
+            return null;
+          }
+        }
+        merged.x = loaded.x.slice(start, end).concat(x);
+        $.each(merged.charts, function (i, chart) {
+          fetchedCharts[chart.title] = chart;
+        });
+        if (Object.keys(fetchedCharts).length !== merged.charts.length) {
+          return null;
+        }
+        merged.charts = [];
+        for (var loadedChart of loaded.charts) {
+          var chart = fetchedCharts[loadedChart.title],
+            fetchedTraces = {};
+          delete fetchedCharts[loadedChart.title];
+          // histograms are always returned in full
+          if (chart && chart.type === "histogram") {
+            merged.charts.push(chart);
+            continue;
+          }
+          if (!chart) {
+            // no data in the refreshed range
+            chart = $.extend(true, {}, loadedChart);
+            chart.traces = [];
+          }
+          $.each(chart.traces, function (i, trace) {
+            fetchedTraces[trace[0]] = trace[1];
+          });
+          chart.traces = [];
+          for (var trace of loadedChart.traces) {
+            var name = trace[0],
+              tail = fetchedTraces[name] || new Array(x.length).fill(null);
+            chart.traces.push([name, trace[1].slice(start, end).concat(tail)]);
+            delete fetchedTraces[name];
+          }
+          if (Object.keys(fetchedTraces).length) {
+            return null;
+          }
+          merged.charts.push(chart);
+        }
+        // the server returned charts which are not shown
+        if (Object.keys(fetchedCharts).length) {
+          return null;
+        }
+        delete merged.x_start;
+        return merged;
+      }
+      // fetch chart data and replace the old charts with the new ones,
+      // only the data which may have changed is fetched if possible
       function loadFetchedCharts(time) {
-        $.ajax(getChartFetchUrl(time), {
+        var since = getRefreshSince(),
+          url = getChartFetchUrl(time);
+        if (since) {
+          url = `${url}&since=${encodeURIComponent(since)}`;
+        }
+        $.ajax(url, {
           dataType: "json",
           success: function (data) {
+            if (since) {
+              data = mergeChartsData(loadedChartsData, data);
+              if (data === null) {
+                // the charts have changed, reload them entirely
+                loadedChartsData = null;
+                loadFetchedCharts(time);
+                return;
+              }
+            }
             if (data.charts.length) {
               createCharts(data);
               triggerZoomCharts("js-plotly-plot");
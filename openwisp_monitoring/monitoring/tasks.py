@@ -1,16 +1,33 @@
+import time
+
 from celery import shared_task
+from dateutil.parser import parse as parse_date
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import prefetch_related_objects
 from swapper import load_model
 
 from openwisp_utils.tasks import OpenwispCeleryTask
 
 from ..db import timeseries_db
 from ..db.exceptions import TimeseriesWriteException
-from .settings import RETRY_OPTIONS
+from . import settings as app_settings
+from .buffer import WriteBuffer
+from .chart_cache import ChartCache
+from .settings import (
+    CHART_CACHE,
+    RETRY_OPTIONS,
+    ROLLUP_RETENTION_POLICIES,
+    WRITE_BUFFER,
+)
 from .signals import post_metric_write
+from .tolerance import ToleranceTracker
+from .utils import get_interval_seconds
 
 
 def _metric_post_write(name, values, metric, check_threshold_kwargs=None, **kwargs):
+    _register_chart_cache_writes([(name, metric)])
+    if metric and not check_threshold_kwargs:
+        _invalidate_tolerance_trackers([metric])
     if not metric or not check_threshold_kwargs:
         return
     try:
@@ -22,22 +39,115 @@ def _metric_post_write(name, values, metric, check_threshold_kwargs=None, **kwar
         # This can happen as the task is being run async.
         pass
     else:
+        _update_tolerance_trackers([(metric, values, kwargs)])
         metric.check_threshold(**check_threshold_kwargs)
-        signal_kwargs = dict(
-            sender=metric.__class__,
-            metric=metric,
-            values=values,
-            time=kwargs.get("timestamp"),
-            current=kwargs.get("current", "False"),
-        )
-        post_metric_write.send(**signal_kwargs)
+        _send_post_metric_write(metric, values, **kwargs)
+
+
+def _metric_post_write_many(data):
+    """Same as ``_metric_post_write`` but operates on a list of metric data.
+
+    The metrics and their alert settings are fetched with one query,
+    thresholds are checked with ``Metric.check_threshold_many``.
+    """
+    Metric = load_model("monitoring", "Metric")
+    _register_chart_cache_writes([(item["name"], item.get("metric")) for item in data])
+    _invalidate_tolerance_trackers(
+        [
+            item["metric"]
+            for item in data
+            if item.get("metric") and not item.get("check_threshold_kwargs")
+        ]
+    )
+    data = [
+        item
+        for item in data
+        if item.get("metric") and item.get("check_threshold_kwargs")
+    ]
+    instances = [item["metric"] for item in data if isinstance(item["metric"], Metric)]
+    pks = {item["metric"] for item in data if not isinstance(item["metric"], Metric)}
+    metrics = {}
+    if instances:
+        prefetch_related_objects(instances, "alertsettings")
+    if pks:
+        queryset = Metric.objects.select_related("alertsettings")
+        metrics = {str(pk): metric for pk, metric in queryset.in_bulk(pks).items()}
+    checks = []
+    for item in data:
+        item = item.copy()
+        metric = item.pop("metric")
+        if not isinstance(metric, Metric):
+            metric = metrics.get(str(metric))
+            # The metric can be deleted by the time threshold is being checked.
+            # This can happen as the task is being run async.
+            if metric is None:
+                continue
+        checks.append((metric, item))
+    _update_tolerance_trackers(
+        [(metric, item["values"], item) for metric, item in checks]
+    )
+    Metric.check_threshold_many(
+        [(metric, item["check_threshold_kwargs"]) for metric, item in checks]
+    )
+    for metric, item in checks:
+        _send_post_metric_write(metric, **item)
+
+
+def _update_tolerance_trackers(data):
+    """Stores the values written in the tolerance trackers."""
+    if not app_settings.TOLERANCE_TRACKER or not data:
+        return
+    ToleranceTracker.add_points(
+        [
+            (
+                metric,
+                kwargs.get("retention_policy"),
+                kwargs.get("timestamp"),
+                values.get(metric.alert_field),
+            )
+            for metric, values, kwargs in data
+            if kwargs.get("timestamp")
+        ]
+    )
+
+
+def _invalidate_tolerance_trackers(metrics):
+    """Tolerance trackers are rebuilt when values are written without
+    checking the threshold (eg: historical data)."""
+    if not app_settings.TOLERANCE_TRACKER or not metrics:
+        return
+    ToleranceTracker.invalidate(*{getattr(metric, "pk", metric) for metric in metrics})
+
+
+def _register_chart_cache_writes(data):
+    """Marks the newest bucket of the cached charts as outdated.
+
+    ``data`` is a list of ``(measurement name, metric)`` tuples.
+    """
+    if not CHART_CACHE or not data:
+        return
+    ChartCache.register_writes(
+        metric_pks={getattr(metric, "pk", metric) for _, metric in data if metric},
+        keys={name for name, _ in data},
+    )
+
+
+def _send_post_metric_write(metric, values, check_threshold_kwargs=None, **kwargs):
+    signal_kwargs = dict(
+        sender=metric.__class__,
+        metric=metric,
+        values=values,
+        time=kwargs.get("timestamp"),
+        current=kwargs.get("current", "False"),
+    )
+    post_metric_write.send(**signal_kwargs)
 
 
 @shared_task(
     base=OpenwispCeleryTask,
     bind=True,
     autoretry_for=(TimeseriesWriteException,),
-    **RETRY_OPTIONS
+    **RETRY_OPTIONS,
 )
 def timeseries_write(
     self, name, values, metric=None, check_threshold_kwargs=None, **kwargs
@@ -49,6 +159,19 @@ def timeseries_write(
 
 def _timeseries_write(name, values, metric=None, check_threshold_kwargs=None, **kwargs):
     """Handles writes synchronously when using UDP mode."""
+    if write_buffer:
+        write_buffer.add(
+            [
+                dict(
+                    name=name,
+                    values=values,
+                    metric=metric,
+                    check_threshold_kwargs=check_threshold_kwargs,
+                    **kwargs,
+                )
+            ]
+        )
+        return
     if timeseries_db.use_udp:
         func = timeseries_write
     else:
@@ -59,7 +182,7 @@ def _timeseries_write(name, values, metric=None, check_threshold_kwargs=None, **
         values=values,
         metric=metric,
         check_threshold_kwargs=check_threshold_kwargs,
-        **kwargs
+        **kwargs,
     )
 
 
@@ -67,7 +190,7 @@ def _timeseries_write(name, values, metric=None, check_threshold_kwargs=None, **
     base=OpenwispCeleryTask,
     bind=True,
     autoretry_for=(TimeseriesWriteException,),
-    **RETRY_OPTIONS
+    **RETRY_OPTIONS,
 )
 def timeseries_batch_write(self, data):
     """Writes data in batches.
@@ -76,25 +199,77 @@ def timeseries_batch_write(self, data):
     metric data (batch operation)
     """
     timeseries_db.batch_write(data)
-    for metric_data in data:
-        _metric_post_write(**metric_data)
+    _metric_post_write_many(data)
 
 
 def _timeseries_batch_write(data):
-    """If the timeseries database is using UDP to write data, then write data synchronously."""
+    """If the timeseries database is using UDP to write data, then write data synchronously.
+
+    When the write buffer is enabled, data is buffered and flushed
+    together with the data coming from other reports.
+    """
+    if write_buffer:
+        write_buffer.add(data)
+    else:
+        _flush_timeseries_batch_write(data)
+
+
+def _flush_timeseries_batch_write(data):
     if timeseries_db.use_udp:
         timeseries_batch_write(data=data)
     else:
         for item in data:
-            item["metric"] = item["metric"].pk
+            if item["metric"] is not None:
+                item["metric"] = item["metric"].pk
         timeseries_batch_write.delay(data=data)
 
 
+write_buffer = None
+if WRITE_BUFFER["enabled"]:
+    write_buffer = WriteBuffer(
+        flush_func=_flush_timeseries_batch_write,
+        max_points=WRITE_BUFFER["max_points"],
+        max_interval=WRITE_BUFFER["max_interval"],
+    )
+
+
 @shared_task(base=OpenwispCeleryTask)
 def delete_timeseries(key, tags):
     timeseries_db.delete_series(key=key, tags=tags)
 
 
+# the maximum time range aggregated by a single rollup query
+_ROLLUP_CHUNK = 7 * 24 * 60 * 60
+
+
+@shared_task(base=OpenwispCeleryTask)
+def rollup_timeseries(retention_policy=None, start=None, end=None):
+    """Aggregates the timeseries data in the rollup retention policies.
+
+    Alternative to the continuous queries of the rollup retention
+    policies, which can be scheduled periodically or used to backfill
+    the rollups with the data written before they were created.
+
+    ``start`` and ``end`` are ISO 8601 strings, by default the last
+    two intervals of each rollup are aggregated. The time range is
+    extended to the interval boundaries and aggregated in chunks.
+    """
+    now = time.time()
+    end = parse_date(end).timestamp() if end else now
+    for name, options in ROLLUP_RETENTION_POLICIES.items():
+        if retention_policy and name != retention_policy:
+            continue
+        interval = get_interval_seconds(options["interval"])
+        chunk_start = parse_date(start).timestamp() if start else end - interval * 2
+        chunk_start -= chunk_start % interval
+        stop = end + (-end % interval)
+        chunk = max(interval, _ROLLUP_CHUNK - _ROLLUP_CHUNK % interval)
+        while chunk_start < stop:
+            chunk_end = min(chunk_start + chunk, stop)
+            timeseries_db.rollup(name, options["interval"], chunk_start, chunk_end)
+            chunk_start = chunk_end
+
+
 @shared_task
 def migrate_timeseries_database():
     """Performs migrations of timeseries datab.
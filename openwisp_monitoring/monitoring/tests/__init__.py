@@ -1,4 +1,5 @@
 import time
+import timeit
 from datetime import timedelta
 
 from django.core.cache import cache
@@ -198,6 +199,17 @@ charts = {
 }
 
 
+def benchmark(label, func, number=1, repeat=3):
+    """Prints and returns the best execution time of ``func``.
+
+    Used by the tests tagged with ``benchmark``, which are skipped by
+    ``runtests.py`` unless the ``BENCHMARK`` environment variable is set.
+    """
+    duration = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print(f"\n{label}: {duration * 1000:.3f} ms")
+    return duration
+
+
 class TestMonitoringMixin(TestOrganizationMixin):
     ORIGINAL_DB = TIMESERIES_DB["NAME"]
     TEST_DB = f"{ORIGINAL_DB}_test"
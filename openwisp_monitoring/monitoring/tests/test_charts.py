@@ -1,16 +1,22 @@
 import json
-from datetime import date, timedelta
+import random
+from datetime import date, datetime, timedelta
 from unittest.mock import patch
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.test import TestCase, tag
 from django.utils.timezone import now
+from influxdb.resultset import ResultSet
+from pytz import timezone as tz
 from swapper import load_model
 
 from openwisp_utils.tests import capture_stderr
 
+from ...db import timeseries_db
 from .. import settings as app_settings
+from ..chart_cache import ChartCache
 from ..configuration import (
     CHART_CONFIGURATION_CHOICES,
     DEFAULT_DASHBOARD_TRAFFIC_CHART,
@@ -18,7 +24,8 @@ from ..configuration import (
     register_chart,
     unregister_chart,
 )
-from . import TestMonitoringMixin, charts
+from ..utils import round_values
+from . import TestMonitoringMixin, benchmark, charts
 
 Chart = load_model("monitoring", "Chart")
 
@@ -38,6 +45,14 @@ class TestCharts(TestMonitoringMixin, TestCase):
         self.assertEqual(len(charts[0][1]), 3)
         self.assertEqual(charts[0][1], [3, 6, 9])
 
+    def test_read_since(self):
+        c = self._create_chart()
+        data = self._read_chart(c)
+        tail = c.read(since=data["x"][-2])
+        self.assertEqual(tail["x"], data["x"][-2:])
+        self.assertEqual(tail["traces"], [(c.metric.field_name, [6, 9])])
+        self.assertEqual(tail["summary"], data["summary"])
+
     def test_read_summary_avg(self):
         m = self._create_object_metric(name="summary_avg")
         c = self._create_chart(metric=m, test_data=False, configuration="mean_test")
@@ -358,3 +373,134 @@ class TestCharts(TestMonitoringMixin, TestCase):
             self.assertDictEqual(
                 DEFAULT_DASHBOARD_TRAFFIC_CHART, {"__all__": ["wan", "eth1", "eth0_2"]}
             )
+
+
+@tag("flaky_with_udp_writes")
+class TestChartCache(TestMonitoringMixin, TestCase):
+    """Tests for the cache of the chart data"""
+
+    read_kwargs = dict(time="7d", x_axys=True, timezone=settings.TIME_ZONE)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+    def _read(self, chart):
+        chart_cache = ChartCache(chart)
+        return chart_cache.read(**self.read_kwargs), chart_cache.status
+
+    def test_hit_miss(self):
+        chart = self._create_chart()
+        result, status = self._read(chart)
+        self.assertEqual(status, "miss")
+        self.assertEqual(result, chart.read(**self.read_kwargs))
+        with patch.object(timeseries_db, "query_many") as mocked_query_many:
+            cached_result, status = self._read(chart)
+        mocked_query_many.assert_not_called()
+        self.assertEqual(status, "hit")
+        self.assertEqual(cached_result, result)
+
+        with self.subTest("different time range"):
+            chart_cache = ChartCache(chart)
+            chart_cache.read(**dict(self.read_kwargs, time="30d"))
+            self.assertEqual(chart_cache.status, "miss")
+
+        with self.subTest("chart modified"):
+            chart.save()
+            self.assertEqual(self._read(chart)[1], "miss")
+
+        self.assertEqual(ChartCache.get_stats(), {"hit": 1, "refresh": 0, "miss": 3})
+
+    def test_refresh_newest_bucket(self):
+        metric = self._create_object_metric(name="sum")
+        chart = self._create_chart(metric=metric, configuration="sum_test")
+        result, status = self._read(chart)
+        self.assertEqual(status, "miss")
+        metric.write(30)
+        with patch.object(
+            timeseries_db, "query_many", wraps=timeseries_db.query_many
+        ) as mocked_query_many:
+            refreshed, status = self._read(chart)
+        self.assertEqual(status, "refresh")
+        # only the newest bucket is read again
+        since = Chart._get_since(result["x"][-1], settings.TIME_ZONE)
+        data_query = mocked_query_many.call_args[0][0][0]
+        self.assertIn(f"time >= '{since}'", data_query)
+        self.assertEqual(refreshed, chart.read(**self.read_kwargs))
+        self.assertEqual(refreshed["summary"], {"value": 48})
+        self.assertEqual(self._read(chart)[1], "hit")
+
+
+class TestChartReadEquivalence(TestMonitoringMixin, TestCase):
+    """Compares Chart.read with the previous point by point implementation"""
+
+    # number of seconds between points of the synthetic series
+    resolutions = {"1d": 60, "7d": 600, "30d": 3600, "365d": 6 * 3600}
+    traces = 10
+
+    def _get_series(self, time):
+        end = int(now().timestamp())
+        days = int(time[:-1])
+        resolution = self.resolutions[time]
+        columns = ["time"] + [f"trace_{i}" for i in range(self.traces)]
+        values = [
+            [timestamp] + [random.random() * 100 for _ in range(self.traces)]
+            for timestamp in range(end - days * 86400, end, resolution)
+        ]
+        return {"series": [{"name": "test", "columns": columns, "values": values}]}
+
+    def _legacy_read(self, raw, decimal_places=2, timezone=settings.TIME_ZONE):
+        traces = {}
+        x = []
+        for point in ResultSet(raw).get_points():
+            for key, value in point.items():
+                if key == "time":
+                    continue
+                traces.setdefault(key, [])
+                if decimal_places and isinstance(value, (int, float)):
+                    value = Chart._round(value, decimal_places)
+                traces[key].append(value)
+            time = datetime.fromtimestamp(point["time"], tz=tz(timezone)).strftime(
+                "%Y-%m-%d %H:%M"
+            )
+            x.append(time)
+        return {"traces": sorted(traces.items()), "x": x}
+
+    def test_read_equivalence(self):
+        chart = self._create_chart(test_data=False)
+        for time in self.resolutions.keys():
+            raw = self._get_series(time)
+            with self.subTest(time=time), patch.object(
+                timeseries_db,
+                "query_many",
+                side_effect=lambda *a, **kw: [ResultSet(raw), ResultSet({})],
+            ):
+                expected = self._legacy_read(raw)
+                result = chart.read(time=time)
+                self.assertEqual(result["traces"], expected["traces"])
+                self.assertEqual(result["x"], expected["x"])
+
+    @tag("benchmark")
+    def test_read_benchmark(self):
+        chart = self._create_chart(test_data=False)
+        for time in self.resolutions.keys():
+            raw = self._get_series(time)
+            with patch.object(
+                timeseries_db,
+                "query_many",
+                side_effect=lambda *a, **kw: [ResultSet(raw), ResultSet({})],
+            ):
+                benchmark(f"row-wise read ({time})", lambda: self._legacy_read(raw))
+                benchmark(f"Chart.read ({time})", lambda: chart.read(time=time))
+
+    def test_round_values(self):
+        values = [2.675, 0.001234, 1, None, 0.0]
+        self.assertEqual(
+            round_values(values, 2),
+            [Chart._round(value, 2) if value is not None else None for value in values],
+        )
+        self.assertEqual(round_values(values, 2)[0], round(2.675, 2))
@@ -1,18 +1,22 @@
+from copy import deepcopy
 from unittest.mock import patch
 
 from django.core.exceptions import ImproperlyConfigured
-from django.test import TestCase
+from django.test import TestCase, tag
 from django.utils.translation import gettext_lazy as _
 
+from .. import configuration
 from .. import settings as app_settings
+from ..base import models as base_models
 from ..configuration import (
     DEFAULT_METRICS,
+    get_chart_configuration,
     get_metric_configuration,
     get_metric_configuration_choices,
     register_metric,
     unregister_metric,
 )
-from . import TestMonitoringMixin
+from . import TestMonitoringMixin, benchmark
 
 
 class TestConfiguration(TestMonitoringMixin, TestCase):
@@ -106,3 +110,70 @@ class TestConfiguration(TestMonitoringMixin, TestCase):
         self.assertEqual(
             metrics["histogram"]["charts"]["histogram"]["title"], "Partial Updated"
         )
+
+    @patch.dict(DEFAULT_METRICS)
+    def test_compiled_configuration(self):
+        metrics = get_metric_configuration()
+        charts = get_chart_configuration()
+        self.assertIs(get_metric_configuration(), metrics)
+        self.assertIs(get_chart_configuration(), charts)
+        with self.subTest("Compiled configurations are read-only"):
+            with self.assertRaises(TypeError):
+                metrics["ping"]["label"] = "Changed"
+            with self.assertRaises(TypeError):
+                metrics["ping"]["alert_settings"].update(threshold=0)
+            with self.assertRaises(TypeError):
+                metrics["ping"]["related_fields"].append("changed")
+            with self.assertRaises(TypeError):
+                metrics["ping"]["related_fields"][0] = "changed"
+            related_fields = deepcopy(metrics["ping"]["related_fields"])
+            related_fields.append("changed")
+            self.assertNotIn("changed", metrics["ping"]["related_fields"])
+            config = metrics["ping"].copy()
+            config["label"] = "Changed"
+            self.assertNotEqual(metrics["ping"]["label"], "Changed")
+        with self.subTest("Registering a metric rebuilds the configurations"):
+            register_metric("histogram", self._get_new_metric())
+            self.assertIsNot(get_metric_configuration(), metrics)
+            self.assertIn("histogram", get_metric_configuration())
+            self.assertIn("histogram", get_chart_configuration())
+            unregister_metric("histogram")
+            self.assertNotIn("histogram", get_metric_configuration())
+
+    def test_registry_version(self):
+        metric = self._create_object_metric(name="ping", configuration="ping")
+        get_metric_configuration()
+        with patch.object(
+            configuration,
+            "_build_metric_configuration",
+            wraps=configuration._build_metric_configuration,
+        ) as mocked_build:
+            with self.subTest("The compiled registry is reused"):
+                metrics = get_metric_configuration()
+                metric.write(1, extra_values={"loss": 0}, write=False)
+                self.assertIs(get_metric_configuration(), metrics)
+                mocked_build.assert_not_called()
+            with self.subTest("The registry is rebuilt when its version changes"):
+                configuration._bump_registry_version()
+                self.assertIsNot(get_metric_configuration(), metrics)
+                self.assertEqual(get_metric_configuration(), metrics)
+                mocked_build.assert_called_once()
+
+
+@tag("benchmark")
+class TestConfigurationBenchmark(TestMonitoringMixin, TestCase):
+    """Compares Metric.write with the configuration rebuilt on every access"""
+
+    def test_metric_write_benchmark(self):
+        metric = self._create_object_metric(name="ping", configuration="ping")
+
+        def write():
+            metric.write(1, extra_values={"loss": 0}, write=False)
+
+        with patch.object(
+            base_models,
+            "get_metric_configuration",
+            side_effect=configuration._build_metric_configuration,
+        ):
+            benchmark("Metric.write (configuration rebuilt)", write, number=100)
+        benchmark("Metric.write (compiled registry)", write, number=100)
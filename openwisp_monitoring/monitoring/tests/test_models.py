@@ -1,5 +1,5 @@
 from datetime import date, timedelta
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
@@ -13,7 +13,10 @@ from swapper import load_model
 
 from openwisp_utils.tests import catch_signal
 
+from ...db import timeseries_db
 from .. import settings as app_settings
+from .. import tasks
+from ..buffer import WriteBuffer
 from ..exceptions import InvalidChartConfigException, InvalidMetricConfigException
 from ..signals import post_metric_write, pre_metric_write, threshold_crossed
 from . import TestMonitoringMixin
@@ -211,6 +214,56 @@ class TestModels(TestMonitoringMixin, TestCase):
             )
         handler.assert_not_called()
 
+    def test_write_buffer(self):
+        m = self._create_general_metric(name="load")
+        self._create_alert_settings(
+            metric=m, custom_operator=">", custom_threshold=90, custom_tolerance=0
+        )
+        write_buffer = WriteBuffer(
+            flush_func=tasks._flush_timeseries_batch_write,
+            max_points=3,
+            max_interval=60000,
+        )
+        with patch.object(tasks, "write_buffer", write_buffer), patch.object(
+            timeseries_db, "batch_write", wraps=timeseries_db.batch_write
+        ) as mocked_batch_write, catch_signal(post_metric_write) as handler:
+            m.write(50)
+            Metric.batch_write([(m, {"value": 60})])
+            self.assertEqual(len(write_buffer), 2)
+            mocked_batch_write.assert_not_called()
+            handler.assert_not_called()
+            Metric.batch_write([(m, {"value": 91})])
+            self.assertEqual(len(write_buffer), 0)
+            mocked_batch_write.assert_called_once()
+            self.assertEqual(len(mocked_batch_write.call_args[0][0]), 3)
+            self.assertEqual(handler.call_count, 3)
+        m.refresh_from_db()
+        self.assertFalse(m.is_healthy)
+
+    def test_write_buffer_interval(self):
+        flush_func = Mock()
+        write_buffer = WriteBuffer(
+            flush_func=flush_func, max_points=100, max_interval=0
+        )
+        write_buffer.add([{"name": "load"}])
+        flush_func.assert_called_once_with([{"name": "load"}])
+        self.assertEqual(len(write_buffer), 0)
+        write_buffer.flush()
+        flush_func.assert_called_once()
+
+        with self.subTest("Timer flush closes the database connections"):
+            flush_func = Mock(side_effect=ValueError)
+            write_buffer = WriteBuffer(
+                flush_func=flush_func, max_points=100, max_interval=60000
+            )
+            write_buffer.add([{"name": "load"}])
+            with patch(
+                "openwisp_monitoring.monitoring.buffer.connections.close_all"
+            ) as mocked_close_all:
+                write_buffer._timer_flush()
+            flush_func.assert_called_once_with([{"name": "load"}])
+            mocked_close_all.assert_called_once()
+
     def test_tags(self):
         extra_tags = {"a": "a", "b": "b1"}
         metric = self._create_object_metric(extra_tags=extra_tags)
@@ -415,6 +468,46 @@ class TestModels(TestMonitoringMixin, TestCase):
             self.assertEqual(m.is_healthy_tolerant, True)
             self.assertEqual(Notification.objects.count(), 2)
 
+    @patch.object(app_settings, "TOLERANCE_INTERVAL", 300)
+    @patch.object(app_settings, "TOLERANCE_TRACKER", False)
+    @tag("flaky_with_udp_writes")
+    def test_tolerance_batch_write(self):
+        self._create_admin()
+        metrics = [
+            self._create_general_metric(name="load"),
+            self._create_general_metric(name="cpu"),
+        ]
+        for metric in metrics:
+            self._create_alert_settings(
+                metric=metric,
+                custom_operator=">",
+                custom_threshold=90,
+                custom_tolerance=5,
+            )
+        with freeze_time(start_time):
+            Metric.batch_write([(metric, {"value": 99}) for metric in metrics])
+        with patch.object(
+            timeseries_db, "read", wraps=timeseries_db.read
+        ) as mocked_read, patch.object(
+            timeseries_db, "read_many", wraps=timeseries_db.read_many
+        ) as mocked_read_many, patch.object(
+            Metric.objects, "bulk_update", wraps=Metric.objects.bulk_update
+        ) as mocked_bulk_update, catch_signal(
+            threshold_crossed
+        ) as handler:
+            with freeze_time(start_time + timedelta(minutes=6)):
+                Metric.batch_write([(metric, {"value": 99}) for metric in metrics])
+        mocked_read.assert_not_called()
+        mocked_read_many.assert_called_once()
+        self.assertEqual(len(mocked_read_many.call_args[0][0]), 4)
+        mocked_bulk_update.assert_called_once()
+        self.assertEqual(handler.call_count, 2)
+        for metric in metrics:
+            metric.refresh_from_db(fields=["is_healthy", "is_healthy_tolerant"])
+            self.assertEqual(metric.is_healthy, False)
+            self.assertEqual(metric.is_healthy_tolerant, False)
+        self.assertEqual(Notification.objects.count(), 2)
+
     def test_time_crossed(self):
         m = self._create_general_metric(name="load")
         a = self._create_alert_settings(
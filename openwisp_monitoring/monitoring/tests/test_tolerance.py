@@ -0,0 +1,164 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, tag
+from django.utils import timezone
+from freezegun import freeze_time
+from swapper import load_model
+
+from ...db import timeseries_db
+from .. import settings as app_settings
+from ..tolerance import ToleranceTracker
+from . import TestMonitoringMixin
+
+Metric = load_model("monitoring", "Metric")
+
+start_time = timezone.now()
+
+
+@tag("flaky_with_udp_writes")
+@patch.object(app_settings, "TOLERANCE_INTERVAL", 300)
+@patch.object(app_settings, "TOLERANCE_TRACKER", True)
+class TestToleranceTracker(TestMonitoringMixin, TestCase):
+    """Ensures the tolerance tracker is equivalent to querying the tsdb"""
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+    def _create_alert_settings_metric(
+        self, operator, threshold, tolerance=5, name="load"
+    ):
+        metric = self._create_general_metric(name=name)
+        return self._create_alert_settings(
+            metric=metric,
+            custom_operator=operator,
+            custom_threshold=threshold,
+            custom_tolerance=tolerance,
+        )
+
+    def _assert_equivalent(self, alert_settings, points):
+        metric = alert_settings.metric
+        for minutes, value in points:
+            time = start_time + timedelta(minutes=minutes)
+            with self.subTest(minutes=minutes, value=value), freeze_time(time):
+                metric.write(value)
+                metric.refresh_from_db(fields=["is_healthy", "is_healthy_tolerant"])
+                with patch.object(app_settings, "TOLERANCE_TRACKER", False):
+                    expected = alert_settings._is_crossed_by(value, time)
+                with patch.object(timeseries_db, "read") as mocked_read:
+                    crossed = alert_settings._is_crossed_by(value, time)
+                mocked_read.assert_not_called()
+                self.assertEqual(crossed, expected)
+
+    def test_tolerance_trespassed(self):
+        alert_settings = self._create_alert_settings_metric(">", 90)
+        self._assert_equivalent(
+            alert_settings,
+            [(0, 99), (2, 99), (4, 99), (6, 99), (8, 71), (13, 71), (15, 71)],
+        )
+        alert_settings.metric.refresh_from_db()
+        self.assertEqual(alert_settings.metric.is_healthy_tolerant, True)
+
+    def test_flapping(self):
+        alert_settings = self._create_alert_settings_metric(">", 90)
+        self._assert_equivalent(
+            alert_settings,
+            [(0, 99), (2, 71), (3, 99), (5, 99), (7, 99), (9, 99), (10, 90)],
+        )
+
+    def test_less_than_operator(self):
+        alert_settings = self._create_alert_settings_metric("<", 10)
+        self._assert_equivalent(
+            alert_settings,
+            [(0, 5), (3, 20), (4, 5), (6, 5), (9, 5), (12, 10), (14, 50), (20, 50)],
+        )
+
+    def test_threshold_values(self):
+        alert_settings = self._create_alert_settings_metric(">", 90)
+        self._assert_equivalent(
+            alert_settings,
+            [(0, 90), (1, 91), (3, 91), (6, 91), (7, 90), (9, 90), (13, 90)],
+        )
+
+    def test_long_tolerance(self):
+        alert_settings = self._create_alert_settings_metric(">", 90, tolerance=10)
+        self._assert_equivalent(
+            alert_settings,
+            [(0, 99), (4, 99), (8, 99), (11, 99), (12, 71), (16, 71), (23, 71)],
+        )
+
+    def test_invalidated(self):
+        alert_settings = self._create_alert_settings_metric(">", 90)
+        metric = alert_settings.metric
+        cache_key = ToleranceTracker.get_cache_key(metric.pk)
+        with freeze_time(start_time):
+            metric.write(99)
+        self.assertIsNotNone(cache.get(cache_key))
+
+        with self.subTest("alert settings changed"):
+            alert_settings.custom_tolerance = 10
+            alert_settings.save()
+            self.assertIsNone(cache.get(cache_key))
+
+        with self.subTest("rebuilt from the timeseries database"):
+            with freeze_time(start_time + timedelta(minutes=1)):
+                with patch.object(
+                    timeseries_db, "read_many", wraps=timeseries_db.read_many
+                ) as mocked_read_many:
+                    metric.write(99)
+            mocked_read_many.assert_called_once()
+            state = cache.get(cache_key)
+            self.assertEqual([value for _, value in state["points"][""]], [99, 99])
+
+        with self.subTest("value written without checking the threshold"):
+            with freeze_time(start_time + timedelta(minutes=2)):
+                metric.write(99, check=False)
+            self.assertIsNone(cache.get(cache_key))
+
+    def test_rebuilt_in_bulk(self):
+        metrics = [
+            self._create_alert_settings_metric(">", 90, name=name).metric
+            for name in ("load", "cpu")
+        ]
+        with freeze_time(start_time):
+            Metric.batch_write([(metric, {"value": 99}) for metric in metrics])
+        cache.clear()
+        with freeze_time(start_time + timedelta(minutes=6)), patch.object(
+            timeseries_db, "read_many", wraps=timeseries_db.read_many
+        ) as mocked_read_many:
+            Metric.batch_write([(metric, {"value": 99}) for metric in metrics])
+        # one read for each metric, performed with a single query
+        mocked_read_many.assert_called_once()
+        self.assertEqual(len(mocked_read_many.call_args[0][0]), 2)
+        for metric in metrics:
+            metric.refresh_from_db(fields=["is_healthy_tolerant"])
+            self.assertEqual(metric.is_healthy_tolerant, False)
+            state = cache.get(ToleranceTracker.get_cache_key(metric.pk))
+            self.assertEqual([value for _, value in state["points"][""]], [99, 99])
+
+    def test_locked(self):
+        alert_settings = self._create_alert_settings_metric(">", 90)
+        metric = alert_settings.metric
+        cache_key = ToleranceTracker.get_cache_key(metric.pk)
+        with freeze_time(start_time):
+            metric.write(99)
+        with self.subTest("points are added while holding the lock"):
+            with patch.object(
+                ToleranceTracker, "_lock", wraps=ToleranceTracker._lock
+            ) as mocked_lock:
+                with freeze_time(start_time + timedelta(minutes=1)):
+                    metric.write(99)
+            mocked_lock.assert_called_once()
+            self.assertEqual(len(cache.get(cache_key)["points"][""]), 2)
+            self.assertIsNone(cache.get(ToleranceTracker.get_lock_key(metric.pk)))
+
+        with self.subTest("state discarded if the lock can't be acquired"):
+            # lock held by another process
+            cache.add(ToleranceTracker.get_lock_key(metric.pk), 1)
+            with patch.object(ToleranceTracker, "_lock_timeout", 0):
+                ToleranceTracker.add_points(
+                    [(metric, None, start_time + timedelta(minutes=2), 99)]
+                )
+            self.assertIsNone(cache.get(cache_key))
@@ -0,0 +1,256 @@
+import logging
+import operator
+import time as _time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from dateutil.parser import parse as parse_date
+from django.core.cache import cache
+from pytz import utc
+
+from ..db import timeseries_db
+
+logger = logging.getLogger(__name__)
+
+_OPERATORS = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+
+def _to_microseconds(time):
+    if isinstance(time, str):
+        time = parse_date(time)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=utc)
+    delta = time - datetime(1970, 1, 1, tzinfo=utc)
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+class ToleranceTracker(object):
+    """Keeps the recent values of the alert field of a metric in the cache.
+
+    Allows ``AlertSettings._is_crossed_by`` to evaluate the tolerance
+    without querying the timeseries database: the reads returned by
+    ``AlertSettings._get_tolerance_reads`` are answered using the points
+    stored in the cache, which are updated after each write.
+
+    Only the points falling in the tolerance search range of the alert
+    settings (plus a margin for data written with a delay) are stored.
+    When the information is not in the cache (eg: cold start, alert
+    settings changed, data written without checking the threshold),
+    it is rebuilt with a single query to the timeseries database.
+    """
+
+    # data written with a delay up to 5 minutes is still checked,
+    # see Metric._is_historical_data
+    _margin = 5 * 60
+    # the state of a metric is updated by one process at a time,
+    # the lock expires in case the process holding it crashes
+    _lock_timeout = 10
+
+    def __init__(self, metric):
+        self.metric = metric
+
+    @staticmethod
+    def get_cache_key(metric_pk):
+        return f"tolerance-tracker-{metric_pk}"
+
+    @staticmethod
+    def get_lock_key(metric_pk):
+        return f"tolerance-tracker-lock-{metric_pk}"
+
+    @property
+    def cache_key(self):
+        return self.get_cache_key(self.metric.pk)
+
+    @classmethod
+    def invalidate(cls, *metric_pks):
+        cache.delete_many([cls.get_cache_key(pk) for pk in metric_pks])
+
+    @classmethod
+    @contextmanager
+    def _lock(cls, metric_pks):
+        """Acquires the locks of the states of ``metric_pks``.
+
+        Yields the primary keys of the metrics which have been locked,
+        the locks which can't be acquired before the timeout expires are
+        skipped (this happens only when a process holds a lock for longer
+        than ``_lock_timeout`` seconds).
+        """
+        acquired = []
+        try:
+            # locks are acquired in order to avoid deadlocks
+            for pk in sorted({str(pk) for pk in metric_pks}):
+                key = cls.get_lock_key(pk)
+                deadline = _time.monotonic() + cls._lock_timeout
+                while not cache.add(key, 1, timeout=cls._lock_timeout):
+                    if _time.monotonic() > deadline:
+                        logger.warning(f"Could not lock the tolerance tracker of {pk}")
+                        break
+                    _time.sleep(0.01)
+                else:
+                    acquired.append(pk)
+            yield set(acquired)
+        finally:
+            cache.delete_many([cls.get_lock_key(pk) for pk in acquired])
+
+    @classmethod
+    def add_points(cls, points):
+        """Stores the points written to the timeseries database.
+
+        ``points`` is a list of ``(metric, retention_policy, time, value)``
+        tuples, only the metrics which are already being tracked are
+        updated, the others are rebuilt when needed.
+
+        The states are updated while holding the lock of each metric,
+        hence the points written concurrently by other processes are
+        not lost. The states which can't be locked are discarded and
+        rebuilt from the timeseries database when needed.
+        """
+        keys = {cls.get_cache_key(metric.pk) for metric, *_ in points}
+        # avoids locking metrics which are not being tracked
+        if not cache.get_many(keys):
+            return
+        with cls._lock({metric.pk for metric, *_ in points}) as locked:
+            states = cache.get_many(keys)
+            for metric, retention_policy, time, value in points:
+                state = states.get(cls.get_cache_key(metric.pk))
+                if state is None or value is None:
+                    continue
+                if str(metric.pk) not in locked:
+                    states.pop(cls.get_cache_key(metric.pk))
+                    cls.invalidate(metric.pk)
+                    continue
+                rp_points = state["points"].get(retention_policy or "")
+                if rp_points is None:
+                    continue
+                rp_points.append((_to_microseconds(time), value))
+            if not states:
+                return
+            for state in states.values():
+                cls._prune(state)
+            cache.set_many(states, max(state["window"] for state in states.values()))
+
+    @staticmethod
+    def _prune(state):
+        for rp, rp_points in state["points"].items():
+            if not rp_points:
+                continue
+            # like in the timeseries database, a point written with
+            # the same timestamp of another one overwrites it
+            rp_points = sorted(dict(rp_points).items())
+            oldest = rp_points[-1][0] - state["window"] * 10**6
+            state["points"][rp] = [point for point in rp_points if point[0] >= oldest]
+
+    @classmethod
+    def _get_state(cls, states, metric, window, retention_policy):
+        """Returns the state of ``metric`` if it can answer the reads."""
+        state = states.get(cls.get_cache_key(metric.pk))
+        if state is None or state["window"] < window:
+            return None
+        if (retention_policy or "") not in state["points"]:
+            return None
+        return state
+
+    @classmethod
+    def _rebuild_many(cls, items, states):
+        """Rebuilds the states needed by ``items`` with a single query.
+
+        ``items`` is a list of ``(metric, window, now, retention_policy)``
+        tuples, ``states`` is updated and stored in the cache.
+        """
+        reads = []
+        rebuilt = {}
+        for metric, window, now, retention_policy in items:
+            key = cls.get_cache_key(metric.pk)
+            rp = retention_policy or ""
+            if (key, rp) in rebuilt:
+                continue
+            state = states.get(key)
+            if state is None or state["window"] < window:
+                state = states[key] = {"window": window, "points": {}}
+            rebuilt[(key, rp)] = metric
+            reads.append(
+                metric._get_read_options(
+                    fields=metric.alert_field,
+                    since=now - timedelta(seconds=window),
+                    retention_policy=retention_policy,
+                    order="time",
+                )
+            )
+        results = timeseries_db.read_many(reads, precision="u")
+        for ((key, rp), metric), points in zip(rebuilt.items(), results):
+            states[key]["points"][rp] = [
+                (point["time"], point[metric.alert_field])
+                for point in points
+                if point.get(metric.alert_field) is not None
+            ]
+        changed = {key: states[key] for key, _ in rebuilt}
+        cache.set_many(changed, max(state["window"] for state in changed.values()))
+
+    @classmethod
+    def read_many(cls, items):
+        """Answers the reads of many metrics like ``Metric.read`` would.
+
+        ``items`` is a list of ``(metric, reads, window, now,
+        retention_policy)`` tuples, ``window`` is the number of seconds
+        of data which has to be kept in order to answer the reads.
+        The states which are not in the cache are rebuilt with a single
+        query to the timeseries database.
+        """
+        items = [
+            (metric, reads, window + cls._margin, now, retention_policy)
+            for metric, reads, window, now, retention_policy in items
+        ]
+        keys = {cls.get_cache_key(metric.pk) for metric, *_ in items}
+        states = cache.get_many(keys)
+        missing = [
+            item
+            for item in items
+            if not cls._get_state(states, item[0], item[2], item[4])
+        ]
+        if missing:
+            with cls._lock({metric.pk for metric, *_ in missing}):
+                # the states may have been rebuilt in the meantime
+                states.update(cache.get_many(keys))
+                missing = [
+                    (metric, window, now, retention_policy)
+                    for metric, _, window, now, retention_policy in missing
+                    if not cls._get_state(states, metric, window, retention_policy)
+                ]
+                if missing:
+                    cls._rebuild_many(missing, states)
+        results = []
+        for metric, reads, window, now, retention_policy in items:
+            key = cls.get_cache_key(metric.pk)
+            points = states[key]["points"][retention_policy or ""]
+            tracker = cls(metric)
+            results.append([tracker._read(points, **options) for options in reads])
+        return results
+
+    def read(self, reads, window, now, retention_policy):
+        """Answers ``reads`` like ``Metric.read`` would.
+
+        ``window`` is the number of seconds of data which has to be
+        kept in order to answer the reads.
+        """
+        return self.read_many([(self.metric, reads, window, now, retention_policy)])[0]
+
+    def _read(self, points, since, where, limit=None, order=None, **kwargs):
+        since = _to_microseconds(since)
+        result = []
+        for time, value in points:
+            if time < since:
+                continue
+            if not all(_OPERATORS[op](value, threshold) for _, op, threshold in where):
+                continue
+            # the tolerance reads use second precision
+            result.append({"time": time // 10**6, self.metric.alert_field: value})
+        if order == "-time":
+            result.reverse()
+        if limit:
+            result = result[:limit]
+        return result
@@ -1,6 +1,167 @@
+import re
+import time
+from datetime import datetime
+
+from django.db.models.signals import post_save
 from django.utils.text import slugify
 
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# the UTC offset of timestamps which are less than a week apart
+# is assumed to be constant if it's the same for both of them
+_CONSTANT_UTC_OFFSET_SPAN = 7 * 24 * 60 * 60
+_INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_interval_regex = re.compile(r"^(\d+)([smhdw])$")
+
 
 def clean_timeseries_data_key(value):
     value = value.replace(".", "_")
     return slugify(value).replace("-", "_")
+
+
+def bulk_create_with_signals(model, instances):
+    """Creates ``instances`` with a single query and sends ``post_save``.
+
+    ``bulk_create`` does not send model signals, but the receivers which
+    invalidate the monitoring caches rely on them, hence the signal is
+    sent for each of the created instances.
+    """
+    instances = model.objects.bulk_create(instances)
+    for instance in instances:
+        post_save.send(
+            sender=model,
+            instance=instance,
+            created=True,
+            update_fields=None,
+            raw=False,
+            using=instance._state.db,
+        )
+    return instances
+
+
+def bulk_update_with_signals(model, instances, fields):
+    """Updates ``fields`` of ``instances`` with a single query.
+
+    Like ``bulk_create_with_signals``, ``post_save`` is sent for each of
+    the updated instances.
+    """
+    fields = sorted(fields)
+    model.objects.bulk_update(instances, fields)
+    for instance in instances:
+        post_save.send(
+            sender=model,
+            instance=instance,
+            created=False,
+            update_fields=frozenset(fields),
+            raw=False,
+            using=instance._state.db,
+        )
+
+
+def round_value(value, decimal_places):
+    """Rounds value when necessary."""
+    control = 1.0 / 10**decimal_places
+    if value < control:
+        decimal_places += 2
+    return round(value, decimal_places)
+
+
+def round_values(values, decimal_places):
+    """Rounds a list of values with ``round_value``.
+
+    The builtin ``round`` is always used, the rounding of NumPy differs
+    for some halfway values (eg: ``2.675``). Values which are not numbers
+    (eg: ``None``) are returned unchanged.
+    """
+    if not decimal_places:
+        return list(values)
+    # same logic of round_value, inlined to avoid a call for each value
+    control = 1.0 / 10**decimal_places
+    small_decimal_places = decimal_places + 2
+    return [
+        (
+            round(
+                value,
+                small_decimal_places if value < control else decimal_places,
+            )
+            if isinstance(value, (int, float))
+            else value
+        )
+        for value in values
+    ]
+
+
+def _get_utc_offset(timestamp, tzinfo):
+    offset = datetime.fromtimestamp(timestamp, tz=tzinfo).utcoffset()
+    return int(offset.total_seconds())
+
+
+def _get_utc_offsets(timestamps, tzinfo):
+    """Returns the UTC offset of each of the sorted ``timestamps``.
+
+    The offset changes only a few times per year (DST), so instead of
+    converting every timestamp, the list is bisected until the offset
+    is constant in each part.
+    """
+    offsets = [0] * len(timestamps)
+
+    def fill(start, end, start_offset, end_offset):
+        if (
+            start_offset == end_offset
+            and timestamps[end] - timestamps[start] <= _CONSTANT_UTC_OFFSET_SPAN
+        ):
+            stop = end + 1
+            offsets[start:stop] = [start_offset] * (stop - start)
+            return
+        if end - start <= 1:
+            offsets[start], offsets[end] = start_offset, end_offset
+            return
+        middle = (start + end) // 2
+        middle_offset = _get_utc_offset(timestamps[middle], tzinfo)
+        fill(start, middle, start_offset, middle_offset)
+        fill(middle, end, middle_offset, end_offset)
+
+    fill(
+        0,
+        len(timestamps) - 1,
+        _get_utc_offset(timestamps[0], tzinfo),
+        _get_utc_offset(timestamps[-1], tzinfo),
+    )
+    return offsets
+
+
+def format_timestamps(timestamps, tzinfo):
+    """Formats UNIX timestamps as ``"%Y-%m-%d %H:%M"`` in ``tzinfo``.
+
+    Equivalent to calling ``datetime.fromtimestamp(timestamp, tz=tzinfo)
+    .strftime("%Y-%m-%d %H:%M")`` on each timestamp, but much faster.
+    """
+    if not timestamps:
+        return []
+    if all(a <= b for a, b in zip(timestamps, timestamps[1:])):
+        offsets = _get_utc_offsets(timestamps, tzinfo)
+    else:
+        offsets = [_get_utc_offset(timestamp, tzinfo) for timestamp in timestamps]
+    if numpy:
+        local = numpy.floor(numpy.array(timestamps, dtype=float)).astype("int64")
+        local += numpy.array(offsets, dtype="int64")
+        strings = numpy.datetime_as_string(local.astype("datetime64[s]"), unit="m")
+        return numpy.char.replace(strings, "T", " ").tolist()
+    return [
+        "%04d-%02d-%02d %02d:%02d" % time.gmtime(timestamp + offset)[:5]
+        for timestamp, offset in zip(timestamps, offsets)
+    ]
+
+
+def get_interval_seconds(interval):
+    """Converts an InfluxQL duration (eg: ``10m``, ``24h``) to seconds.
+
+    Returns ``None`` if ``interval`` is not a valid duration.
+    """
+    match = _interval_regex.match(interval or "")
+    if not match:
+        return None
+    return int(match.group(1)) * _INTERVAL_UNITS[match.group(2)]
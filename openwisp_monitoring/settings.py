@@ -29,3 +29,5 @@ CACHE_TIMEOUT = get_settings_value(
     24 * 60 * 60,  # 24 hours in seconds
 )
 DEFAULT_CHART_TIME = get_settings_value("DEFAULT_CHART_TIME", "7d")
+CHART_READ_POOL_SIZE = get_settings_value("CHART_READ_POOL_SIZE", 4)
+SERVER_TIMING = get_settings_value("SERVER_TIMING", False)
@@ -1,10 +1,14 @@
 import csv
 import logging
+import time as time_module
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from io import StringIO
 
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
 from django.http import HttpResponse
 from pytz import timezone
 from pytz import timezone as tz
@@ -13,11 +17,52 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from swapper import load_model
 
+from .monitoring import settings as monitoring_settings
+from .monitoring.chart_cache import ChartCache
 from .monitoring.exceptions import InvalidChartConfigException
+from .settings import CHART_READ_POOL_SIZE, SERVER_TIMING
 
 logger = logging.getLogger(__name__)
 
 Chart = load_model("monitoring", "Chart")
+_chart_read_pool = None
+
+
+def _get_chart_read_pool():
+    global _chart_read_pool
+    if _chart_read_pool is None:
+        _chart_read_pool = ThreadPoolExecutor(
+            max_workers=CHART_READ_POOL_SIZE, thread_name_prefix="chart-read"
+        )
+    return _chart_read_pool
+
+
+def _read_chart(chart, **kwargs):
+    """Reads chart data and measures how long it took.
+
+    Returns a tuple containing the chart data (or the exception raised
+    while reading), the duration in milliseconds and the status of the
+    chart cache (``None`` if the cache is disabled).
+    """
+    start = time_module.perf_counter()
+    chart_cache = ChartCache(chart) if monitoring_settings.CHART_CACHE else None
+    try:
+        if chart_cache:
+            result = chart_cache.read(**kwargs)
+        else:
+            result = chart.read(**kwargs)
+    except InvalidChartConfigException as e:
+        result = e
+    duration = (time_module.perf_counter() - start) * 1000
+    return result, duration, getattr(chart_cache, "status", None)
+
+
+def _read_chart_in_pool(chart, **kwargs):
+    try:
+        return _read_chart(chart, **kwargs)
+    finally:
+        # database connections opened by the pool threads must not be leaked
+        connections.close_all()
 
 
 class MonitoringApiViewMixin:
@@ -49,6 +94,12 @@ class MonitoringApiViewMixin:
             raise ValidationError("end_date cannot be greater than today's date")
         return start, end
 
+    def _validate_since(self, since):
+        try:
+            datetime.strptime(since, "%Y-%m-%d %H:%M")
+        except ValueError:
+            raise ValidationError("Incorrect since format, should be YYYY-MM-DD H:M")
+
     def get(self, request, *args, **kwargs):
         time = request.query_params.get("time", Chart.DEFAULT_TIME)
         start_date = request.query_params.get("start", None)
@@ -71,38 +122,106 @@ class MonitoringApiViewMixin:
                 time = f"{custom_days}d"
         if time not in Chart._get_group_map(time).keys():
             raise ValidationError("Time range not supported")
+        # incremental refresh: return only the buckets at or after "since"
+        since = request.query_params.get("since", None)
+        if since:
+            self._validate_since(since)
         charts = self._get_charts(request, *args, **kwargs)
         # prepare response data
-        data = self._get_charts_data(charts, time, timezone, start_date, end_date)
+        data = self._get_charts_data(
+            charts, time, timezone, start_date, end_date, since=since
+        )
         # csv export has a different response
         if request.query_params.get("csv"):
             response = HttpResponse(self._get_csv(data), content_type="text/csv")
             response["Content-Disposition"] = "attachment; filename=data.csv"
-            return response
-        data.update(self._get_additional_data(request, *args, **kwargs))
-        return Response(data)
+        else:
+            data.update(self._get_additional_data(request, *args, **kwargs))
+            response = Response(data)
+        if settings.DEBUG or SERVER_TIMING:
+            response["Server-Timing"] = self._get_server_timing()
+        return response
 
     def _get_chart_additional_query_kwargs(self, chart):
         """Hook to provide additional kwargs to Chart.read."""
         return None
 
-    def _get_charts_data(self, charts, time, timezone, start_date, end_date):
+    def _read_charts(self, charts, **kwargs):
+        """Reads the data of ``charts``, in parallel when possible.
+
+        Charts are read concurrently on a thread pool whose size is
+        defined by ``OPENWISP_MONITORING_CHART_READ_POOL_SIZE``, the
+        results are returned in the same order of ``charts``.
+        """
+        reads = []
+        for chart in charts:
+            # anything which may need the database is prepared in the
+            # main thread, the pool threads only query the timeseries DB
+            if chart.metric.content_type_id:
+                ContentType.objects.get_for_id(chart.metric.content_type_id)
+            read_kwargs = dict(
+                additional_query_kwargs=self._get_chart_additional_query_kwargs(chart),
+                **kwargs,
+            )
+            reads.append((chart, read_kwargs))
+        if CHART_READ_POOL_SIZE > 1 and len(reads) > 1:
+            pool = _get_chart_read_pool()
+            futures = [
+                pool.submit(_read_chart_in_pool, chart, **kw) for chart, kw in reads
+            ]
+            results = [future.result() for future in futures]
+        else:
+            results = [_read_chart(chart, **kw) for chart, kw in reads]
+        self._chart_timings = [
+            (chart, duration, cache_status)
+            for (chart, _), (_, duration, cache_status) in zip(reads, results)
+        ]
+        return [result for result, _, _ in results]
+
+    def _get_server_timing(self):
+        """Returns the value of the ``Server-Timing`` header.
+
+        Exposes the time (in milliseconds) spent reading each chart,
+        followed by the status of the chart cache (if enabled). Sent
+        only when ``DEBUG`` or ``OPENWISP_MONITORING_SERVER_TIMING``
+        is enabled.
+        """
+        timings = []
+        for chart, duration, cache_status in getattr(self, "_chart_timings", []):
+            desc = chart.configuration
+            if cache_status:
+                desc = f"{desc} {cache_status}"
+            timings.append(f'chart;desc="{desc}";dur={duration:.1f}')
+        return ", ".join(timings)
+
+    def _get_charts_data(
+        self, charts, time, timezone, start_date, end_date, since=None
+    ):
         chart_map = {}
         x_axys = True
         data = OrderedDict({"charts": []})
-        for chart in charts:
+        charts = list(charts)
+        read_kwargs = dict(
+            time=time,
+            x_axys=True,
+            timezone=timezone,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        if since:
+            read_kwargs["since"] = since
+            # allows clients to discard the buckets which
+            # are not in the time range anymore
+            data["x_start"] = Chart._get_x_start(time, timezone, start_date, end_date)
+        chart_data = self._read_charts(charts, **read_kwargs)
+        for chart, chart_dict in zip(charts, chart_data):
             # prepare chart dict
             try:
-                chart_dict = chart.read(
-                    time=time,
-                    x_axys=x_axys,
-                    timezone=timezone,
-                    start_date=start_date,
-                    end_date=end_date,
-                    additional_query_kwargs=self._get_chart_additional_query_kwargs(
-                        chart
-                    ),
-                )
+                if isinstance(chart_dict, InvalidChartConfigException):
+                    raise chart_dict
+                # the x axys is returned only once
+                if not x_axys:
+                    chart_dict.pop("x", None)
                 if not chart_dict["traces"]:
                     continue
                 chart_dict["description"] = chart.description
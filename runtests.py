@@ -16,6 +16,9 @@ if __name__ == "__main__":
         args.insert(2, "openwisp_monitoring")
     else:
         args.insert(2, "openwisp2")
+    # benchmarks only measure the performance, they don't assert it
+    if not os.environ.get("BENCHMARK", False):
+        args.extend(["--exclude-tag", "benchmark"])
     if os.environ.get("TIMESERIES_UDP", False):
         args.extend(["--exclude-tag", "timeseries_client"])
         # These tests read immediately after writing, sometimes inside product